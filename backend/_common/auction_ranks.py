@@ -0,0 +1,118 @@
+"""Порядок объектов в городе на разреженных рангах.
+
+Порядок задаёт listings.auction_rank: между соседями остаётся зазор (RANK_GAP),
+поэтому перестановка объекта — это UPDATE одной строки с рангом посередине
+между новыми соседями, сколько бы объектов ни было в городе. Перестановки в
+одном городе идут по очереди под advisory-блокировкой города.
+
+listings.auction — сохранённая позиция (#1, #2, ...). У переставленного объекта
+она меняется сразу, у остальных — фоновой нормализацией города (задача
+AUCTION_RENORMALIZE в очереди, см. _common/jobs.py): она же заново раздаёт
+ранги с полным зазором. Публичный каталог позицию не читает, а считает по
+auction_rank (RANKED_LISTINGS в _common/catalog.py), поэтому порядок на сайте
+верен сразу после перестановки. Если зазор между соседями кончился,
+нормализация выполняется сразу, в транзакции перестановки.
+"""
+from _common.jobs import enqueue
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+
+RANK_GAP = 1024
+
+AUCTION_RENORMALIZE = 'auction_renormalize'
+# Нормализация откладывается: серия перетаскиваний даёт одну задачу на город
+RENORMALIZE_DELAY_SECONDS = 60
+
+
+def lock_city(cur, city: str):
+    '''Advisory-блокировка порядка города до конца транзакции'''
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f'auction:{city}',))
+
+
+def rank_between(prev_rank, next_rank):
+    '''Ранг между соседями или None, если зазор исчерпан'''
+    if prev_rank is None and next_rank is None:
+        return RANK_GAP
+    if prev_rank is None:
+        return next_rank - RANK_GAP
+    if next_rank is None:
+        return prev_rank + RANK_GAP
+    if next_rank - prev_rank < 2:
+        return None
+    return (prev_rank + next_rank) // 2
+
+
+def _neighbours(cur, city: str, listing_id: int, position: int):
+    '''Ранги объектов, между которыми встанет listing_id на позиции position'''
+    cur.execute(f"""
+        SELECT auction_rank
+        FROM {SCHEMA}.listings
+        WHERE city = %s AND id <> %s
+        ORDER BY auction_rank, id
+        OFFSET %s
+        LIMIT 2
+    """, (city, listing_id, max(position - 2, 0)))
+    ranks = [row['auction_rank'] if isinstance(row, dict) else row[0] for row in cur.fetchall()]
+    if position == 1:
+        return None, (ranks[0] if ranks else None)
+    return (ranks[0] if ranks else None), (ranks[1] if len(ranks) > 1 else None)
+
+
+def schedule_renormalize(cur, city: str):
+    '''Поставить нормализацию города, если она ещё не ждёт в очереди. Вызывается
+    под lock_city. Уже запущенная нормализация не в счёт: она могла прочитать
+    порядок до этой перестановки, поэтому ключ идемпотентности (он общий для
+    queued и running) здесь не подходит'''
+    cur.execute(f"""
+        SELECT 1 FROM {SCHEMA}.jobs
+        WHERE kind = %s AND status = 'queued' AND payload->>'city' = %s
+        LIMIT 1
+    """, (AUCTION_RENORMALIZE, city))
+    if cur.fetchone():
+        return
+    enqueue(cur, AUCTION_RENORMALIZE, {'city': city}, delay_seconds=RENORMALIZE_DELAY_SECONDS)
+
+
+def renormalize_city(cur, city: str) -> int:
+    '''Раздать ранги города заново с шагом RANK_GAP и пересчитать позиции auction'''
+    lock_city(cur, city)
+    cur.execute(f"""
+        UPDATE {SCHEMA}.listings l
+        SET auction_rank = r.rn * %s, auction = r.rn
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (ORDER BY auction_rank, id) AS rn
+            FROM {SCHEMA}.listings
+            WHERE city = %s
+        ) r
+        WHERE l.id = r.id
+          AND (l.auction_rank <> r.rn * %s OR l.auction IS DISTINCT FROM r.rn)
+    """, (RANK_GAP, city, RANK_GAP))
+    return cur.rowcount
+
+
+def move_listing(cur, listing_id: int, position: int):
+    '''Поставить объект на позицию position в его городе. Вызывается в транзакции;
+    возвращает {id, city, old_position, position} или None, если объекта нет'''
+    cur.execute(f"""
+        SELECT city, auction FROM {SCHEMA}.listings WHERE id = %s
+    """, (listing_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    city, old_position = (row['city'], row['auction']) if isinstance(row, dict) else row
+    position = max(int(position), 1)
+
+    lock_city(cur, city)
+    rank = rank_between(*_neighbours(cur, city, listing_id, position))
+    if rank is None:
+        renormalize_city(cur, city)
+        rank = rank_between(*_neighbours(cur, city, listing_id, position))
+
+    cur.execute(f"""
+        UPDATE {SCHEMA}.listings
+        SET auction_rank = %s, auction = %s
+        WHERE id = %s
+    """, (rank, position, listing_id))
+
+    schedule_renormalize(cur, city)
+    return {'id': listing_id, 'city': city, 'old_position': old_position, 'position': position}
@@ -0,0 +1,355 @@
+"""Публичный каталог для public-listings: снимки и постраничная выдача.
+
+Каталог хранится в catalog_snapshots в уже сериализованном виде (JSON и
+gzip) с ETag: отдельный снимок на каждый город и общий снимок 'all',
+который склеивается из городских без повторной сериализации.
+
+Функции, меняющие объекты, вызывают invalidate_catalog() в своей транзакции —
+это помечает снимки затронутых городов устаревшими. Пересборка выполняется
+при первом чтении и только для устаревших городов.
+
+get_listings_page() отдаёт каталог страницами (keyset по city, auction_rank, id)
+с проекцией полей — для карточек, которым не нужен весь объём данных.
+"""
+import base64
+import gzip
+import hashlib
+import json
+
+from psycopg2.extras import RealDictCursor
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+GLOBAL_SCOPE = 'all'
+
+# Страховка для записей, которые не вызывают invalidate_catalog (продление
+# подписки, геокодинг, оценки экспертов): снимок старше TTL пересобирается
+SNAPSHOT_TTL_SECONDS = 300
+
+# Объекты с позицией для показа (#1, #2, ...): номер в городе по auction_rank.
+# listings.auction у непереставленных объектов обновляется фоновой нормализацией
+# с задержкой (см. _common/auction_ranks.py), поэтому позиция считается здесь
+RANKED_LISTINGS = f"""(
+    SELECT l.*, ROW_NUMBER() OVER (PARTITION BY l.city ORDER BY l.auction_rank, l.id) AS position
+    FROM {SCHEMA}.listings l
+)"""
+
+VISIBLE_CONDITION = "l.is_archived = false AND (l.moderation_status IS NULL OR l.moderation_status = 'approved')"
+
+# Обложка объекта: image_url может быть JSON-массивом
+IMAGE_URL = "CASE WHEN l.image_url LIKE '[%%' THEN (l.image_url::json->>0) ELSE l.image_url END"
+
+# Поля объекта в ответе public-listings: имя в JSON -> SQL-выражение
+LISTING_FIELDS = {
+    'id': 'l.id',
+    'title': 'l.title',
+    'type': 'l.type',
+    'city': 'l.city',
+    'district': 'l.district',
+    'address': 'l.address',
+    'price': 'l.price',
+    'rating': 'l.rating',
+    'reviews': 'l.reviews',
+    'auction': 'l.position',
+    'image_url': IMAGE_URL,
+    'image_variants': f'(SELECT iv.variants FROM {SCHEMA}.image_variants iv WHERE iv.url = {IMAGE_URL})',
+    'image_lqip': f'(SELECT iv.lqip FROM {SCHEMA}.image_variants iv WHERE iv.url = {IMAGE_URL})',
+    'logo_url': 'l.logo_url',
+    'metro': 'l.metro',
+    'metroWalk': 'l.metro_walk',
+    'hasParking': 'l.has_parking',
+    'parking_type': 'l.parking_type',
+    'parking_price_per_hour': 'l.parking_price_per_hour',
+    'lat': 'l.lat',
+    'lng': 'l.lng',
+    'minHours': 'l.min_hours',
+    'phone': 'l.phone',
+    'telegram': 'l.telegram',
+    'price_warning_holidays': 'l.price_warning_holidays',
+    'price_warning_daytime': 'l.price_warning_daytime',
+    'subscription_expires_at': 'l.subscription_expires_at'
+}
+
+# Вложенные коллекции, которые можно запросить через fields=
+NESTED_FIELDS = ('rooms', 'metro_stations')
+
+ROOM_SHAPES = ('summary', 'full')
+
+# Ключ сортировки каталога и курсора пагинации
+ORDER_KEY = 'l.city, l.auction_rank, l.id'
+
+
+def listing_columns(fields) -> str:
+    return ', '.join(f'{LISTING_FIELDS[name]} AS "{name}"' for name in fields)
+
+
+LISTINGS_QUERY = f"""
+    SELECT {listing_columns(LISTING_FIELDS)}
+    FROM {RANKED_LISTINGS} l
+    WHERE {VISIBLE_CONDITION} AND LOWER(l.city) = %s
+    ORDER BY {ORDER_KEY}
+"""
+
+
+def city_scope(city_key: str) -> str:
+    return f'city:{city_key}'
+
+
+def fetch_rooms(cur, listing_ids: list, shape: str = 'full') -> dict:
+    '''Комнаты объектов по listing_id; shape=summary — без массива images'''
+    if shape == 'summary':
+        columns = 'listing_id, type, price, square_meters, min_hours, features, COALESCE(array_length(images, 1), 0) AS images_count'
+    else:
+        columns = 'listing_id, type, price, square_meters, min_hours, features, images'
+    cur.execute(
+        f"""SELECT {columns}
+            FROM {SCHEMA}.rooms
+            WHERE listing_id = ANY(%s)""",
+        (listing_ids,)
+    )
+    rooms_by_listing = {}
+    for room in cur.fetchall():
+        room_dict = dict(room)
+        lid = room_dict.pop('listing_id')
+        rooms_by_listing.setdefault(lid, []).append(room_dict)
+    return rooms_by_listing
+
+
+def fetch_metro(cur, listing_ids: list) -> dict:
+    cur.execute(
+        f"""SELECT listing_id, station_name, walk_minutes
+            FROM {SCHEMA}.metro_stations
+            WHERE listing_id = ANY(%s)""",
+        (listing_ids,)
+    )
+    metro_by_listing = {}
+    for metro in cur.fetchall():
+        metro_dict = dict(metro)
+        lid = metro_dict.pop('listing_id')
+        metro_by_listing.setdefault(lid, []).append(metro_dict)
+    return metro_by_listing
+
+
+def build_city_listings(cur, city_key: str) -> list:
+    '''Объекты города (city_key — LOWER(city)) с комнатами и станциями метро'''
+    cur.execute(LISTINGS_QUERY, (city_key,))
+    listings = cur.fetchall()
+    if not listings:
+        return []
+
+    listing_ids = [l['id'] for l in listings]
+    rooms_by_listing = fetch_rooms(cur, listing_ids)
+    metro_by_listing = fetch_metro(cur, listing_ids)
+
+    result = []
+    for listing in listings:
+        listing_dict = dict(listing)
+        listing_dict['rooms'] = rooms_by_listing.get(listing_dict['id'], [])
+        listing_dict['metro_stations'] = metro_by_listing.get(listing_dict['id'], [])
+        result.append(listing_dict)
+    return result
+
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps([row['_city'], row['_rank'], row['_id']], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    '''(city, auction_rank, id) из курсора; ValueError при некорректном значении'''
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        city, rank, listing_id = json.loads(raw.decode('utf-8'))
+        return str(city), int(rank), int(listing_id)
+    except Exception:
+        raise ValueError('Некорректный cursor')
+
+
+def get_listings_page(cur, city: str = None, cursor: str = None, limit: int = 20,
+                      fields=None, room_shape: str = 'summary') -> dict:
+    '''Страница каталога с keyset-пагинацией по (city, auction_rank, id).
+
+    fields — список полей из LISTING_FIELDS и NESTED_FIELDS (по умолчанию все),
+    room_shape — summary (без images) или full.
+    '''
+    fields = list(fields) if fields else list(LISTING_FIELDS) + list(NESTED_FIELDS)
+    scalar_fields = [f for f in fields if f in LISTING_FIELDS]
+    if 'id' not in scalar_fields:
+        scalar_fields.insert(0, 'id')
+
+    conditions = [VISIBLE_CONDITION]
+    params = []
+    if city:
+        conditions.append('LOWER(l.city) = LOWER(%s)')
+        params.append(city)
+    if cursor:
+        conditions.append(f'({ORDER_KEY}) > (%s, %s, %s)')
+        params.extend(decode_cursor(cursor))
+    params.append(limit + 1)
+
+    cur.execute(f"""
+        SELECT {listing_columns(scalar_fields)},
+               l.city AS "_city", l.auction_rank AS "_rank", l.id AS "_id"
+        FROM {RANKED_LISTINGS} l
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {ORDER_KEY}
+        LIMIT %s
+    """, params)
+    rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+
+    listing_ids = [row['_id'] for row in rows]
+    rooms_by_listing = fetch_rooms(cur, listing_ids, room_shape) if listing_ids and 'rooms' in fields else None
+    metro_by_listing = fetch_metro(cur, listing_ids) if listing_ids and 'metro_stations' in fields else None
+
+    items = []
+    for row in rows:
+        item = {name: row[name] for name in scalar_fields}
+        if rooms_by_listing is not None:
+            item['rooms'] = rooms_by_listing.get(row['_id'], [])
+        if metro_by_listing is not None:
+            item['metro_stations'] = metro_by_listing.get(row['_id'], [])
+        items.append(item)
+
+    return {'items': items, 'next_cursor': next_cursor}
+
+
+def _store_snapshot(cur, scope: str, city_key, body: bytes, listings_count: int, version: int) -> dict:
+    snapshot = {
+        'etag': hashlib.sha1(body).hexdigest(),
+        'body': body,
+        'body_gzip': gzip.compress(body, compresslevel=6, mtime=0),
+        'listings_count': listings_count
+    }
+    # Если за время сборки снимок успели инвалидировать (version вырос),
+    # сохраняем данные, но оставляем его устаревшим
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.catalog_snapshots
+            (scope, city, etag, body, body_gzip, listings_count, version, is_stale, built_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, false, NOW())
+        ON CONFLICT (scope) DO UPDATE SET
+            etag = EXCLUDED.etag,
+            body = EXCLUDED.body,
+            body_gzip = EXCLUDED.body_gzip,
+            listings_count = EXCLUDED.listings_count,
+            built_at = EXCLUDED.built_at,
+            is_stale = {SCHEMA}.catalog_snapshots.version <> %s
+    """, (scope, city_key, snapshot['etag'], body, snapshot['body_gzip'],
+          listings_count, version, version))
+    return snapshot
+
+
+def _current_version(cur, scope: str) -> int:
+    cur.execute(f"SELECT version FROM {SCHEMA}.catalog_snapshots WHERE scope = %s", (scope,))
+    row = cur.fetchone()
+    return row['version'] if row else 0
+
+
+def rebuild_city_snapshot(cur, city_key: str) -> dict:
+    scope = city_scope(city_key)
+    version = _current_version(cur, scope)
+    listings = build_city_listings(cur, city_key)
+    body = json.dumps(listings, default=str).encode('utf-8')
+    return _store_snapshot(cur, scope, city_key, body, len(listings), version)
+
+
+def rebuild_global_snapshot(cur) -> dict:
+    '''Пересобрать устаревшие городские снимки и склеить из них общий'''
+    version = _current_version(cur, GLOBAL_SCOPE)
+
+    cur.execute(f"""
+        SELECT DISTINCT LOWER(l.city) AS city_key
+        FROM {SCHEMA}.listings l
+        WHERE {VISIBLE_CONDITION}
+    """)
+    live_keys = {row['city_key'] for row in cur.fetchall()}
+
+    cur.execute(f"""
+        SELECT city FROM {SCHEMA}.catalog_snapshots
+        WHERE city IS NOT NULL
+          AND NOT is_stale AND built_at >= NOW() - make_interval(secs => %s)
+    """, (SNAPSHOT_TTL_SECONDS,))
+    fresh_keys = {row['city'] for row in cur.fetchall()}
+
+    for city_key in live_keys - fresh_keys:
+        rebuild_city_snapshot(cur, city_key)
+
+    cur.execute(f"""
+        DELETE FROM {SCHEMA}.catalog_snapshots
+        WHERE city IS NOT NULL AND NOT (city = ANY(%s))
+    """, (list(live_keys),))
+
+    cur.execute(f"""
+        SELECT body, listings_count FROM {SCHEMA}.catalog_snapshots
+        WHERE city IS NOT NULL AND listings_count > 0
+        ORDER BY city ASC
+    """)
+    parts = []
+    listings_count = 0
+    for row in cur.fetchall():
+        parts.append(bytes(row['body'])[1:-1])
+        listings_count += row['listings_count']
+    body = b'[' + b','.join(parts) + b']'
+    return _store_snapshot(cur, GLOBAL_SCOPE, None, body, listings_count, version)
+
+
+def get_catalog_snapshot(conn, city: str = None, if_none_match: str = None) -> dict:
+    '''Снимок каталога (города или общий) одним запросом по ключу.
+
+    Возвращает etag, body, body_gzip и not_modified; при совпадении ETag тела
+    не читаются из БД. Отсутствующий или устаревший снимок пересобирается.
+    '''
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        cur.execute(f"""
+            SELECT etag,
+                   is_stale OR built_at < NOW() - make_interval(secs => %s) AS expired,
+                   etag = %s AS not_modified,
+                   CASE WHEN etag = %s THEN NULL ELSE body END AS body,
+                   CASE WHEN etag = %s THEN NULL ELSE body_gzip END AS body_gzip
+            FROM {SCHEMA}.catalog_snapshots
+            WHERE scope = COALESCE('city:' || LOWER(%s::text), %s)
+        """, (SNAPSHOT_TTL_SECONDS, if_none_match, if_none_match, if_none_match, city or None, GLOBAL_SCOPE))
+        row = cur.fetchone()
+
+        if row and not row['expired']:
+            if row['not_modified']:
+                return {'etag': row['etag'], 'not_modified': True, 'body': None, 'body_gzip': None}
+            return {
+                'etag': row['etag'],
+                'not_modified': False,
+                'body': bytes(row['body']),
+                'body_gzip': bytes(row['body_gzip'])
+            }
+
+        if city:
+            cur.execute("SELECT LOWER(%s) AS city_key", (city,))
+            snapshot = rebuild_city_snapshot(cur, cur.fetchone()['city_key'])
+        else:
+            snapshot = rebuild_global_snapshot(cur)
+        conn.commit()
+
+        snapshot['not_modified'] = snapshot['etag'] == if_none_match
+        return snapshot
+    finally:
+        cur.close()
+
+
+def invalidate_catalog(cur, listing_ids=None, cities=None):
+    '''Пометить устаревшими снимки городов указанных объектов/городов и общий снимок.
+
+    Вызывается в транзакции, меняющей объекты. Если объект переезжает в другой
+    город, передайте старый город в cities.
+    '''
+    listing_ids = [int(i) for i in (listing_ids or [])]
+    cities = [c for c in (cities or []) if c]
+    cur.execute(f"""
+        UPDATE {SCHEMA}.catalog_snapshots
+        SET is_stale = true, version = version + 1
+        WHERE scope = %s
+           OR city IN (SELECT LOWER(city) FROM {SCHEMA}.listings WHERE id = ANY(%s))
+           OR city IN (SELECT LOWER(c) FROM unnest(%s::text[]) AS c)
+    """, (GLOBAL_SCOPE, listing_ids, cities))
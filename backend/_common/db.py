@@ -0,0 +1,162 @@
+"""Общий слой доступа к БД для всех облачных функций.
+
+Пул соединений живёт на уровне процесса и переживает тёплые вызовы
+контейнера, поэтому TCP+TLS+auth рукопожатие с PostgreSQL выполняется
+только на холодном старте. Соединения из пула проверяются перед выдачей,
+если долго простаивали, и пересоздаются по истечении максимального срока жизни.
+
+Использование:
+    conn = get_db_connection()   # conn.close() возвращает соединение в пул
+    ...
+    with transaction() as conn:  # COMMIT при успехе, ROLLBACK при исключении
+        ...
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+
+POOL_MAX_IDLE = int(os.environ.get('DB_POOL_MAX_IDLE', '4'))
+POOL_MAX_LIFETIME = int(os.environ.get('DB_POOL_MAX_LIFETIME', '600'))
+POOL_HEALTHCHECK_AFTER = int(os.environ.get('DB_POOL_HEALTHCHECK_AFTER', '30'))
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    '''Соединение, которое при close() возвращается в пул, а не закрывается'''
+
+    def __init__(self, dsn, *args, **kwargs):
+        super().__init__(dsn, *args, **kwargs)
+        self.pool = None
+        self.idle = False
+        self.created_at = time.monotonic()
+        self.released_at = self.created_at
+
+    def close(self):
+        if self.pool is None:
+            self.discard()
+        else:
+            self.pool.release(self)
+
+    def discard(self):
+        '''Физически закрыть соединение'''
+        if not self.closed:
+            psycopg2.extensions.connection.close(self)
+
+
+class ConnectionPool:
+    '''Пул соединений одного DSN с проверкой живости и ограничением срока жизни'''
+
+    def __init__(self, dsn: str, max_idle: int = POOL_MAX_IDLE,
+                 max_lifetime: int = POOL_MAX_LIFETIME,
+                 healthcheck_after: int = POOL_HEALTHCHECK_AFTER):
+        self.dsn = dsn
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.healthcheck_after = healthcheck_after
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _expired(self, conn: PooledConnection) -> bool:
+        return time.monotonic() - conn.created_at > self.max_lifetime
+
+    def _healthy(self, conn: PooledConnection) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.released_at < self.healthcheck_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def acquire(self) -> PooledConnection:
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                break
+            conn.idle = False
+            if not self._expired(conn) and self._healthy(conn):
+                return conn
+            conn.discard()
+
+        conn = psycopg2.connect(self.dsn, connection_factory=PooledConnection)
+        conn.pool = self
+        return conn
+
+    def release(self, conn: PooledConnection):
+        # Повторный close() того же соединения не должен класть его в пул дважды
+        if conn.closed or conn.idle:
+            return
+        try:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                conn.discard()
+                return
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except psycopg2.Error:
+            conn.discard()
+            return
+
+        if self._expired(conn):
+            conn.discard()
+            return
+
+        conn.released_at = time.monotonic()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                conn.idle = True
+                self._idle.append(conn)
+                return
+        conn.discard()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.discard()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn: str = None) -> ConnectionPool:
+    '''Пул для DSN (по умолчанию DATABASE_URL), общий для всех вызовов в контейнере'''
+    dsn = dsn or os.environ['DATABASE_URL']
+    pool = _pools.get(dsn)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(dsn)
+            if pool is None:
+                pool = _pools[dsn] = ConnectionPool(dsn)
+    return pool
+
+
+def get_db_connection(dsn: str = None) -> PooledConnection:
+    '''Взять соединение из пула; conn.close() вернёт его обратно'''
+    return get_pool(dsn).acquire()
+
+
+@contextmanager
+def transaction(dsn: str = None):
+    '''Соединение на время одной транзакции: COMMIT при успехе, ROLLBACK при ошибке'''
+    conn = get_db_connection(dsn)
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
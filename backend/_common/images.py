@@ -0,0 +1,324 @@
+"""Обработка загружаемых фотографий: уменьшенные копии, WebP/AVIF и LQIP.
+
+Оригинал и производные лежат под детерминированными ключами от хэша
+содержимого: listings/<sha256>/original.<ext>, listings/<sha256>/<variant>.<format>.
+Описание копий сохраняется в image_variants по URL оригинала, поэтому
+rooms.images и listings.image_url остаются списками обычных URL: каталог
+отдаёт копии обложки объекта, а адрес копии фотографии комнаты получается
+заменой original.<ext> на <variant>.webp (или .jpeg) в её URL.
+
+upload_image() перед записью ищет фото в image_hashes по SHA-256: для
+повторной загрузки того же файла возвращается уже сохранённый URL. Похожее
+фото (близкий перцептивный хэш, dHash) ничем не подменяется — это может быть
+другой номер или фото другого владельца; такая загрузка лишь помечается
+near_duplicate_of для модерации.
+
+Требует Pillow; AVIF кодируется, только если сборка Pillow его поддерживает.
+"""
+import base64
+import hashlib
+import json
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from _common.db import get_db_connection
+
+Image.init()
+
+BUCKET = 'files'
+S3_ENDPOINT = 'https://bucket.poehali.dev'
+
+# Вариант -> максимальная ширина (высота по пропорции)
+VARIANTS = {
+    'card': 480,
+    'gallery': 1024,
+    'full': 1920
+}
+
+QUALITY = {'webp': 80, 'avif': 55, 'jpeg': 82}
+CONTENT_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+    'avif': 'image/avif'
+}
+LQIP_WIDTH = 16
+
+# Порог расстояния Хэмминга между dHash, при котором фото помечаются похожими
+# (пересжатие, уменьшение). Больше 3 нельзя: поиск по блокам хэша это не покроет
+NEAR_DUPLICATE_DISTANCE = 3
+# Сколько кандидатов с совпавшим блоком проверяется по расстоянию
+NEAR_DUPLICATE_CANDIDATES = 50
+# Однотонные и тёмные кадры дают почти нулевой dHash и совпадают друг с другом
+LOW_ENTROPY_BITS = 6
+
+# Год: ключ определяется содержимым, поэтому файл по ключу никогда не меняется
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def output_formats() -> list:
+    formats = ['webp', 'jpeg']
+    if 'AVIF' in Image.SAVE:
+        formats.insert(0, 'avif')
+    return formats
+
+
+def get_s3():
+    import boto3
+    return boto3.client('s3',
+        endpoint_url=S3_ENDPOINT,
+        aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+        aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+    )
+
+
+def cdn_url(key: str) -> str:
+    return f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{key}"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def encode(image: Image.Image, image_format: str) -> bytes:
+    out = BytesIO()
+    if image_format == 'jpeg':
+        image.convert('RGB').save(out, 'JPEG', quality=QUALITY['jpeg'], optimize=True, progressive=True)
+    elif image_format == 'webp':
+        image.save(out, 'WEBP', quality=QUALITY['webp'], method=4)
+    else:
+        image.save(out, 'AVIF', quality=QUALITY['avif'])
+    return out.getvalue()
+
+
+def lqip(image: Image.Image) -> str:
+    '''Крошечное размытое превью как data URI — показывается, пока грузится картинка'''
+    height = max(1, round(image.height * LQIP_WIDTH / image.width))
+    small = image.convert('RGB').resize((LQIP_WIDTH, height), Image.BILINEAR)
+    out = BytesIO()
+    small.save(out, 'WEBP', quality=30)
+    return 'data:image/webp;base64,' + base64.b64encode(out.getvalue()).decode('ascii')
+
+
+def render_variants(data: bytes):
+    '''Производные копии изображения: ([(variant, format, width, height, bytes)], width, height, lqip)'''
+    image = Image.open(BytesIO(data))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    rendered = []
+    encoded = {}
+    for variant, max_width in VARIANTS.items():
+        width = min(max_width, image.width)
+        height = max(1, round(image.height * width / image.width))
+        # Маленький оригинал: варианты одного размера кодируются один раз,
+        # но сохраняются под всеми ключами, чтобы адрес любого варианта был валиден
+        if width not in encoded:
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            encoded[width] = {f: encode(resized, f) for f in output_formats()}
+        for image_format, body in encoded[width].items():
+            rendered.append((variant, image_format, width, height, body))
+    return rendered, image.width, image.height, lqip(image)
+
+
+def store_image(s3, data: bytes, extension: str) -> dict:
+    '''Загрузить оригинал и его копии в S3. Возвращает {url, variants, lqip, width, height}.
+
+    Если файл не удалось разобрать как изображение, сохраняется только оригинал.
+    '''
+    extension = (extension or 'jpg').lower()
+    digest = content_hash(data)
+    original_key = f'listings/{digest}/original.{extension}'
+    s3.put_object(
+        Bucket=BUCKET,
+        Key=original_key,
+        Body=data,
+        ContentType=CONTENT_TYPES.get(extension, 'image/jpeg'),
+        CacheControl=IMMUTABLE_CACHE_CONTROL
+    )
+    return store_variants(s3, data, digest, original_key)
+
+
+def store_variants(s3, data: bytes, digest: str, original_key: str) -> dict:
+    '''Загрузить копии уже сохранённого оригинала'''
+    result = {'url': cdn_url(original_key), 'variants': {}, 'lqip': None, 'width': None, 'height': None}
+
+    try:
+        rendered, width, height, placeholder = render_variants(data)
+    except Exception as e:
+        print(f'[IMAGES] Variants skipped for {original_key}: {e}')
+        return result
+
+    variants = {}
+    for variant, image_format, variant_width, variant_height, body in rendered:
+        key = f'listings/{digest}/{variant}.{image_format}'
+        s3.put_object(
+            Bucket=BUCKET,
+            Key=key,
+            Body=body,
+            ContentType=CONTENT_TYPES[image_format],
+            CacheControl=IMMUTABLE_CACHE_CONTROL
+        )
+        entry = variants.setdefault(variant, {'width': variant_width, 'height': variant_height})
+        entry[image_format] = cdn_url(key)
+
+    result.update({'variants': variants, 'lqip': placeholder, 'width': width, 'height': height})
+    return result
+
+
+def record_variants(cur, image: dict):
+    '''Запомнить копии оригинала, чтобы каталог отдавал их вместо полноразмерного файла'''
+    if not image.get('variants'):
+        return
+    cur.execute("""
+        INSERT INTO image_variants (url, width, height, lqip, variants)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (url) DO UPDATE
+        SET width = EXCLUDED.width, height = EXCLUDED.height,
+            lqip = EXCLUDED.lqip, variants = EXCLUDED.variants
+    """, (image['url'], image['width'], image['height'], image['lqip'], json.dumps(image['variants'])))
+
+
+def perceptual_hash(data: bytes):
+    '''64-битный dHash: устойчив к пересжатию и масштабу; None, если это не изображение'''
+    try:
+        image = Image.open(BytesIO(data))
+        image.draft('L', (64, 64))
+        image = ImageOps.exif_transpose(image)
+        pixels = list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    except Exception:
+        return None
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    # BIGINT в PostgreSQL знаковый
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def hash_bands(phash: int) -> list:
+    '''Четыре 16-битных блока хэша. При расстоянии Хэмминга <= 3 хотя бы один блок совпадает точно'''
+    unsigned = phash & ((1 << 64) - 1)
+    return [(unsigned >> shift) & 0xFFFF for shift in (48, 32, 16, 0)]
+
+
+def hamming(a: int, b: int) -> int:
+    return bin((a ^ b) & ((1 << 64) - 1)).count('1')
+
+
+def find_duplicate(cur, digest: str):
+    '''Уже сохранённое изображение с тем же содержимым (SHA-256) либо None'''
+    cur.execute("""
+        SELECT h.sha256, h.url, h.width, h.height, h.phash,
+               COALESCE(iv.variants, '{}'::jsonb) AS variants, iv.lqip
+        FROM image_hashes h
+        LEFT JOIN image_variants iv ON iv.url = h.url
+        WHERE h.sha256 = %s
+    """, (digest,))
+    row = cur.fetchone()
+    return _duplicate_result(row, 'exact') if row else None
+
+
+def is_low_entropy(phash: int) -> bool:
+    '''Почти все биты dHash одинаковы — у таких кадров похожесть ничего не значит'''
+    bits = bin(phash & ((1 << 64) - 1)).count('1')
+    return bits <= LOW_ENTROPY_BITS or bits >= 64 - LOW_ENTROPY_BITS
+
+
+def find_similar(cur, digest: str, phash=None):
+    '''Ближайшее похожее фото (dHash): (sha256, расстояние) или None. Только для пометки'''
+    if phash is None or is_low_entropy(phash):
+        return None
+    cur.execute("""
+        SELECT sha256, phash
+        FROM image_hashes
+        WHERE (phash_band1 = %s OR phash_band2 = %s OR phash_band3 = %s OR phash_band4 = %s)
+          AND sha256 <> %s
+        LIMIT %s
+    """, (*hash_bands(phash), digest, NEAR_DUPLICATE_CANDIDATES))
+    candidates = [(row[0], hamming(row[1], phash)) for row in cur.fetchall() if row[1] is not None]
+    candidates = [c for c in candidates if c[1] <= NEAR_DUPLICATE_DISTANCE]
+    return min(candidates, key=lambda c: c[1]) if candidates else None
+
+
+def _duplicate_result(row, kind: str) -> dict:
+    variants = row[5]
+    if isinstance(variants, str):
+        variants = json.loads(variants)
+    return {
+        'url': row[1], 'variants': variants, 'lqip': row[6],
+        'width': row[2], 'height': row[3], 'sha256': row[0], 'duplicate': kind
+    }
+
+
+def register_hash(cur, image: dict, digest: str, phash=None):
+    '''Внести изображение в индекс дублей; повторная загрузка увеличивает счётчик.
+    Похожее на уже известное фото помечается near_duplicate_of для модерации'''
+    bands = hash_bands(phash) if phash is not None else [None] * 4
+    similar = find_similar(cur, digest, phash)
+    cur.execute("""
+        INSERT INTO image_hashes
+            (sha256, url, width, height, phash, phash_band1, phash_band2, phash_band3, phash_band4,
+             near_duplicate_of, near_duplicate_distance)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (sha256) DO UPDATE SET uses = image_hashes.uses + 1
+    """, (digest, image['url'], image.get('width'), image.get('height'), phash, *bands,
+          similar[0] if similar else None, similar[1] if similar else None))
+    if similar:
+        print(f'[IMAGES] {image["url"]} is similar to {similar[0]} (distance {similar[1]}), flagged for moderation')
+
+
+def count_reuse(cur, duplicate: dict):
+    cur.execute("UPDATE image_hashes SET uses = uses + 1 WHERE sha256 = %s", (duplicate['sha256'],))
+
+
+def save_image(image: dict, digest: str, phash=None):
+    '''Записать копии и хэш в отдельной транзакции; сбой записи не должен ронять загрузку'''
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        record_variants(cur, image)
+        register_hash(cur, image, digest, phash)
+        conn.commit()
+        cur.close()
+    except Exception as e:
+        print(f'[IMAGES] Failed to record image {image["url"]}: {e}')
+    finally:
+        if conn:
+            conn.close()
+
+
+def upload_image(s3, data: bytes, extension: str) -> dict:
+    '''Загрузка с дедупликацией: для уже известного файла (тот же SHA-256)
+    возвращается существующий URL без записи в хранилище'''
+    digest = content_hash(data)
+    phash = perceptual_hash(data)
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        duplicate = find_duplicate(cur, digest)
+        if duplicate:
+            count_reuse(cur, duplicate)
+            conn.commit()
+            print(f'[IMAGES] Exact duplicate of {duplicate["url"]}')
+            return duplicate
+        cur.close()
+    except Exception as e:
+        # Индекс дублей — оптимизация: без БД фото просто сохраняется
+        print(f'[IMAGES] Duplicate lookup failed: {e}')
+    finally:
+        if conn:
+            conn.close()
+
+    image = store_image(s3, data, extension)
+    save_image(image, digest, phash)
+    image['duplicate'] = None
+    return image
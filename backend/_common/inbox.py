@@ -0,0 +1,143 @@
+"""Постраничная выдача сообщений и счётчики непрочитанного.
+
+Страница сообщений выбирается по ключу (created_at, id) вокруг сообщения-курсора:
+before=<id> — более старые, after=<id> — более новые. Запрос идёт по составным
+индексам (получатель/владелец, created_at, id) и читает не больше limit строк,
+сколько бы сообщений ни было в переписке.
+
+Непрочитанные считаются не по сообщениям, а хранятся по диалогам:
+employee_conversations — по паре сотрудников, owner_manager_conversations —
+по паре владелец/менеджер. Счётчик увеличивается при отправке и обнуляется
+при прочтении; обе операции вызываются в транзакции записи сообщения.
+Запись сообщения заодно уведомляет ожидающих long-poll (см. _common/message_feed.py).
+"""
+from _common.message_feed import EMPLOYEE_CHANNEL, OWNER_CHAT_CHANNEL, notify
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 200
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+
+
+def page_params(params: dict) -> dict:
+    '''before/after/limit из query string; ValueError при неверных значениях'''
+    before = params.get('before')
+    after = params.get('after')
+    if before and after:
+        raise ValueError('before и after нельзя передавать вместе')
+    limit = int(params.get('limit') or PAGE_SIZE)
+    if limit < 1:
+        raise ValueError('limit должен быть положительным')
+    return {
+        'before': int(before) if before else None,
+        'after': int(after) if after else None,
+        'limit': min(limit, MAX_PAGE_SIZE)
+    }
+
+
+def keyset(table: str, alias: str, page: dict):
+    '''Условие курсора и направление сортировки: (sql, params, order)'''
+    if page['before']:
+        return (f"AND ({alias}.created_at, {alias}.id) < "
+                f"(SELECT created_at, id FROM {table} WHERE id = %s)", [page['before']], 'DESC')
+    if page['after']:
+        return (f"AND ({alias}.created_at, {alias}.id) > "
+                f"(SELECT created_at, id FROM {table} WHERE id = %s)", [page['after']], 'ASC')
+    return '', [], 'DESC'
+
+
+def page_result(rows: list, page: dict, order: str, newest_first: bool) -> dict:
+    '''Обрезать лишнюю строку, упорядочить и вернуть курсоры {items, has_more, before, after}'''
+    has_more = len(rows) > page['limit']
+    rows = rows[:page['limit']]
+    # Строки пришли от курсора наружу; newest_first — порядок, в котором их ждёт клиент
+    if (order == 'DESC') != newest_first:
+        rows = list(reversed(rows))
+    ids = [row['id'] for row in rows]
+    return {
+        'items': rows,
+        'has_more': has_more,
+        'before': min(ids) if ids else page['before'],
+        'after': max(ids) if ids else page['after']
+    }
+
+
+def record_employee_message(cur, message_id: int, sender_id: int, recipient_id: int):
+    '''Обновить диалоги отправителя и получателя; получателю +1 непрочитанное'''
+    rows = [(sender_id, recipient_id, 0, message_id)]
+    if recipient_id != sender_id:
+        rows.append((recipient_id, sender_id, 1, message_id))
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.employee_conversations
+            (admin_id, peer_id, unread_count, last_message_id, last_message_at)
+        SELECT admin_id, peer_id, unread_count, last_message_id, NOW()
+        FROM unnest(%s::int[], %s::int[], %s::int[], %s::int[])
+            AS r(admin_id, peer_id, unread_count, last_message_id)
+        ON CONFLICT (admin_id, peer_id) DO UPDATE
+        SET unread_count = employee_conversations.unread_count + EXCLUDED.unread_count,
+            last_message_id = GREATEST(employee_conversations.last_message_id, EXCLUDED.last_message_id),
+            last_message_at = EXCLUDED.last_message_at
+    """, [list(column) for column in zip(*rows)])
+    notify(cur, EMPLOYEE_CHANNEL, sender_id, recipient_id, message_id)
+
+
+def mark_employee_read(cur, admin_id: int, peer_id: int = None) -> int:
+    '''Отметить прочитанными входящие сотрудника (от одного собеседника или все)'''
+    peer_condition = 'AND sender_id = %s' if peer_id else ''
+    params = [admin_id] + ([peer_id] if peer_id else [])
+    cur.execute(f"""
+        UPDATE {SCHEMA}.employee_messages
+        SET is_read = TRUE
+        WHERE recipient_id = %s {peer_condition} AND is_read IS NOT TRUE
+    """, params)
+    marked = cur.rowcount
+    cur.execute(f"""
+        UPDATE {SCHEMA}.employee_conversations
+        SET unread_count = 0
+        WHERE admin_id = %s {peer_condition.replace('sender_id', 'peer_id')} AND unread_count <> 0
+    """, params)
+    return marked
+
+
+def employee_unread(cur, admin_id: int) -> int:
+    cur.execute(f"""
+        SELECT COALESCE(SUM(unread_count), 0) AS unread
+        FROM {SCHEMA}.employee_conversations
+        WHERE admin_id = %s
+    """, (admin_id,))
+    row = cur.fetchone()
+    return int(row['unread'] if isinstance(row, dict) else row[0])
+
+
+def record_owner_message(cur, message_id: int, owner_id: int, manager_id: int, sender_type: str):
+    '''Обновить диалог владельца и менеджера; непрочитанное — у стороны-получателя'''
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.owner_manager_conversations
+            (owner_id, manager_id, unread_by_owner, unread_by_manager, last_message_id, last_message_at)
+        VALUES (%s, %s, %s, %s, %s, NOW())
+        ON CONFLICT (owner_id, manager_id) DO UPDATE
+        SET unread_by_owner = owner_manager_conversations.unread_by_owner + EXCLUDED.unread_by_owner,
+            unread_by_manager = owner_manager_conversations.unread_by_manager + EXCLUDED.unread_by_manager,
+            last_message_id = GREATEST(owner_manager_conversations.last_message_id, EXCLUDED.last_message_id),
+            last_message_at = EXCLUDED.last_message_at
+    """, (owner_id, manager_id,
+          1 if sender_type == 'manager' else 0,
+          1 if sender_type == 'owner' else 0,
+          message_id))
+    notify(cur, OWNER_CHAT_CHANNEL, owner_id, manager_id, message_id)
+
+
+def mark_owner_chat_read(cur, reader: str, owner_id: int, manager_id: int = None):
+    '''Сбросить непрочитанное: reader='owner' — все менеджеры владельца, 'manager' — один диалог'''
+    if reader == 'owner':
+        cur.execute(f"""
+            UPDATE {SCHEMA}.owner_manager_conversations
+            SET unread_by_owner = 0
+            WHERE owner_id = %s AND unread_by_owner <> 0
+        """, (owner_id,))
+    else:
+        cur.execute(f"""
+            UPDATE {SCHEMA}.owner_manager_conversations
+            SET unread_by_manager = 0
+            WHERE owner_id = %s AND manager_id = %s AND unread_by_manager <> 0
+        """, (owner_id, manager_id))
@@ -0,0 +1,666 @@
+"""Фоновые задачи, которые выполняет job-worker (см. _common/jobs.py).
+
+Каждая задача получает payload задачи и возвращает результат (JSON),
+который отдаёт эндпоинт статуса. Соединение с БД задача берёт сама и
+не держит его на время внешних вызовов.
+"""
+import json
+import os
+import re
+import smtplib
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from psycopg2.extras import RealDictCursor
+
+from _common.auction_ranks import AUCTION_RENORMALIZE, renormalize_city
+from _common.catalog import invalidate_catalog
+from _common.db import get_db_connection, transaction
+from _common.inbox import record_owner_message
+from _common.listing_lifecycle import LIFECYCLE_NOTICES
+from _common.subscription_events import (
+    DISPATCH_SUBSCRIPTION_EVENTS, SUBSCRIPTION_REMINDERS, dispatch_due, schedule_dispatch
+)
+
+OWNER_CREDENTIALS = 'owner_credentials'
+LISTING_DESCRIPTION = 'listing_description'
+GEOCODE_LISTINGS = 'geocode_listings'
+EXOLVE_FORWARDING = 'exolve_forwarding'
+PROCESS_UPLOAD = 'process_upload'
+
+GEOCODE_BATCH = 30
+# Длинные задачи укладываются в окно запуска job-worker (WORKER_RUN_SECONDS = 50 с),
+# остаток работы — следующей задачей. Геокодирование:
+GEOCODE_BUDGET_SECONDS = 30
+
+# Продолжение диспетчера событий подписки
+DISPATCH_BUDGET_SECONDS = 30
+
+EXOLVE_WEBHOOK_URL = 'https://functions.poehali.dev/118f6961-69ab-4912-bbec-0481012af402'
+
+
+def send_email(to_email: str, subject: str, html_body: str):
+    """Отправка email через SMTP"""
+    smtp_host = os.environ.get('SMTP_HOST')
+    smtp_port = int(os.environ.get('SMTP_PORT', 587))
+    smtp_user = os.environ.get('SMTP_USER')
+    smtp_password = os.environ.get('SMTP_PASSWORD')
+
+    if not all([smtp_host, smtp_user, smtp_password]):
+        raise Exception('SMTP настройки не заданы. Добавьте SMTP_HOST, SMTP_USER, SMTP_PASSWORD в секреты проекта')
+
+    msg = MIMEMultipart('alternative')
+    msg['From'] = smtp_user
+    msg['To'] = to_email
+    msg['Subject'] = subject
+
+    html_part = MIMEText(html_body, 'html', 'utf-8')
+    msg.attach(html_part)
+
+    with smtplib.SMTP(smtp_host, smtp_port, timeout=30) as server:
+        server.starttls()
+        server.login(smtp_user, smtp_password)
+        server.send_message(msg)
+        print(f"[INFO] Email sent to {to_email}")
+
+
+def credentials_email(listing: dict, temporary_password: str) -> str:
+    '''HTML письма с данными для входа в экстранет'''
+    return f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="utf-8">
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+                .header {{ background: linear-gradient(135deg, #9333ea 0%, #ec4899 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
+                .content {{ background: #f9fafb; padding: 30px; border-radius: 0 0 10px 10px; }}
+                .credentials {{ background: white; padding: 20px; margin: 20px 0; border-left: 4px solid #9333ea; }}
+                .button {{ display: inline-block; background: linear-gradient(135deg, #9333ea 0%, #ec4899 100%); color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
+                .footer {{ text-align: center; color: #6b7280; font-size: 12px; margin-top: 20px; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>🎉 Ваш объект одобрен!</h1>
+                </div>
+                <div class="content">
+                    <p>Здравствуйте, {listing['full_name']}!</p>
+
+                    <p>Рады сообщить, что ваш объект <strong>"{listing['title']}"</strong> успешно прошел модерацию и опубликован на платформе 120 минут!</p>
+
+                    <div class="credentials">
+                        <h3>📧 Ваши данные для входа в экстранет:</h3>
+                        <p><strong>Логин (email):</strong> {listing['email']}</p>
+                        <p><strong>Пароль:</strong> {temporary_password}</p>
+                    </div>
+
+                    <p>Войдите в личный кабинет для управления вашим объектом:</p>
+
+                    <a href="https://120minut.ru/owner/login" class="button">Войти в экстранет</a>
+
+                    <p style="margin-top: 30px;"><strong>Что вы можете делать в экстранете:</strong></p>
+                    <ul>
+                        <li>Редактировать информацию об объекте</li>
+                        <li>Управлять номерами и ценами</li>
+                        <li>Продвигать объект в топ выдачи</li>
+                        <li>Отслеживать статистику просмотров</li>
+                        <li>Управлять подпиской</li>
+                    </ul>
+
+                    <p style="margin-top: 30px; padding: 15px; background: #fef3c7; border-left: 4px solid #f59e0b;">
+                        ⚠️ <strong>Рекомендуем сменить пароль</strong> после первого входа в настройках профиля.
+                    </p>
+
+                    <div class="footer">
+                        <p>С уважением,<br>Команда 120 минут</p>
+                        <p>Если у вас возникли вопросы, свяжитесь с нами через экстранет.</p>
+                    </div>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+
+
+def send_owner_credentials(payload: dict) -> dict:
+    '''Письмо владельцу с временным паролем после одобрения объекта'''
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("""
+            SELECT l.id, l.title, l.owner_id, o.email, o.full_name, c.temporary_password
+            FROM t_p39732784_hourly_rentals_platf.listings l
+            JOIN t_p39732784_hourly_rentals_platf.owners o ON l.owner_id = o.id
+            JOIN t_p39732784_hourly_rentals_platf.pending_owner_credentials c ON c.owner_id = l.owner_id
+            WHERE l.id = %s
+        """, (payload['listing_id'],))
+        listing = cur.fetchone()
+        conn.rollback()
+    finally:
+        conn.close()
+
+    if not listing:
+        raise LookupError('Объект или учетные данные владельца не найдены')
+
+    send_email(
+        to_email=listing['email'],
+        subject='🎉 Ваш объект одобрен! Данные для входа в экстранет',
+        html_body=credentials_email(listing, listing['temporary_password'])
+    )
+
+    # Помечаем, что письмо отправлено
+    with transaction() as conn:
+        conn.cursor().execute("""
+            UPDATE t_p39732784_hourly_rentals_platf.pending_owner_credentials
+            SET sent_at = CURRENT_TIMESTAMP
+            WHERE owner_id = %s
+        """, (listing['owner_id'],))
+
+    # Результат отдаёт GET ?job_id= без авторизации: email владельца в него не пишем
+    return {'owner_id': listing['owner_id'], 'message': 'Учетные данные отправлены владельцу'}
+
+
+def call_yandex_gpt(prompt: str) -> str:
+    api_key = os.environ.get('YANDEX_GPT_API_KEY', '')
+    folder_id = os.environ.get('YANDEX_FOLDER_ID', '')
+    if not api_key or not folder_id:
+        raise ValueError('YANDEX_GPT_API_KEY or YANDEX_FOLDER_ID not configured')
+
+    payload = json.dumps({
+        "modelUri": f"gpt://{folder_id}/yandexgpt-lite",
+        "completionOptions": {"stream": False, "temperature": 0.7, "maxTokens": 1000},
+        "messages": [
+            {"role": "system", "text": "Ты — копирайтер для сайта почасовой аренды номеров. Пиши живо, без воды, по делу. Без приветствий и заголовков. Только текст описания."},
+            {"role": "user", "text": prompt}
+        ]
+    }).encode('utf-8')
+
+    req = urllib.request.Request(
+        'https://llm.api.cloud.yandex.net/foundationModels/v1/completion',
+        data=payload,
+        headers={
+            'Content-Type': 'application/json',
+            'Authorization': f'Api-Key {api_key}',
+            'x-folder-id': folder_id
+        }
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            result = json.loads(resp.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        error_body = e.read().decode('utf-8') if e.fp else ''
+        print(f"YandexGPT HTTP {e.code}: {error_body}")
+        # 429 и 5xx — временные: задача будет повторена
+        if e.code == 429 or e.code >= 500:
+            raise RuntimeError(f"YandexGPT API error {e.code}: {error_body}")
+        raise ValueError(f"YandexGPT API error {e.code}: {error_body}")
+    return result['result']['alternatives'][0]['message']['text'].strip()
+
+
+def description_prompt(listing: dict, rooms: list, metro_stations: list) -> str:
+    '''Промпт для YandexGPT по данным объекта, номеров и метро'''
+    parts = []
+    parts.append(f"Название: {listing['title']}")
+    if listing.get('type'):
+        parts.append(f"Тип: {listing['type']}")
+    parts.append(f"Город: {listing['city']}")
+    if listing.get('district'):
+        parts.append(f"Район: {listing['district']}")
+    if listing.get('address'):
+        parts.append(f"Адрес: {listing['address']}")
+
+    if metro_stations:
+        metro_info = ', '.join([f"{m['station_name']} ({m['walk_minutes']} мин пешком)" for m in metro_stations])
+        parts.append(f"Метро: {metro_info}")
+    elif listing.get('metro'):
+        parts.append(f"Метро: {listing['metro']}")
+
+    if listing.get('has_parking'):
+        parking_desc = {'free': 'бесплатная', 'paid': 'платная', 'street': 'стихийная', 'spontaneous': 'стихийная'}
+        p_type = parking_desc.get(listing.get('parking_type', ''), listing.get('parking_type', ''))
+        parts.append(f"Парковка: {p_type}")
+
+    if rooms:
+        parts.append(f"\nКатегории номеров ({len(rooms)}):")
+        for r in rooms:
+            room_info = f"- {r['type']}"
+            if r.get('price'):
+                room_info += f", от {r['price']}₽"
+            if r.get('square_meters'):
+                room_info += f", {r['square_meters']} м²"
+            if r.get('min_hours'):
+                room_info += f", мин. {r['min_hours']}ч"
+            if r.get('features'):
+                feats = r['features'] if isinstance(r['features'], list) else []
+                if feats:
+                    room_info += f" ({', '.join(feats[:8])})"
+            parts.append(room_info)
+
+    images = []
+    if listing.get('image_url'):
+        try:
+            parsed = json.loads(listing['image_url']) if isinstance(listing['image_url'], str) else listing['image_url']
+            if isinstance(parsed, list):
+                images = parsed[:3]
+            else:
+                images = [str(listing['image_url'])]
+        except (json.JSONDecodeError, TypeError):
+            images = [str(listing['image_url'])]
+
+    if images:
+        parts.append(f"\nФото объекта: {len(images)} шт.")
+
+    listing_info = '\n'.join(parts)
+
+    prompt = f"""Напиши привлекательное описание для объекта почасовой аренды.
+Описание должно быть 3-5 абзацев, без заголовков. Упомяни ключевые преимущества: расположение, удобства номеров, особенности.
+Пиши от третьего лица. Не придумывай то, чего нет в данных. Если информации мало — сделай акцент на том что есть.
+
+Данные объекта:
+{listing_info}"""
+
+    if images:
+        prompt += f"\n\nОбъект имеет {len(images)} фотографий — упомяни что можно оценить обстановку по фото."
+    return prompt
+
+
+def generate_description(payload: dict) -> dict:
+    '''Описание объекта через YandexGPT по данным объекта, номеров и метро'''
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    listing_id = payload['listing_id']
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(f"""
+            SELECT id, title, type, city, district, address, metro,
+                   has_parking, parking_type, image_url, description
+            FROM {schema}.listings
+            WHERE id = %s
+        """, (listing_id,))
+        listing = cur.fetchone()
+
+        if not listing:
+            raise LookupError('Listing not found')
+
+        cur.execute(f"""
+            SELECT type, price, square_meters, min_hours, features
+            FROM {schema}.rooms
+            WHERE listing_id = %s
+            ORDER BY id
+        """, (listing_id,))
+        rooms = cur.fetchall()
+
+        cur.execute(f"""
+            SELECT station_name, walk_minutes
+            FROM {schema}.metro_stations
+            WHERE listing_id = %s
+        """, (listing_id,))
+        metro_stations = cur.fetchall()
+        conn.rollback()
+    finally:
+        conn.close()
+
+    print(f"DB DONE: listing_id={listing_id}, rooms_count={len(rooms)}, metro_count={len(metro_stations)}")
+    return {'description': call_yandex_gpt(description_prompt(listing, rooms, metro_stations))}
+
+
+def geocode_address(listing_id: int, city: str, address: str):
+    '''Координаты через Nominatim: сначала по адресу, затем по городу; (lat, lng) или (None, None)'''
+    search_queries = []
+    if address:
+        clean_address = address.split(',')[0].strip()
+        search_queries.append(f"{clean_address}, {city}, Россия")
+
+    search_queries.append(f"{city}, Россия")
+
+    for search_query in search_queries:
+        try:
+            print(f"Geocoding listing {listing_id}: {search_query}")
+            encoded_query = urllib.parse.quote(search_query)
+            url = f"https://nominatim.openstreetmap.org/search?q={encoded_query}&format=json&limit=1"
+
+            req = urllib.request.Request(url, headers={'User-Agent': '120minut-platform/1.0'})
+            with urllib.request.urlopen(req, timeout=5) as response:
+                data = json.loads(response.read())
+
+            if data and len(data) > 0:
+                lat_found = float(data[0]['lat'])
+                lng_found = float(data[0]['lon'])
+                print(f"Found coordinates for {listing_id}: lat={lat_found}, lng={lng_found}")
+                return lat_found, lng_found
+
+            time.sleep(0.2)
+
+        except Exception as e:
+            print(f"Failed query for {listing_id}: {str(e)}")
+    return None, None
+
+
+def geocode_listings(payload: dict) -> dict:
+    '''Проставить координаты объектам без lat/lng пачками по GEOCODE_BATCH.
+    Nominatim требует паузы между запросами, поэтому работа ограничена
+    GEOCODE_BUDGET_SECONDS; remaining — сколько объектов осталось'''
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    deadline = time.monotonic() + GEOCODE_BUDGET_SECONDS
+    attempted = []
+    updated_count = 0
+    failed_count = 0
+
+    while time.monotonic() < deadline:
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(f"""
+                SELECT id, city, district, metro, address FROM {schema}.listings
+                WHERE (lat IS NULL OR lat = 0) AND is_archived = false AND id <> ALL(%s::int[])
+                LIMIT %s
+            """, (attempted, GEOCODE_BATCH))
+            listings = cur.fetchall()
+            conn.rollback()
+        finally:
+            conn.close()
+
+        if not listings:
+            break
+
+        coordinates = []
+        for listing_id, city, district, metro, address in listings:
+            attempted.append(listing_id)
+            lat_found, lng_found = geocode_address(listing_id, city, address)
+            if lat_found and lng_found:
+                coordinates.append((lat_found, lng_found, listing_id))
+                updated_count += 1
+            else:
+                print(f"No coordinates found for listing {listing_id}")
+                failed_count += 1
+
+            time.sleep(0.3)
+            if time.monotonic() >= deadline:
+                break
+
+        # Найденные координаты сохраняются после каждой пачки: повтор задачи не потеряет работу
+        if coordinates:
+            with transaction() as conn:
+                conn.cursor().executemany(
+                    f"UPDATE {schema}.listings SET lat = %s, lng = %s WHERE id = %s", coordinates
+                )
+
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT COUNT(*) FROM {schema}.listings
+            WHERE (lat IS NULL OR lat = 0) AND is_archived = false AND id <> ALL(%s::int[])
+        """, (attempted,))
+        remaining = cur.fetchone()[0]
+        conn.rollback()
+    finally:
+        conn.close()
+
+    return {
+        'updated': updated_count,
+        'failed': failed_count,
+        'total': updated_count + failed_count,
+        'remaining': remaining
+    }
+
+
+def setup_exolve_numbers(payload: dict) -> dict:
+    '''Привязать все активные виртуальные номера к webhook route-call в МТС Exolve'''
+    exolve_api_key = os.environ.get('EXOLVE_API_KEY')
+    if not exolve_api_key:
+        raise ValueError('EXOLVE_API_KEY not configured')
+
+    webhook_url = payload.get('webhook_url') or EXOLVE_WEBHOOK_URL
+
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("SELECT phone FROM virtual_numbers WHERE is_active = TRUE OR is_active IS NULL ORDER BY id")
+        numbers = cur.fetchall()
+        conn.rollback()
+    finally:
+        conn.close()
+
+    results = []
+
+    for row in numbers:
+        phone = row['phone']
+        # Убираем + — Exolve принимает number_code как целое число
+        phone_digits = int(re.sub(r'[^\d]', '', phone))
+
+        # POST https://api.exolve.ru/number/v1/SetCallForwarding
+        # call_forwarding_type: 3 = переадресация на URL (IPCR/webhook)
+        api_url = 'https://api.exolve.ru/number/v1/SetCallForwarding'
+
+        config_data = {
+            'number_code': phone_digits,
+            'call_forwarding_type': 3,
+            'call_forwarding_ipcr': {
+                'url': webhook_url
+            }
+        }
+
+        headers = {
+            'Authorization': f'Bearer {exolve_api_key}',
+            'Content-Type': 'application/json'
+        }
+
+        try:
+            req = urllib.request.Request(
+                api_url,
+                data=json.dumps(config_data).encode('utf-8'),
+                headers=headers,
+                method='POST'
+            )
+
+            try:
+                with urllib.request.urlopen(req, timeout=10) as response:
+                    resp_text = response.read().decode('utf-8')
+                    results.append({
+                        'phone': phone,
+                        'status': 'configured',
+                        'webhook': webhook_url,
+                        'response': resp_text
+                    })
+                    print(f"[SETUP] Configured {phone} -> {webhook_url}: {resp_text}")
+            except urllib.error.HTTPError as e:
+                err_body = e.read().decode('utf-8')
+                results.append({
+                    'phone': phone,
+                    'status': 'error',
+                    'error': f"HTTP {e.code}: {err_body}"
+                })
+                print(f"[SETUP] Error for {phone}: HTTP {e.code}: {err_body}")
+
+        except Exception as e:
+            results.append({
+                'phone': phone,
+                'status': 'error',
+                'error': str(e)
+            })
+            print(f"[SETUP] Exception for {phone}: {str(e)}")
+
+    success_count = sum(1 for r in results if r['status'] == 'configured')
+    return {
+        'success': success_count,
+        'total': len(results),
+        'results': results
+    }
+
+
+def renormalize_auction(payload: dict) -> dict:
+    '''Раздать ранги города заново и пересчитать отображаемые позиции auction'''
+    city = payload['city']
+    with transaction() as conn:
+        cur = conn.cursor()
+        changed = renormalize_city(cur, city)
+        if changed:
+            invalidate_catalog(cur, cities=[city])
+    return {'city': city, 'changed': changed}
+
+
+def process_upload(payload: dict) -> dict:
+    '''Копии фото после прямой загрузки (см. _common/uploads.py)'''
+    # Pillow и boto3 нужны только воркеру, а не каждой функции, импортирующей job_tasks
+    from _common.uploads import process_upload as render_upload
+    return render_upload(payload)
+
+
+def dispatch_subscription_events(payload: dict) -> dict:
+    '''Продолжить срабатывание событий подписки; если снова не уложились — следующей задачей'''
+    result = dispatch_due(DISPATCH_BUDGET_SECONDS)
+    if result['has_more']:
+        # Ключ DISPATCH_SUBSCRIPTION_EVENTS занят этой же задачей, пока она выполняется
+        with transaction() as conn:
+            schedule_dispatch(conn.cursor(), idempotency_key=None)
+    return result
+
+
+def reminder_email(event: dict) -> str:
+    '''HTML письма владельцу о скором окончании подписки'''
+    left = '3 дня' if event['kind'] == 'expiring_3d' else '1 день'
+    expires = event['expires_at'].strftime('%d.%m.%Y %H:%M')
+    return f"""
+        <!DOCTYPE html>
+        <html>
+        <head><meta charset="utf-8"></head>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <p>Здравствуйте{', ' + event['full_name'] if event['full_name'] else ''}!</p>
+            <p>Через {left} (<strong>{expires}</strong>) заканчивается подписка на объект
+            <strong>{event['title']}</strong>. Продлите её в личном кабинете, чтобы объект
+            продолжал показываться в каталоге.</p>
+            <p>С уважением,<br>Команда 120 минут</p>
+        </body>
+        </html>
+    """
+
+
+def send_subscription_reminders(payload: dict) -> dict:
+    '''Письма владельцам «осталось 3 дня / 1 день». Если срок с тех пор изменился,
+    напоминание устарело и не отправляется; обработанные события помечаются notified_at'''
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("""
+            SELECT e.id, e.kind, e.expires_at, l.title, o.email, o.full_name,
+                   l.subscription_expires_at = e.expires_at AND NOT l.is_archived AS is_current
+            FROM t_p39732784_hourly_rentals_platf.subscription_events e
+            JOIN t_p39732784_hourly_rentals_platf.listings l ON l.id = e.listing_id
+            LEFT JOIN t_p39732784_hourly_rentals_platf.owners o ON o.id = l.owner_id
+            WHERE e.id = ANY(%s) AND e.notified_at IS NULL
+            ORDER BY e.id
+        """, (payload['event_ids'],))
+        events = cur.fetchall()
+        conn.rollback()
+    finally:
+        conn.close()
+
+    sent = 0
+    for event in events:
+        if event['is_current'] and event['email']:
+            send_email(
+                to_email=event['email'],
+                subject=f'Подписка на объект «{event["title"]}» скоро закончится',
+                html_body=reminder_email(event)
+            )
+            sent += 1
+        with transaction() as conn:
+            conn.cursor().execute("""
+                UPDATE t_p39732784_hourly_rentals_platf.subscription_events
+                SET notified_at = NOW()
+                WHERE id = %s
+            """, (event['id'],))
+
+    return {'events': len(events), 'sent': sent}
+
+
+def renewal_email(event: dict) -> str:
+    '''HTML письма владельцу об автоматическом продлении подписки'''
+    expires = event['subscription_expires_at'].strftime('%d.%m.%Y')
+    return f"""
+        <!DOCTYPE html>
+        <html>
+        <head><meta charset="utf-8"></head>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <p>Здравствуйте{', ' + event['full_name'] if event['full_name'] else ''}!</p>
+            <p>Подписка на объект <strong>{event['title']}</strong> истекла и была автоматически
+            продлена до <strong>{expires}</strong>. Объект продолжает показываться в каталоге.</p>
+            <p>С уважением,<br>Команда 120 минут</p>
+        </body>
+        </html>
+    """
+
+
+def send_lifecycle_notices(payload: dict) -> dict:
+    '''Уведомить владельцев и менеджеров об архивации/продлении объектов.
+    Архивация — сообщение в чат владельца с менеджером, продление — письмо владельцу.
+    Уведомлённые события помечаются notified_at: повтор задачи не дублирует их'''
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("""
+            SELECT e.id, e.event, e.listing_id, e.owner_id, e.manager_id,
+                   e.subscription_expires_at, l.title, o.email, o.full_name
+            FROM t_p39732784_hourly_rentals_platf.listing_lifecycle_events e
+            JOIN t_p39732784_hourly_rentals_platf.listings l ON l.id = e.listing_id
+            LEFT JOIN t_p39732784_hourly_rentals_platf.owners o ON o.id = e.owner_id
+            WHERE e.id = ANY(%s) AND e.notified_at IS NULL
+            ORDER BY e.id
+        """, (payload['event_ids'],))
+        events = cur.fetchall()
+        conn.rollback()
+    finally:
+        conn.close()
+
+    messages = 0
+    emails = 0
+    for event in events:
+        if event['event'] == 'renewed' and event['email']:
+            send_email(
+                to_email=event['email'],
+                subject=f'Подписка на объект «{event["title"]}» продлена',
+                html_body=renewal_email(event)
+            )
+            emails += 1
+
+        with transaction() as conn:
+            cur = conn.cursor()
+            if event['event'] == 'archived' and event['owner_id'] and event['manager_id']:
+                cur.execute("""
+                    INSERT INTO t_p39732784_hourly_rentals_platf.owner_manager_messages
+                    (owner_id, manager_id, listing_id, sender_type, message)
+                    VALUES (%s, %s, %s, 'system', %s)
+                    RETURNING id
+                """, (event['owner_id'], event['manager_id'], event['listing_id'],
+                      f'Подписка на объект «{event["title"]}» истекла, объект перенесён в архив. '
+                      f'Чтобы вернуть его в каталог, продлите подписку.'))
+                record_owner_message(cur, cur.fetchone()[0], event['owner_id'], event['manager_id'], 'system')
+                messages += 1
+            cur.execute("""
+                UPDATE t_p39732784_hourly_rentals_platf.listing_lifecycle_events
+                SET notified_at = NOW()
+                WHERE id = %s
+            """, (event['id'],))
+
+    return {'events': len(events), 'messages': messages, 'emails': emails}
+
+
+TASKS = {
+    OWNER_CREDENTIALS: send_owner_credentials,
+    LISTING_DESCRIPTION: generate_description,
+    GEOCODE_LISTINGS: geocode_listings,
+    EXOLVE_FORWARDING: setup_exolve_numbers,
+    AUCTION_RENORMALIZE: renormalize_auction,
+    LIFECYCLE_NOTICES: send_lifecycle_notices,
+    DISPATCH_SUBSCRIPTION_EVENTS: dispatch_subscription_events,
+    SUBSCRIPTION_REMINDERS: send_subscription_reminders,
+    PROCESS_UPLOAD: process_upload
+}
@@ -0,0 +1,230 @@
+"""Очередь фоновых задач в PostgreSQL.
+
+Обработчик запроса ставит задачу (enqueue) и сразу отвечает её id; медленную
+работу выполняет функция job-worker. Воркер захватывает готовые задачи одним
+UPDATE ... FOR UPDATE SKIP LOCKED, поэтому несколько воркеров не мешают друг
+другу, и берёт их в аренду на LEASE_SECONDS: если воркер упал, задача снова
+станет доступна после истечения аренды.
+
+Исход задачи записывается только тем воркером, который её держит: если аренда
+истекла и задачу уже отдали другому, опоздавший результат отбрасывается.
+
+Ошибка задачи — повтор с экспоненциальной задержкой, пока не исчерпаны
+max_attempts; затем задача получает статус dead и копируется в jobs_dead_letter.
+ValueError и LookupError — ошибки данных: повтор не поможет, задача сразу dead.
+
+Ключ идемпотентности уникален среди незавершённых задач: повторный запрос
+с тем же ключом вернёт уже поставленную задачу, а не создаст вторую.
+"""
+import json
+import select
+import time
+
+from _common.db import get_db_connection, transaction
+from _common.message_feed import notify
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+
+JOBS_CHANNEL = 'jobs'
+
+MAX_ATTEMPTS = 5
+LEASE_SECONDS = 300
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+
+# Статусы, при которых задача ещё не завершена
+ACTIVE_STATUSES = ('queued', 'running')
+
+PERMANENT_ERRORS = (ValueError, LookupError)
+
+
+def enqueue(cur, kind: str, payload: dict = None, idempotency_key: str = None,
+            max_attempts: int = MAX_ATTEMPTS, delay_seconds: int = 0) -> dict:
+    '''Поставить задачу в очередь: {id, status, created}. Вызывается в транзакции запроса;
+    воркер увидит задачу после COMMIT'''
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.jobs (kind, payload, idempotency_key, max_attempts, run_after)
+        VALUES (%s, %s::jsonb, %s, %s, NOW() + %s * INTERVAL '1 second')
+        ON CONFLICT (idempotency_key) WHERE status IN ('queued', 'running')
+        DO UPDATE SET updated_at = jobs.updated_at
+        RETURNING id, status, xmax = 0 AS created
+    """, (kind, json.dumps(payload or {}, default=str), idempotency_key, max_attempts, delay_seconds))
+    row = cur.fetchone()
+    job = dict(row) if isinstance(row, dict) else {'id': row[0], 'status': row[1], 'created': row[2]}
+    if job['created'] and not delay_seconds:
+        notify(cur, JOBS_CHANNEL, job['id'])
+    return job
+
+
+def get_job(cur, job_id: int, kind: str = None):
+    '''Состояние задачи: {id, kind, status, attempts, result, error, ...} или None'''
+    kind_condition = 'AND kind = %s' if kind else ''
+    cur.execute(f"""
+        SELECT id, kind, status, attempts, max_attempts, result, last_error,
+               run_after, created_at, finished_at
+        FROM {SCHEMA}.jobs
+        WHERE id = %s {kind_condition}
+    """, [job_id] + ([kind] if kind else []))
+    row = cur.fetchone()
+    if not row:
+        return None
+    if not isinstance(row, dict):
+        row = dict(zip([column.name for column in cur.description], row))
+    job = dict(row)
+    job['error'] = job.pop('last_error')
+    for field in ('run_after', 'created_at', 'finished_at'):
+        if job[field]:
+            job[field] = job[field].isoformat()
+    return job
+
+
+def _job(row) -> dict:
+    return row if isinstance(row, dict) else \
+        {'id': row[0], 'kind': row[1], 'payload': row[2], 'attempts': row[3], 'max_attempts': row[4],
+         'locked_by': row[5]}
+
+
+def claim(cur, worker_id: str, limit: int = 1, lease_seconds: int = LEASE_SECONDS) -> list:
+    '''Захватить до limit готовых задач: [{id, kind, payload, attempts, max_attempts, locked_by}]'''
+    cur.execute(f"""
+        UPDATE {SCHEMA}.jobs
+        SET status = 'running',
+            attempts = attempts + 1,
+            locked_by = %s,
+            locked_until = NOW() + %s * INTERVAL '1 second',
+            updated_at = NOW()
+        WHERE id IN (
+            SELECT id FROM {SCHEMA}.jobs
+            WHERE status = 'queued' AND run_after <= NOW()
+            ORDER BY run_after, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, kind, payload, attempts, max_attempts, locked_by
+    """, (worker_id, lease_seconds, limit))
+    return [_job(row) for row in cur.fetchall()]
+
+
+def complete(cur, job: dict, result=None) -> bool:
+    '''Записать результат; False — задача уже не у этого воркера (аренда истекла)'''
+    cur.execute(f"""
+        UPDATE {SCHEMA}.jobs
+        SET status = 'done', result = %s::jsonb, last_error = NULL,
+            locked_by = NULL, locked_until = NULL,
+            updated_at = NOW(), finished_at = NOW()
+        WHERE id = %s AND status = 'running' AND locked_by = %s
+    """, (json.dumps(result, default=str), job['id'], job['locked_by']))
+    return cur.rowcount == 1
+
+
+def backoff_seconds(attempts: int) -> int:
+    '''Задержка перед следующей попыткой: 30 с, 1 мин, 2 мин, ... не больше часа'''
+    return min(BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), BACKOFF_MAX_SECONDS)
+
+
+def fail(cur, job: dict, error: str, permanent: bool = False) -> bool:
+    '''Записать ошибку: повтор с задержкой или dead letter, если попытки исчерпаны.
+    False — задача уже не у этого воркера (аренда истекла)'''
+    if not permanent and job['attempts'] < job['max_attempts']:
+        cur.execute(f"""
+            UPDATE {SCHEMA}.jobs
+            SET status = 'queued', last_error = %s,
+                run_after = NOW() + %s * INTERVAL '1 second',
+                locked_by = NULL, locked_until = NULL, updated_at = NOW()
+            WHERE id = %s AND status = 'running' AND locked_by = %s
+        """, (error, backoff_seconds(job['attempts']), job['id'], job['locked_by']))
+        return cur.rowcount == 1
+
+    cur.execute(f"""
+        WITH dead AS (
+            UPDATE {SCHEMA}.jobs
+            SET status = 'dead', last_error = %s,
+                locked_by = NULL, locked_until = NULL,
+                updated_at = NOW(), finished_at = NOW()
+            WHERE id = %s AND status = 'running' AND locked_by = %s
+            RETURNING id, kind, payload, attempts, last_error
+        )
+        INSERT INTO {SCHEMA}.jobs_dead_letter (job_id, kind, payload, attempts, last_error)
+        SELECT id, kind, payload, attempts, last_error FROM dead
+    """, (error, job['id'], job['locked_by']))
+    return cur.rowcount == 1
+
+
+def release_expired(cur) -> int:
+    '''Задачи, чья аренда истекла (воркер упал или превысил таймаут), — как неудачная попытка'''
+    cur.execute(f"""
+        SELECT id, kind, payload, attempts, max_attempts, locked_by
+        FROM {SCHEMA}.jobs
+        WHERE status = 'running' AND locked_until < NOW()
+        FOR UPDATE SKIP LOCKED
+    """)
+    rows = cur.fetchall()
+    for row in rows:
+        fail(cur, _job(row), 'Аренда воркера истекла')
+    return len(rows)
+
+
+def run_job(job: dict, tasks: dict) -> str:
+    '''Выполнить захваченную задачу и записать исход: done, retry, dead или lost
+    (аренда истекла, задачу уже держит другой воркер — исход не записан).
+    Задача работает вне транзакции захвата: долгие внешние вызовы не держат блокировок'''
+    task = tasks.get(job['kind'])
+    try:
+        if task is None:
+            raise LookupError(f"Неизвестный тип задачи: {job['kind']}")
+        result = task(job['payload'] or {})
+    except Exception as e:
+        permanent = isinstance(e, PERMANENT_ERRORS)
+        print(f"[JOBS] Задача {job['id']} ({job['kind']}), попытка {job['attempts']}: {type(e).__name__}: {e}")
+        with transaction() as conn:
+            recorded = fail(conn.cursor(), job, f'{type(e).__name__}: {e}', permanent=permanent)
+        if not recorded:
+            print(f"[JOBS] Задача {job['id']}: аренда истекла, ошибка не записана")
+            return 'lost'
+        return 'dead' if permanent or job['attempts'] >= job['max_attempts'] else 'retry'
+
+    with transaction() as conn:
+        recorded = complete(conn.cursor(), job, result)
+    if not recorded:
+        print(f"[JOBS] Задача {job['id']}: аренда истекла, результат не записан")
+        return 'lost'
+    return 'done'
+
+
+def work(tasks: dict, worker_id: str, seconds: float) -> dict:
+    '''Выполнять задачи не дольше seconds: между задачами ждать NOTIFY о новых.
+    Возвращает счётчики {done, retry, dead, lost, released}'''
+    stats = {'done': 0, 'retry': 0, 'dead': 0, 'lost': 0, 'released': 0}
+    deadline = time.monotonic() + seconds
+
+    with transaction() as conn:
+        stats['released'] = release_expired(conn.cursor())
+
+    listen_conn = get_db_connection()
+    listen_cur = None
+    try:
+        listen_conn.autocommit = True
+        listen_cur = listen_conn.cursor()
+        listen_cur.execute(f'LISTEN {JOBS_CHANNEL}')
+
+        while time.monotonic() < deadline:
+            with transaction() as conn:
+                jobs = claim(conn.cursor(), worker_id)
+            if jobs:
+                for job in jobs:
+                    stats[run_job(job, tasks)] += 1
+                continue
+
+            # Очередь пуста: ждём уведомления о новой задаче или задачи с задержкой
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if select.select([listen_conn], [], [], min(remaining, BACKOFF_BASE_SECONDS)) != ([], [], []):
+                listen_conn.poll()
+                del listen_conn.notifies[:]
+        return stats
+    finally:
+        if listen_cur is not None and not listen_conn.closed:
+            listen_cur.execute('UNLISTEN *')
+            listen_cur.close()
+        listen_conn.close()
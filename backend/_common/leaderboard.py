@@ -0,0 +1,208 @@
+"""Рейтинг менеджеров и достижения поверх витрины manager_dashboard.
+
+Витрина обновляется при событиях (объект взят или снят, задача выполнена,
+бонус или комиссия начислены), а по каждой метрике рейтинга есть частичный
+индекс (metric, admin_id) по менеджерам. Поэтому топ-N и соседи по рейтингу —
+это поиск по индексу с LIMIT, а место — подсчёт по индексу строк выше,
+без оконной сортировки всех manager_listings.
+
+Порядок: значение по убыванию, при равенстве — меньший admin_id выше.
+Место (rank) совпадает у равных значений, как у RANK().
+"""
+from _common.manager_dashboard import SCHEMA, refresh_dashboards
+
+METRICS = {
+    'objects': 'objects_count',
+    'tasks': 'tasks_completed',
+    'revenue': 'total_owner_payments'
+}
+
+LEADERBOARD_ROLE = 'manager'
+
+ACHIEVEMENT_BONUS = 1000
+
+# Достижение -> (показатель, порог); показатели — из витрины и баланса сотрудника
+ACHIEVEMENTS = {
+    'fifty_objects': ('objects_count', 50),
+    'hundred_objects': ('objects_count', 100),
+    'two_hundred_objects': ('objects_count', 200),
+    'owner_payment_20k': ('total_owner_payments', 20000),
+    'owner_payment_50k': ('total_owner_payments', 50000),
+    'owner_payment_100k': ('total_owner_payments', 100000),
+    'owner_payment_200k': ('total_owner_payments', 200000),
+    'owner_payment_500k': ('total_owner_payments', 500000),
+    'owner_payment_1m': ('total_owner_payments', 1000000),
+    'first_money': ('balance', 0.01),
+    'balance_50k': ('balance', 50000),
+    'balance_100k': ('balance', 100000),
+    'month_50k': ('month_commission', 50000),
+    'month_100k': ('month_commission', 100000),
+    'month_200k': ('month_commission', 200000)
+}
+
+
+def metric_column(metric: str) -> str:
+    if metric not in METRICS:
+        raise ValueError(f'Неизвестная метрика рейтинга: {metric}')
+    return METRICS[metric]
+
+
+def _entry(row, column: str) -> dict:
+    value = row[column]
+    return {
+        'admin_id': row['admin_id'],
+        'name': row['name'],
+        'value': float(value) if column == 'total_owner_payments' else value,
+        'position': None,
+        'rank': None
+    }
+
+
+def _assign_ranks(entries: list, first_position: int, first_rank: int):
+    '''Проставить места подряд идущим строкам рейтинга, начиная с известного места первой'''
+    for index, entry in enumerate(entries):
+        entry['position'] = first_position + index
+        if index == 0:
+            entry['rank'] = first_rank
+        elif entry['value'] == entries[index - 1]['value']:
+            entry['rank'] = entries[index - 1]['rank']
+        else:
+            entry['rank'] = entry['position']
+
+
+def top(cur, metric: str, limit: int = 10) -> list:
+    '''Первые limit менеджеров по метрике'''
+    column = metric_column(metric)
+    cur.execute(f"""
+        SELECT d.admin_id, a.name, d.{column}
+        FROM {SCHEMA}.manager_dashboard d
+        JOIN {SCHEMA}.admins a ON a.id = d.admin_id
+        WHERE d.role = %s
+        ORDER BY d.{column} DESC, d.admin_id
+        LIMIT %s
+    """, (LEADERBOARD_ROLE, limit))
+    entries = [_entry(row, column) for row in cur.fetchall()]
+    _assign_ranks(entries, 1, 1)
+    return entries
+
+
+def position(cur, metric: str, admin_id: int):
+    '''Место менеджера: {admin_id, name, value, rank, position, total} или None, если его нет в рейтинге'''
+    column = metric_column(metric)
+    cur.execute(f"""
+        SELECT me.admin_id, a.name, me.{column} AS value,
+               1 + (SELECT COUNT(*) FROM {SCHEMA}.manager_dashboard o
+                    WHERE o.role = %(role)s AND o.{column} > me.{column}) AS rank,
+               1 + (SELECT COUNT(*) FROM {SCHEMA}.manager_dashboard o
+                    WHERE o.role = %(role)s AND (o.{column} > me.{column}
+                          OR (o.{column} = me.{column} AND o.admin_id < me.admin_id))) AS position,
+               (SELECT COUNT(*) FROM {SCHEMA}.manager_dashboard o WHERE o.role = %(role)s) AS total
+        FROM {SCHEMA}.manager_dashboard me
+        JOIN {SCHEMA}.admins a ON a.id = me.admin_id
+        WHERE me.admin_id = %(admin_id)s AND me.role = %(role)s
+    """, {'role': LEADERBOARD_ROLE, 'admin_id': admin_id})
+    row = cur.fetchone()
+    if not row:
+        return None
+    result = dict(row)
+    if column == 'total_owner_payments':
+        result['value'] = float(result['value'])
+    return result
+
+
+def around(cur, metric: str, admin_id: int, k: int = 2):
+    '''Менеджер и до k соседей выше и ниже него: {me, entries} или None'''
+    column = metric_column(metric)
+    me = position(cur, metric, admin_id)
+    if not me:
+        return None
+
+    params = {'role': LEADERBOARD_ROLE, 'admin_id': admin_id, 'value': me['value'], 'k': k}
+    cur.execute(f"""
+        SELECT d.admin_id, a.name, d.{column}
+        FROM {SCHEMA}.manager_dashboard d
+        JOIN {SCHEMA}.admins a ON a.id = d.admin_id
+        WHERE d.role = %(role)s
+          AND (d.{column} > %(value)s OR (d.{column} = %(value)s AND d.admin_id < %(admin_id)s))
+        ORDER BY d.{column}, d.admin_id DESC
+        LIMIT %(k)s
+    """, params)
+    above = [_entry(row, column) for row in reversed(cur.fetchall())]
+    cur.execute(f"""
+        SELECT d.admin_id, a.name, d.{column}
+        FROM {SCHEMA}.manager_dashboard d
+        JOIN {SCHEMA}.admins a ON a.id = d.admin_id
+        WHERE d.role = %(role)s
+          AND (d.{column} < %(value)s OR (d.{column} = %(value)s AND d.admin_id > %(admin_id)s))
+        ORDER BY d.{column} DESC, d.admin_id
+        LIMIT %(k)s
+    """, params)
+    below = [_entry(row, column) for row in cur.fetchall()]
+
+    me_entry = {'admin_id': me['admin_id'], 'name': me['name'], 'value': me['value']}
+    entries = above + [me_entry] + below
+    if above:
+        # Место верхнего соседа: равные ему значения выше окна сдвигают только position
+        cur.execute(f"""
+            SELECT 1 + COUNT(*) AS rank FROM {SCHEMA}.manager_dashboard o
+            WHERE o.role = %s AND o.{column} > %s
+        """, (LEADERBOARD_ROLE, above[0]['value']))
+        first_rank = cur.fetchone()['rank']
+    else:
+        first_rank = me['rank']
+    _assign_ranks(entries, me['position'] - len(above), first_rank)
+    return {'me': me, 'entries': entries}
+
+
+def grant_achievements(cur, admin_id: int, achievement_ids: list) -> list:
+    '''Начислить бонусы за достижения одним запросом; возвращает только новые'''
+    if not achievement_ids:
+        return []
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.achievement_bonuses (admin_id, achievement_id, amount, created_at)
+        SELECT %s, achievement_id, %s, NOW()
+        FROM unnest(%s::varchar[]) AS achievement_id
+        ON CONFLICT (admin_id, achievement_id) DO NOTHING
+        RETURNING achievement_id
+    """, (admin_id, ACHIEVEMENT_BONUS, list(achievement_ids)))
+    granted = [row['achievement_id'] for row in cur.fetchall()]
+    if not granted:
+        return []
+
+    cur.execute(f"""
+        UPDATE {SCHEMA}.admins
+        SET balance = balance + %s
+        WHERE id = %s
+    """, (ACHIEVEMENT_BONUS * len(granted), admin_id))
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.commission_history (admin_id, amount, description, created_at)
+        SELECT %s, %s, 'Бонус за достижение: ' || achievement_id, NOW()
+        FROM unnest(%s::varchar[]) AS achievement_id
+    """, (admin_id, ACHIEVEMENT_BONUS, granted))
+    refresh_dashboards(cur, [admin_id])
+    return granted
+
+
+def unlocked_achievements(cur, admin_id: int) -> list:
+    '''Достижения, условия которых выполнены по данным витрины'''
+    cur.execute(f"""
+        SELECT a.balance, d.objects_count, d.total_owner_payments, d.month_commission
+        FROM {SCHEMA}.admins a
+        LEFT JOIN {SCHEMA}.manager_dashboard d ON d.admin_id = a.id
+        WHERE a.id = %s
+    """, (admin_id,))
+    row = cur.fetchone()
+    if not row:
+        return []
+    return [achievement_id for achievement_id, (source, threshold) in ACHIEVEMENTS.items()
+            if float(row[source] or 0) >= threshold]
+
+
+def award_achievements(cur, admin_id: int, only: list = None) -> list:
+    '''Проверить достижения сотрудника (все или только из only) и начислить новые
+    за один вызов: начисляются только те, условия которых выполнены по витрине'''
+    refresh_dashboards(cur, [admin_id])
+    unlocked = unlocked_achievements(cur, admin_id)
+    if only is not None:
+        unlocked = [achievement_id for achievement_id in unlocked if achievement_id in only]
+    return grant_achievements(cur, admin_id, unlocked)
@@ -0,0 +1,71 @@
+"""Переходы объекта по истечении подписки.
+
+Объект с истёкшей подпиской, привязанный к менеджеру, архивируется; без
+менеджера — подписка продлевается на RENEWAL_DAYS. expire_batch() вызывает
+диспетчер событий подписки (_common/subscription_events.py) для объектов,
+у которых сработало событие «истекла»: объекты захватываются FOR UPDATE,
+меняются одним UPDATE и записываются в listing_lifecycle_events. Событие
+помечено сработавшим в той же транзакции, поэтому занятый объект не
+пропускается (SKIP LOCKED), а дожидается блокировки — иначе переход потерялся бы.
+Уведомления владельцам и менеджерам отправляет job-worker (задача LIFECYCLE_NOTICES).
+"""
+from _common.catalog import invalidate_catalog
+from _common.jobs import enqueue
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+
+EXPIRY_BATCH_SIZE = 200
+RENEWAL_DAYS = 30
+
+LIFECYCLE_NOTICES = 'lifecycle_notices'
+
+
+def expire_batch(cur, limit: int = EXPIRY_BATCH_SIZE, listing_ids: list = None) -> list:
+    '''Архивировать/продлить до limit объектов с истёкшей подпиской (из listing_ids,
+    если переданы). Вызывается в транзакции; возвращает события [{id, listing_id, event}]'''
+    # Без listing_ids параллельные вызовы делят объекты между собой; для объектов
+    # сработавших событий переход обязателен — ждём блокировку
+    lock = 'FOR UPDATE OF l' if listing_ids else 'FOR UPDATE OF l SKIP LOCKED'
+    cur.execute(f"""
+        WITH expired AS (
+            SELECT l.id, l.subscription_expires_at,
+                   (SELECT ml.manager_id FROM {SCHEMA}.manager_listings ml
+                    WHERE ml.listing_id = l.id) AS manager_id
+            FROM {SCHEMA}.listings l
+            WHERE l.is_archived = FALSE
+              AND l.subscription_expires_at IS NOT NULL
+              AND l.subscription_expires_at < NOW()
+              AND (%s::int[] IS NULL OR l.id = ANY(%s::int[]))
+            ORDER BY l.subscription_expires_at, l.id
+            LIMIT %s
+            {lock}
+        ),
+        changed AS (
+            UPDATE {SCHEMA}.listings l
+            SET is_archived = (e.manager_id IS NOT NULL),
+                subscription_expires_at = CASE WHEN e.manager_id IS NULL
+                    THEN NOW() + %s * INTERVAL '1 day'
+                    ELSE l.subscription_expires_at END
+            FROM expired e
+            WHERE l.id = e.id
+            RETURNING l.id, l.owner_id, e.manager_id,
+                      e.subscription_expires_at AS expired_at,
+                      l.subscription_expires_at,
+                      CASE WHEN e.manager_id IS NULL THEN 'renewed' ELSE 'archived' END AS event
+        )
+        INSERT INTO {SCHEMA}.listing_lifecycle_events
+            (listing_id, event, owner_id, manager_id, expired_at, subscription_expires_at)
+        SELECT id, event, owner_id, manager_id, expired_at, subscription_expires_at
+        FROM changed
+        RETURNING id, listing_id, event
+    """, (listing_ids, listing_ids, limit, RENEWAL_DAYS))
+    columns = [column[0] for column in cur.description]
+    events = [dict(row) if isinstance(row, dict) else dict(zip(columns, row)) for row in cur.fetchall()]
+
+    if events:
+        invalidate_catalog(cur, listing_ids=[event['listing_id'] for event in events])
+        event_ids = [event['id'] for event in events]
+        enqueue(cur, LIFECYCLE_NOTICES, {'event_ids': event_ids},
+                idempotency_key=f'{LIFECYCLE_NOTICES}:{min(event_ids)}')
+    return events
+
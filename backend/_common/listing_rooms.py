@@ -0,0 +1,184 @@
+"""Сохранение номеров и станций метро объекта разницей, а не пересозданием.
+
+Пришедший список сравнивается с тем, что уже лежит в rooms/metro_stations:
+новые строки вставляются, изменившиеся обновляются, пропавшие удаляются —
+каждая группа одним execute_values. Неизменённые строки не трогаются, поэтому
+id номеров стабильны и на них можно ссылаться (экспертные оценки, фото).
+
+Номер сопоставляется по id (если он принадлежит этому объекту), иначе — по
+названию категории (type) среди ещё не сопоставленных. Станция метро — по
+названию. У существующего номера обновляются только переданные поля;
+значения по умолчанию подставляются лишь при вставке.
+"""
+from psycopg2.extras import execute_values
+
+ROOM_DEFAULTS = {
+    'description': None,
+    'images': [],
+    'square_meters': 0,
+    'features': [],
+    'min_hours': 1,
+    'payment_methods': 'Наличные, банковская карта при заселении',
+    'cancellation_policy': 'Бесплатная отмена за 1 час до заселения'
+}
+
+ROOM_FIELDS = ('type', 'price') + tuple(ROOM_DEFAULTS)
+INTEGER_FIELDS = ('price', 'square_meters', 'min_hours')
+ARRAY_FIELDS = ('images', 'features')
+
+# Приведение типов в VALUES: пустой список иначе станет text, а не text[]
+ROOM_TEMPLATE = '(%s, %s, %s::integer, %s, %s::text[], %s::integer, %s::text[], %s::integer, %s, %s)'
+
+
+def _integer(value):
+    '''Число так, как его сохранит integer-колонка; нечисловое значение — как есть'''
+    if value in (None, ''):
+        return value
+    try:
+        return int(round(float(value)))
+    except (TypeError, ValueError):
+        return value
+
+
+def _comparable(field: str, value):
+    '''Значение поля в виде, в котором его можно сравнить с прочитанным из БД'''
+    if field in ARRAY_FIELDS:
+        return list(value or [])
+    if field in INTEGER_FIELDS:
+        return _integer(value)
+    return value
+
+
+def _room_id(room: dict):
+    try:
+        return int(room.get('id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def diff_rooms(existing: list, rooms: list):
+    '''Разница между строками rooms объекта и пришедшим списком: (inserts, updates, delete_ids).
+    inserts — словари полей, updates — словари полей с id'''
+    by_id = {row['id']: row for row in existing}
+    matched = set()
+    pairs = []
+
+    # Сначала по id, затем оставшиеся — по названию категории
+    pending = []
+    for room in rooms:
+        room_id = _room_id(room)
+        if room_id in by_id and room_id not in matched:
+            matched.add(room_id)
+            pairs.append((room, by_id[room_id]))
+        else:
+            pending.append(room)
+    for room in pending:
+        row = next((row for row in existing
+                    if row['id'] not in matched and row['type'] == room.get('type')), None)
+        if row:
+            matched.add(row['id'])
+        pairs.append((room, row))
+
+    inserts, updates = [], []
+    for room, row in pairs:
+        if row is None:
+            inserts.append({field: room.get(field, ROOM_DEFAULTS.get(field)) for field in ROOM_FIELDS})
+            continue
+        desired = {field: room[field] if field in room else row[field] for field in ROOM_FIELDS}
+        if any(_comparable(field, desired[field]) != _comparable(field, row[field]) for field in ROOM_FIELDS):
+            updates.append(dict(desired, id=row['id']))
+
+    delete_ids = [row['id'] for row in existing if row['id'] not in matched]
+    return inserts, updates, delete_ids
+
+
+def save_rooms(cur, listing_id: int, rooms: list) -> dict:
+    '''Привести номера объекта к списку rooms: {inserted, updated, deleted}'''
+    cur.execute(f"""
+        SELECT id, {', '.join(ROOM_FIELDS)}
+        FROM t_p39732784_hourly_rentals_platf.rooms
+        WHERE listing_id = %s
+        ORDER BY id
+        FOR UPDATE
+    """, (listing_id,))
+    columns = ('id',) + ROOM_FIELDS
+    existing = [dict(row) if isinstance(row, dict) else dict(zip(columns, row)) for row in cur.fetchall()]
+
+    inserts, updates, delete_ids = diff_rooms(existing, rooms)
+
+    if delete_ids:
+        cur.execute("""
+            DELETE FROM t_p39732784_hourly_rentals_platf.rooms
+            WHERE id = ANY(%s) AND listing_id = %s
+        """, (delete_ids, listing_id))
+
+    if updates:
+        execute_values(cur, f"""
+            UPDATE t_p39732784_hourly_rentals_platf.rooms AS r
+            SET {', '.join(f'{field} = v.{field}' for field in ROOM_FIELDS)}
+            FROM (VALUES %s) AS v(id, {', '.join(ROOM_FIELDS)})
+            WHERE r.id = v.id
+        """, [(room['id'],) + tuple(room[field] for field in ROOM_FIELDS) for room in updates],
+            template=ROOM_TEMPLATE)
+
+    if inserts:
+        execute_values(cur, f"""
+            INSERT INTO t_p39732784_hourly_rentals_platf.rooms (listing_id, {', '.join(ROOM_FIELDS)})
+            VALUES %s
+        """, [(listing_id,) + tuple(room[field] for field in ROOM_FIELDS) for room in inserts],
+            template=ROOM_TEMPLATE)
+
+    return {'inserted': len(inserts), 'updated': len(updates), 'deleted': len(delete_ids)}
+
+
+def save_metro_stations(cur, listing_id: int, stations: list) -> dict:
+    '''Привести станции метро объекта к списку stations: {inserted, updated, deleted}'''
+    cur.execute("""
+        SELECT id, station_name, walk_minutes
+        FROM t_p39732784_hourly_rentals_platf.metro_stations
+        WHERE listing_id = %s
+        ORDER BY id
+        FOR UPDATE
+    """, (listing_id,))
+    existing = {}
+    delete_ids = []
+    for row in cur.fetchall():
+        row_id, name, walk_minutes = (row['id'], row['station_name'], row['walk_minutes']) \
+            if isinstance(row, dict) else row
+        # Дубли одной станции, оставшиеся от прежних сохранений, удаляются
+        if name in existing:
+            delete_ids.append(row_id)
+        else:
+            existing[name] = (row_id, walk_minutes)
+
+    desired = {}
+    for station in stations:
+        desired[station['station_name']] = station['walk_minutes']
+
+    inserts = [(listing_id, name, walk_minutes) for name, walk_minutes in desired.items()
+               if name not in existing]
+    updates = [(existing[name][0], walk_minutes) for name, walk_minutes in desired.items()
+               if name in existing and _integer(walk_minutes) != existing[name][1]]
+    delete_ids += [row_id for name, (row_id, _) in existing.items() if name not in desired]
+
+    if delete_ids:
+        cur.execute("""
+            DELETE FROM t_p39732784_hourly_rentals_platf.metro_stations
+            WHERE id = ANY(%s) AND listing_id = %s
+        """, (delete_ids, listing_id))
+
+    if updates:
+        execute_values(cur, """
+            UPDATE t_p39732784_hourly_rentals_platf.metro_stations AS m
+            SET walk_minutes = v.walk_minutes
+            FROM (VALUES %s) AS v(id, walk_minutes)
+            WHERE m.id = v.id
+        """, updates, template='(%s, %s::integer)')
+
+    if inserts:
+        execute_values(cur, """
+            INSERT INTO t_p39732784_hourly_rentals_platf.metro_stations (listing_id, station_name, walk_minutes)
+            VALUES %s
+        """, inserts, template='(%s, %s, %s::integer)')
+
+    return {'inserted': len(inserts), 'updated': len(updates), 'deleted': len(delete_ids)}
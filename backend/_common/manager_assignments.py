@@ -0,0 +1,110 @@
+"""Закрепление объектов за менеджером одним запросом.
+
+Все свободные объекты из списка вставляются одним INSERT ... SELECT с
+ON CONFLICT (listing_id) DO NOTHING: объект, который параллельно взял
+другой менеджер, просто не вставится. Лимит object_limit соблюдается
+атомарно: строка менеджера в admins блокируется (FOR UPDATE) до конца
+транзакции, поэтому параллельные назначения одному менеджеру (пакетные и
+одиночные take) выполняются по очереди и видят актуальное число объектов.
+
+Для каждого id возвращается исход: added, already_yours, taken, not_found, limit.
+"""
+from _common.manager_dashboard import refresh_dashboards
+
+OUTCOMES = ('added', 'already_yours', 'taken', 'not_found', 'limit')
+
+
+def lock_manager(cur, manager_id: int):
+    '''Заблокировать строку менеджера до конца транзакции: {object_limit} или None'''
+    cur.execute("""
+        SELECT id, object_limit
+        FROM t_p39732784_hourly_rentals_platf.admins
+        WHERE id = %s
+        FOR UPDATE
+    """, (manager_id,))
+    return cur.fetchone()
+
+
+def assign_listings(cur, manager_id: int, listing_ids: list, partial: bool = False) -> dict:
+    '''Закрепить объекты за менеджером. Вызывается внутри транзакции.
+
+    partial=False — всё или ничего: если свободных объектов больше, чем осталось
+    слотов, не добавляется ни один. partial=True — добавляются первые по порядку
+    в списке, пока есть слоты. Возвращает None, если менеджер не найден, иначе
+    {results: [{listing_id, outcome}], added, skipped, current_count, object_limit}.
+    '''
+    manager = lock_manager(cur, manager_id)
+    if not manager:
+        return None
+    object_limit = manager['object_limit'] if isinstance(manager, dict) else manager[1]
+
+    # Снимок запроса берётся после блокировки, поэтому число объектов менеджера актуально
+    cur.execute("""
+        WITH requested AS (
+            SELECT DISTINCT ON (id) id, ord
+            FROM unnest(%(ids)s::int[]) WITH ORDINALITY AS r(id, ord)
+            ORDER BY id, ord
+        ),
+        occupied AS (
+            SELECT COUNT(*) AS n
+            FROM t_p39732784_hourly_rentals_platf.manager_listings
+            WHERE manager_id = %(manager_id)s
+        ),
+        candidates AS (
+            SELECT r.id, r.ord, ROW_NUMBER() OVER (ORDER BY r.ord) AS rn, COUNT(*) OVER () AS total
+            FROM requested r
+            JOIN t_p39732784_hourly_rentals_platf.listings l ON l.id = r.id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM t_p39732784_hourly_rentals_platf.manager_listings ml
+                WHERE ml.listing_id = r.id
+            )
+        ),
+        allowed AS (
+            SELECT c.id, c.ord
+            FROM candidates c, occupied o
+            WHERE CASE WHEN %(partial)s THEN c.rn <= %(object_limit)s - o.n
+                       ELSE c.total <= %(object_limit)s - o.n END
+        ),
+        inserted AS (
+            INSERT INTO t_p39732784_hourly_rentals_platf.manager_listings (manager_id, listing_id)
+            SELECT %(manager_id)s, id FROM allowed ORDER BY ord
+            ON CONFLICT (listing_id) DO NOTHING
+            RETURNING listing_id
+        )
+        SELECT r.id AS listing_id,
+               CASE
+                   WHEN i.listing_id IS NOT NULL THEN 'added'
+                   WHEN l.id IS NULL THEN 'not_found'
+                   WHEN ml.manager_id = %(manager_id)s THEN 'already_yours'
+                   WHEN ml.listing_id IS NOT NULL OR a.id IS NOT NULL THEN 'taken'
+                   ELSE 'limit'
+               END AS outcome,
+               (SELECT n FROM occupied) AS occupied
+        FROM requested r
+        LEFT JOIN inserted i ON i.listing_id = r.id
+        LEFT JOIN t_p39732784_hourly_rentals_platf.listings l ON l.id = r.id
+        LEFT JOIN t_p39732784_hourly_rentals_platf.manager_listings ml ON ml.listing_id = r.id
+        LEFT JOIN allowed a ON a.id = r.id
+        ORDER BY r.ord
+    """, {'ids': [int(i) for i in listing_ids], 'manager_id': manager_id,
+          'object_limit': object_limit, 'partial': partial})
+    rows = cur.fetchall()
+
+    results = []
+    occupied = 0
+    for row in rows:
+        if not isinstance(row, dict):
+            row = {'listing_id': row[0], 'outcome': row[1], 'occupied': row[2]}
+        occupied = row['occupied']
+        results.append({'listing_id': row['listing_id'], 'outcome': row['outcome']})
+
+    added = sum(1 for r in results if r['outcome'] == 'added')
+    if added:
+        refresh_dashboards(cur, [manager_id])
+    return {
+        'results': results,
+        'added': added,
+        'skipped': len(results) - added,
+        'current_count': occupied + added,
+        'object_limit': object_limit
+    }
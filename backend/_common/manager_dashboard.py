@@ -0,0 +1,207 @@
+"""Витрина личного кабинета сотрудника (manager_dashboard).
+
+Агрегаты кабинета — число объектов, объекты команды, выполненные задачи,
+комиссии, бонусы, ОМ и УМ — хранятся одной строкой на сотрудника и
+пересчитываются функциями, которые их меняют: взятие и снятие объектов,
+выполнение задач, начисление бонусов и комиссий, изменение иерархии.
+Пересчёт сотрудника затрагивает и его ОМ и УМ: у них меняются командные цифры.
+
+Место в рейтинге не хранится: это 1 + число сотрудников с большим числом
+объектов, индексный подсчёт по витрине вместо RANK() по всем manager_listings.
+Оконные метрики (за 7 и 30 дней) стареют без записей, поэтому строка старше
+DASHBOARD_MAX_AGE пересчитывается при чтении.
+"""
+
+DASHBOARD_MAX_AGE = '15 minutes'
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+
+
+def refresh_dashboards(cur, admin_ids: list):
+    '''Пересчитать витрину сотрудников вместе с их ОМ и УМ. Вызывается в транзакции записи'''
+    admin_ids = [int(admin_id) for admin_id in admin_ids if admin_id]
+    if not admin_ids:
+        return
+    cur.execute(f"""
+        WITH targets AS (
+            SELECT unnest(%(ids)s::int[]) AS id
+            UNION
+            SELECT operational_manager_id FROM {SCHEMA}.manager_hierarchy
+            WHERE manager_id = ANY(%(ids)s) AND operational_manager_id IS NOT NULL
+            UNION
+            SELECT chief_manager_id FROM {SCHEMA}.manager_hierarchy
+            WHERE manager_id = ANY(%(ids)s) AND chief_manager_id IS NOT NULL
+        )
+        INSERT INTO {SCHEMA}.manager_dashboard (
+            admin_id, role, om_id, um_id, om_name, um_name,
+            objects_count, team_objects_count, tasks_completed, week_tasks_completed, team_week_tasks_completed,
+            copywriter_earnings, month_commission, total_earned, total_owner_payments, refreshed_at
+        )
+        SELECT
+            a.id, a.role, h.operational_manager_id, h.chief_manager_id, om.name, um.name,
+            (SELECT COUNT(*) FROM {SCHEMA}.manager_listings ml WHERE ml.manager_id = a.id),
+            (SELECT COUNT(*)
+             FROM {SCHEMA}.manager_hierarchy mh
+             JOIN {SCHEMA}.manager_listings ml ON ml.manager_id = mh.manager_id
+             WHERE mh.operational_manager_id = a.id),
+            (SELECT COUNT(*) FROM {SCHEMA}.manager_tasks mt
+             WHERE mt.manager_id = a.id AND mt.completed = true),
+            (SELECT COUNT(*) FROM {SCHEMA}.manager_tasks mt
+             WHERE mt.manager_id = a.id AND mt.completed = true
+               AND mt.completed_at > NOW() - INTERVAL '7 days'),
+            (SELECT COUNT(*)
+             FROM {SCHEMA}.manager_tasks mt
+             JOIN {SCHEMA}.manager_hierarchy mh ON mt.manager_id = mh.manager_id
+             WHERE mh.operational_manager_id = a.id AND mt.completed = true
+               AND mt.completed_at > NOW() - INTERVAL '7 days'),
+            (SELECT COALESCE(SUM(eb.bonus_amount), 0) FROM {SCHEMA}.employee_bonuses eb WHERE eb.admin_id = a.id),
+            (SELECT COALESCE(SUM(ch.amount), 0) FROM {SCHEMA}.commission_history ch
+             WHERE ch.admin_id = a.id AND ch.created_at > NOW() - INTERVAL '30 days'),
+            (SELECT COALESCE(SUM(ch.amount), 0) FROM {SCHEMA}.commission_history ch WHERE ch.admin_id = a.id),
+            CASE WHEN a.role = 'manager' THEN (
+                SELECT COALESCE(SUM(t.amount), 0)
+                FROM {SCHEMA}.manager_listings ml
+                JOIN {SCHEMA}.listings l ON ml.listing_id = l.id
+                JOIN {SCHEMA}.transactions t ON l.owner_id = t.owner_id
+                WHERE ml.manager_id = a.id AND t.type = 'payment' AND t.amount > 0
+            ) ELSE 0 END,
+            NOW()
+        FROM targets
+        JOIN {SCHEMA}.admins a ON a.id = targets.id
+        LEFT JOIN LATERAL (
+            SELECT operational_manager_id, chief_manager_id
+            FROM {SCHEMA}.manager_hierarchy
+            WHERE manager_id = a.id
+            LIMIT 1
+        ) h ON true
+        LEFT JOIN {SCHEMA}.admins om ON om.id = h.operational_manager_id
+        LEFT JOIN {SCHEMA}.admins um ON um.id = h.chief_manager_id
+        ON CONFLICT (admin_id) DO UPDATE SET
+            role = EXCLUDED.role,
+            om_id = EXCLUDED.om_id,
+            um_id = EXCLUDED.um_id,
+            om_name = EXCLUDED.om_name,
+            um_name = EXCLUDED.um_name,
+            objects_count = EXCLUDED.objects_count,
+            team_objects_count = EXCLUDED.team_objects_count,
+            tasks_completed = EXCLUDED.tasks_completed,
+            week_tasks_completed = EXCLUDED.week_tasks_completed,
+            team_week_tasks_completed = EXCLUDED.team_week_tasks_completed,
+            copywriter_earnings = EXCLUDED.copywriter_earnings,
+            month_commission = EXCLUDED.month_commission,
+            total_earned = EXCLUDED.total_earned,
+            total_owner_payments = EXCLUDED.total_owner_payments,
+            refreshed_at = EXCLUDED.refreshed_at
+    """, {'ids': admin_ids})
+
+
+def listing_managers(cur, listing_ids: list):
+    '''Менеджеры, за которыми закреплены объекты: запрашиваются до открепления, чтобы пересчитать их витрину'''
+    cur.execute(f"""
+        SELECT DISTINCT manager_id FROM {SCHEMA}.manager_listings
+        WHERE listing_id = ANY(%s::int[])
+    """, ([int(listing_id) for listing_id in listing_ids],))
+    rows = cur.fetchall()
+    return [row['manager_id'] if isinstance(row, dict) else row[0] for row in rows]
+
+
+DASHBOARD_QUERY = f"""
+    SELECT
+        a.id, a.name, a.email, a.role, a.balance, a.manager_level, a.om_grade,
+        a.object_limit, a.subscription_days_limit, a.commission_percent,
+        a.bonus_budget, a.warnings_count,
+        d.refreshed_at > NOW() - INTERVAL '{DASHBOARD_MAX_AGE}' AS is_fresh,
+        d.copywriter_earnings, d.om_id, d.um_id, d.om_name, d.um_name,
+        d.objects_count, d.team_objects_count, d.week_tasks_completed, d.team_week_tasks_completed,
+        d.month_commission, d.total_earned, d.total_owner_payments,
+        CASE WHEN d.objects_count > 0 THEN 1 + (
+            SELECT COUNT(*) FROM {SCHEMA}.manager_dashboard o WHERE o.objects_count > d.objects_count
+        ) END AS manager_rank,
+        CASE WHEN d.team_objects_count > 0 THEN 1 + (
+            SELECT COUNT(*) FROM {SCHEMA}.manager_dashboard o WHERE o.team_objects_count > d.team_objects_count
+        ) END AS om_rank,
+        CASE WHEN a.role = 'manager' THEN (
+            SELECT COALESCE(json_agg(x ORDER BY CASE x.urgency WHEN 'critical' THEN 1 WHEN 'warning' THEN 2 ELSE 3 END,
+                                               x.subscription_end), '[]'::json)
+            FROM (
+                SELECT
+                    l.id, l.title as name, l.district, l.status,
+                    l.subscription_expires_at as subscription_end,
+                    l.image_url as photo,
+                    l.phone as owner_phone,
+                    l.subscription_urgency as urgency,
+                    CASE WHEN l.owner_id IS NULL THEN true ELSE false END as no_payments,
+                    CASE WHEN l.manager_notes IS NOT NULL AND l.manager_notes != '' THEN true ELSE false END as has_notes
+                FROM {SCHEMA}.manager_listings ml
+                JOIN {SCHEMA}.listings l ON ml.listing_id = l.id
+                WHERE ml.manager_id = a.id AND l.status != 'inactive'
+            ) x
+        ) END AS listings,
+        CASE WHEN a.role = 'manager' THEN (
+            SELECT COALESCE(json_agg(x ORDER BY x.inactive_at DESC), '[]'::json)
+            FROM (
+                SELECT
+                    l.id, l.title as name, l.district, l.status,
+                    l.image_url as photo,
+                    l.phone as owner_phone,
+                    l.inactive_at,
+                    l.inactive_reason
+                FROM {SCHEMA}.manager_listings ml
+                JOIN {SCHEMA}.listings l ON ml.listing_id = l.id
+                WHERE ml.manager_id = a.id AND l.status = 'inactive'
+            ) x
+        ) END AS inactive_listings,
+        CASE WHEN a.role = 'manager' THEN (
+            SELECT COALESCE(json_agg(x ORDER BY x.deadline), '[]'::json)
+            FROM (
+                SELECT id, title, description, deadline, completed
+                FROM {SCHEMA}.manager_tasks
+                WHERE manager_id = a.id AND completed = false
+            ) x
+        ) END AS tasks,
+        CASE WHEN a.role = 'operational_manager' THEN (
+            SELECT COALESCE(json_agg(x), '[]'::json)
+            FROM (
+                SELECT
+                    m.id, m.name, m.manager_level, m.balance, m.object_limit,
+                    m.commission_percent, m.warnings_count,
+                    COALESCE(md.objects_count, 0) as objects_count
+                FROM {SCHEMA}.manager_hierarchy mh
+                JOIN {SCHEMA}.admins m ON mh.manager_id = m.id
+                LEFT JOIN {SCHEMA}.manager_dashboard md ON md.admin_id = m.id
+                WHERE mh.operational_manager_id = a.id
+            ) x
+        ) END AS managers,
+        CASE WHEN a.role = 'chief_manager' THEN (
+            SELECT COALESCE(json_agg(x), '[]'::json)
+            FROM (
+                SELECT
+                    o.id, o.name, o.om_grade, o.balance,
+                    COUNT(DISTINCT mh2.manager_id) as managers_count
+                FROM {SCHEMA}.manager_hierarchy mh
+                JOIN {SCHEMA}.admins o ON mh.operational_manager_id = o.id
+                LEFT JOIN {SCHEMA}.manager_hierarchy mh2 ON mh2.operational_manager_id = o.id
+                WHERE mh.chief_manager_id = a.id
+                GROUP BY o.id, o.name, o.om_grade, o.balance
+            ) x
+        ) END AS operational_managers,
+        CASE WHEN a.role = 'chief_manager' THEN (
+            SELECT COUNT(DISTINCT manager_id)
+            FROM {SCHEMA}.manager_hierarchy
+            WHERE chief_manager_id = a.id
+        ) END AS total_managers
+    FROM {SCHEMA}.admins a
+    LEFT JOIN {SCHEMA}.manager_dashboard d ON d.admin_id = a.id
+    WHERE a.id = %s AND a.is_active = true
+"""
+
+
+def fetch_dashboard(cur, admin_id: int):
+    '''Строка кабинета одним запросом; устаревшая витрина пересчитывается и читается заново'''
+    cur.execute(DASHBOARD_QUERY, (admin_id,))
+    row = cur.fetchone()
+    if row and not row['is_fresh']:
+        refresh_dashboards(cur, [admin_id])
+        cur.execute(DASHBOARD_QUERY, (admin_id,))
+        row = cur.fetchone()
+    return row
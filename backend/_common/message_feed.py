@@ -0,0 +1,74 @@
+"""Доставка новых сообщений длинным опросом (long-poll) через LISTEN/NOTIFY.
+
+Запись сообщения (см. _common/inbox.py) делает pg_notify в своей транзакции:
+уведомление уходит только после COMMIT. Клиент запрашивает страницу after=<id>
+с wait=<секунд>; если новых сообщений нет, функция слушает канал и повторяет
+запрос, как только придёт уведомление по его переписке, — обычно это доли
+секунды после отправки. По истечении wait возвращается пустая страница с тем
+же курсором, и клиент сразу переподключается.
+
+SSE здесь не подходит: ответ облачной функции отдаётся целиком, а не потоком.
+"""
+import select
+import time
+
+from _common.db import get_db_connection
+
+MAX_WAIT_SECONDS = 25
+
+EMPLOYEE_CHANNEL = 'employee_messages'
+OWNER_CHAT_CHANNEL = 'owner_manager_messages'
+
+
+def notify(cur, channel: str, *ids):
+    '''Уведомить слушателей канала: payload — id через двоеточие'''
+    cur.execute("SELECT pg_notify(%s, %s)", (channel, ':'.join(str(i) for i in ids)))
+
+
+def wait_seconds(params: dict) -> float:
+    '''Параметр wait из query string, не больше MAX_WAIT_SECONDS; 0 — без ожидания'''
+    wait = float(params.get('wait') or 0)
+    if wait < 0:
+        raise ValueError('wait не может быть отрицательным')
+    return min(wait, MAX_WAIT_SECONDS)
+
+
+def wait_for_messages(channel: str, is_relevant, fetch, wait: float) -> dict:
+    '''Страница новых сообщений: fetch(conn) -> {items, ...}; ждёт не дольше wait секунд.
+
+    is_relevant(ids) получает id из payload уведомления и решает, касается ли оно
+    этой переписки, — чужие сообщения не вызывают лишних запросов.
+    '''
+    conn = get_db_connection()
+    cur = None
+    try:
+        conn.autocommit = True
+        cur = conn.cursor()
+        # Подписка до первой проверки: сообщение между проверкой и ожиданием не потеряется
+        cur.execute(f'LISTEN {channel}')
+        result = fetch(conn)
+        deadline = time.monotonic() + wait
+
+        while not result['items']:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if select.select([conn], [], [], remaining) == ([], [], []):
+                break
+            conn.poll()
+            relevant = False
+            while conn.notifies:
+                payload = conn.notifies.pop(0).payload
+                try:
+                    relevant = relevant or is_relevant([int(i) for i in payload.split(':')])
+                except ValueError:
+                    continue
+            if relevant:
+                result = fetch(conn)
+        return result
+    finally:
+        # Соединение вернётся в пул: подписка не должна пережить этот вызов
+        if cur is not None and not conn.closed:
+            cur.execute('UNLISTEN *')
+            cur.close()
+        conn.close()
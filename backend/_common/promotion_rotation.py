@@ -0,0 +1,174 @@
+"""Ежедневная ротация позиций платного продвижения.
+
+Раз в день (daily-rotation) для каждого города с активными пакетами
+promotion_packages и бронями top20_bookings раздаются позиции на этот день:
+
+- бронь ТОП-20 занимает свою позицию (при совпадении — более ранняя бронь);
+- пакеты раздаются по уровням gold -> silver -> bronze, каждый получает
+  свободную позицию из PACKAGE_RANGES своего уровня. Очерёдность пакетов и
+  перебор позиций задаёт хеш (день, id пакета), поэтому в течение дня
+  результат один и тот же, а на следующий день — другой. Если диапазон
+  занят целиком, пакет встаёт на первую свободную позицию после диапазона;
+- остальные объекты города заполняют свободные позиции в прежнем порядке.
+
+Результат записывается одним UPDATE в listings.auction_rank (порядок, см.
+_common/auction_ranks.py) и listings.auction (позиция) — public-listings
+читает готовый порядок каталога, ничего не вычисляя при запросе.
+"""
+import hashlib
+
+from psycopg2.extras import execute_values
+
+from _common.auction_ranks import RANK_GAP, lock_city
+from _common.catalog import VISIBLE_CONDITION, invalidate_catalog
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+
+PACKAGE_RANGES = {
+    'bronze': (20, 50),
+    'silver': (10, 40),
+    'gold': (1, 30)
+}
+
+# Старший уровень выбирает позиции первым
+TIER_ORDER = ('gold', 'silver', 'bronze')
+
+
+def _score(*parts) -> int:
+    '''Детерминированный псевдослучайный ключ сортировки'''
+    digest = hashlib.sha256(':'.join(str(part) for part in parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def _fetch(cur) -> list:
+    columns = [column[0] for column in cur.description]
+    return [dict(row) if isinstance(row, dict) else dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def assign_positions(packages: list, bookings: list, day) -> dict:
+    '''Позиции на день day для одного города: {listing_id: position}.
+
+    packages — [{id, listing_id, package_type}], bookings — [{listing_id, position}]
+    в порядке бронирования.
+    '''
+    slots = {}
+    placed = {}
+
+    for booking in bookings:
+        if booking['position'] in slots or booking['listing_id'] in placed:
+            continue
+        slots[booking['position']] = booking['listing_id']
+        placed[booking['listing_id']] = booking['position']
+
+    for tier in TIER_ORDER:
+        min_pos, max_pos = PACKAGE_RANGES[tier]
+        tier_packages = sorted((p for p in packages if p['package_type'] == tier),
+                               key=lambda p: _score(day, p['id']))
+        for package in tier_packages:
+            if package['listing_id'] in placed:
+                continue
+            candidates = sorted(range(min_pos, max_pos + 1), key=lambda pos: _score(day, package['id'], pos))
+            position = next((pos for pos in candidates if pos not in slots), None)
+            if position is None:
+                position = max_pos + 1
+                while position in slots:
+                    position += 1
+            slots[position] = package['listing_id']
+            placed[package['listing_id']] = position
+
+    return placed
+
+
+def city_order(listing_ids: list, placed: dict) -> list:
+    '''Порядок объектов города: продвигаемые на своих позициях, остальные — по порядку'''
+    by_position = {position: listing_id for listing_id, position in placed.items()}
+    rest = iter([listing_id for listing_id in listing_ids if listing_id not in placed])
+    order = []
+    position = 1
+    while len(order) < len(listing_ids):
+        if position in by_position:
+            order.append(by_position[position])
+        else:
+            listing_id = next(rest, None)
+            if listing_id is not None:
+                order.append(listing_id)
+        position += 1
+    return order
+
+
+def rotate_promotions(cur, day, cities: list = None) -> dict:
+    '''Разложить продвигаемые объекты на день day (все города или только cities).
+    Вызывается в транзакции; возвращает {cities, promoted, updated}'''
+    city_filter = list(cities) if cities else None
+
+    cur.execute(f"""
+        SELECT pp.id, pp.listing_id, pp.package_type, l.city
+        FROM {SCHEMA}.promotion_packages pp
+        JOIN {SCHEMA}.listings l ON l.id = pp.listing_id
+        WHERE pp.is_active = true
+          AND pp.end_date > CURRENT_TIMESTAMP
+          AND (%s::text[] IS NULL OR l.city = ANY(%s::text[]))
+        ORDER BY pp.id
+    """, (city_filter, city_filter))
+    packages = _fetch(cur)
+
+    cur.execute(f"""
+        SELECT b.listing_id, b.position, l.city
+        FROM {SCHEMA}.top20_bookings b
+        JOIN {SCHEMA}.listings l ON l.id = b.listing_id
+        WHERE b.is_active = true
+          AND b.expires_at > CURRENT_TIMESTAMP
+          AND (%s::text[] IS NULL OR l.city = ANY(%s::text[]))
+        ORDER BY b.booked_at, b.id
+    """, (city_filter, city_filter))
+    bookings = _fetch(cur)
+
+    rotated_cities = sorted({row['city'] for row in packages + bookings})
+    if not rotated_cities:
+        return {'cities': 0, 'promoted': 0, 'updated': 0}
+
+    # Города блокируются по алфавиту: параллельные ротации не взаимоблокируются,
+    # перестановки в admin-listings ждут окончания ротации города
+    for city in rotated_cities:
+        lock_city(cur, city)
+
+    # Скрытые объекты (архив, модерация) не занимают платные позиции — они в конце
+    cur.execute(f"""
+        SELECT l.id, l.city, ({VISIBLE_CONDITION}) AS visible
+        FROM {SCHEMA}.listings l
+        WHERE l.city = ANY(%s)
+        ORDER BY l.city, visible DESC, l.auction_rank, l.id
+    """, (rotated_cities,))
+    listings_by_city = {}
+    visible = set()
+    for row in _fetch(cur):
+        listings_by_city.setdefault(row['city'], []).append(row['id'])
+        if row['visible']:
+            visible.add(row['id'])
+
+    values = []
+    promoted = 0
+    for city in rotated_cities:
+        listing_ids = listings_by_city.get(city, [])
+        placed = assign_positions(
+            [p for p in packages if p['city'] == city and p['listing_id'] in visible],
+            [b for b in bookings if b['city'] == city and b['listing_id'] in visible],
+            day
+        )
+        promoted += len(placed)
+        for position, listing_id in enumerate(city_order(listing_ids, placed), start=1):
+            values.append((listing_id, position * RANK_GAP, position))
+
+    execute_values(cur, f"""
+        UPDATE {SCHEMA}.listings AS l
+        SET auction_rank = v.auction_rank, auction = v.auction
+        FROM (VALUES %s) AS v(id, auction_rank, auction)
+        WHERE l.id = v.id
+          AND (l.auction_rank <> v.auction_rank OR l.auction IS DISTINCT FROM v.auction)
+    """, values, template='(%s, %s::bigint, %s::integer)', page_size=len(values) or 1)
+    updated = cur.rowcount
+
+    if updated:
+        invalidate_catalog(cur, cities=rotated_cities)
+
+    return {'cities': len(rotated_cities), 'promoted': promoted, 'updated': updated}
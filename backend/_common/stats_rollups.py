@@ -0,0 +1,140 @@
+"""Недельные и месячные агрегаты статистики объектов.
+
+listing_stats_rollups хранит суммы просмотров, кликов и звонков по неделям
+(начало — понедельник) и месяцам. Агрегаты обновляются инкрементально:
+statistics при переносе событий из staging, route-call при каждом звонке.
+
+stats_for_range() считает любой период, разбивая его на целые месяцы,
+целые недели и оставшиеся дни: по краям периода читаются дневные строки,
+середина — из агрегатов.
+"""
+from datetime import date, timedelta
+
+PERIODS = ('week', 'month')
+COUNTERS = ('views', 'clicks', 'phone_clicks', 'telegram_clicks', 'calls')
+SCOPES = ('listing', 'owner', 'city')
+
+
+def add_call(cur, listing_id: int):
+    '''Учесть звонок по объекту в агрегатах текущей недели и месяца'''
+    cur.execute("""
+        INSERT INTO listing_stats_rollups (listing_id, period, period_start, calls)
+        SELECT %s, p.period, date_trunc(p.period, CURRENT_DATE)::date, 1
+        FROM unnest(%s::text[]) AS p(period)
+        ON CONFLICT (listing_id, period, period_start)
+        DO UPDATE SET calls = listing_stats_rollups.calls + 1
+    """, (listing_id, list(PERIODS)))
+
+
+def apply_daily_deltas_sql(source: str) -> str:
+    '''SQL-фрагмент CTE, добавляющий дневные дельты из source в агрегаты.
+
+    source — имя CTE с колонками listing_id, date, views, clicks, phone_clicks, telegram_clicks.
+    '''
+    return f"""
+        rolled AS (
+            INSERT INTO listing_stats_rollups
+                (listing_id, period, period_start, views, clicks, phone_clicks, telegram_clicks)
+            SELECT s.listing_id, p.period, date_trunc(p.period, s.date)::date,
+                   SUM(s.views), SUM(s.clicks), SUM(s.phone_clicks), SUM(s.telegram_clicks)
+            FROM {source} s
+            CROSS JOIN (VALUES ('week'), ('month')) AS p(period)
+            GROUP BY s.listing_id, p.period, date_trunc(p.period, s.date)
+            ORDER BY 1, 2, 3
+            ON CONFLICT (listing_id, period, period_start)
+            DO UPDATE SET views = listing_stats_rollups.views + EXCLUDED.views,
+                          clicks = listing_stats_rollups.clicks + EXCLUDED.clicks,
+                          phone_clicks = listing_stats_rollups.phone_clicks + EXCLUDED.phone_clicks,
+                          telegram_clicks = listing_stats_rollups.telegram_clicks + EXCLUDED.telegram_clicks
+            RETURNING 1
+        )"""
+
+
+def month_end(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def split_range(start: date, end: date) -> dict:
+    '''Разбить [start, end] на целые месяцы, целые недели и отдельные дни'''
+    months, weeks, days = [], [], []
+    current = start
+    while current <= end:
+        if current.day == 1 and month_end(current) <= end:
+            months.append(current)
+            current = month_end(current) + timedelta(days=1)
+            continue
+        week_end = current + timedelta(days=6)
+        # Неделя, заходящая на целый месяц периода, помешала бы взять его одной строкой
+        crosses_full_month = week_end.month != current.month and month_end(week_end) <= end
+        if current.weekday() == 0 and week_end <= end and not crosses_full_month:
+            weeks.append(current)
+            current += timedelta(days=7)
+            continue
+        days.append(current)
+        current += timedelta(days=1)
+    return {'months': months, 'weeks': weeks, 'days': days}
+
+
+def scope_condition(scope: str, alias: str = 'x') -> str:
+    '''Условие на listing_id для объекта, владельца или города'''
+    if scope == 'listing':
+        return f'{alias}.listing_id = %s'
+    if scope == 'owner':
+        return f'{alias}.listing_id IN (SELECT id FROM listings WHERE owner_id = %s)'
+    if scope == 'city':
+        return f'{alias}.listing_id IN (SELECT id FROM listings WHERE LOWER(city) = LOWER(%s))'
+    raise ValueError(f'Unknown scope: {scope}')
+
+
+def stats_for_range(cur, scope: str, scope_id, start: date, end: date) -> dict:
+    '''Суммарная статистика за период по объекту, владельцу или городу одним запросом'''
+    if end < start:
+        raise ValueError('Конец периода раньше начала')
+    parts = split_range(start, end)
+    condition = scope_condition(scope)
+
+    cur.execute(f"""
+        SELECT COALESCE(SUM(views), 0)::int, COALESCE(SUM(clicks), 0)::int,
+               COALESCE(SUM(phone_clicks), 0)::int, COALESCE(SUM(telegram_clicks), 0)::int,
+               COALESCE(SUM(calls), 0)::int
+        FROM (
+            SELECT x.views, x.clicks, x.phone_clicks, x.telegram_clicks, x.calls
+            FROM listing_stats_rollups x
+            WHERE {condition} AND x.period = 'month' AND x.period_start = ANY(%s::date[])
+            UNION ALL
+            SELECT x.views, x.clicks, x.phone_clicks, x.telegram_clicks, x.calls
+            FROM listing_stats_rollups x
+            WHERE {condition} AND x.period = 'week' AND x.period_start = ANY(%s::date[])
+            UNION ALL
+            SELECT x.views, x.clicks, x.phone_clicks, x.telegram_clicks, 0
+            FROM listing_statistics x
+            WHERE {condition} AND x.date = ANY(%s::date[])
+            UNION ALL
+            SELECT 0, 0, 0, 0, COUNT(*)
+            FROM call_tracking x
+            WHERE {condition} AND x.called_at IS NOT NULL AND x.called_at::date = ANY(%s::date[])
+            UNION ALL
+            -- Ещё не перенесённые из staging события за весь период
+            SELECT x.views, x.clicks, x.phone_clicks, x.telegram_clicks, 0
+            FROM listing_statistics_staging x
+            WHERE {condition} AND x.date BETWEEN %s AND %s
+        ) t
+    """, (
+        scope_id, parts['months'],
+        scope_id, parts['weeks'],
+        scope_id, parts['days'],
+        scope_id, parts['days'],
+        scope_id, start, end
+    ))
+    row = cur.fetchone()
+    totals = dict(zip(COUNTERS, row))
+    totals['ctr'] = round(totals['clicks'] / totals['views'] * 100, 2) if totals['views'] else 0
+    totals['call_conversion'] = round(totals['calls'] / totals['views'] * 100, 2) if totals['views'] else 0
+    return {
+        'scope': scope,
+        'id': scope_id,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'totals': totals,
+        'buckets': {key: len(value) for key, value in parts.items()}
+    }
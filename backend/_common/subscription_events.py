@@ -0,0 +1,175 @@
+"""Запланированные события окончания подписки объекта.
+
+Каждая функция, меняющая listings.subscription_expires_at, вызывает в своей
+транзакции schedule_expiry(): неотправленные события объекта пересоздаются
+под новый срок — «осталось 3 дня», «остался 1 день» и «истекла» с временем
+срабатывания fire_at. Там же пересчитывается listings.subscription_urgency,
+которую показывает кабинет менеджера.
+
+Диспетчер (cron-archive-expired) берёт наступившие события пачками по индексу
+fire_at с FOR UPDATE SKIP LOCKED и в той же транзакции помечает их fired_at —
+событие срабатывает ровно один раз, а уникальный ключ (объект, вид, срок) не
+даёт запланировать его повторно для того же срока. «Истекла» архивирует или
+продлевает объект (_common/listing_lifecycle.py), напоминания владельцу
+отправляет job-worker (задача SUBSCRIPTION_REMINDERS).
+
+Объект в архиве событий не имеет: снятие с архива (продление, модерация,
+правка в admin-listings) тоже вызывает schedule_expiry(). На случай пропущенного
+вызова диспетчер перед запуском досоздаёт события объектам без «истекла» под
+текущий срок (reconcile_expiry).
+"""
+import time
+
+from _common.db import transaction
+from _common.jobs import enqueue
+from _common.listing_lifecycle import expire_batch
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+
+DISPATCH_BATCH_SIZE = 200
+RECONCILE_BATCH_SIZE = 500
+
+# Вид события -> за сколько до окончания подписки оно срабатывает
+EVENT_LEADS = (
+    ('expiring_3d', '3 days'),
+    ('expiring_1d', '1 day'),
+    ('expired', '0')
+)
+REMINDER_KINDS = ('expiring_3d', 'expiring_1d')
+
+DISPATCH_SUBSCRIPTION_EVENTS = 'dispatch_subscription_events'
+SUBSCRIPTION_REMINDERS = 'subscription_reminders'
+
+
+def _ids(listing_ids) -> list:
+    return [int(listing_id) for listing_id in listing_ids if listing_id]
+
+
+def refresh_urgency(cur, listing_ids: list):
+    '''Пересчитать subscription_urgency объектов по текущему сроку подписки'''
+    cur.execute(f"""
+        UPDATE {SCHEMA}.listings
+        SET subscription_urgency = CASE
+                WHEN subscription_expires_at < NOW() + INTERVAL '1 day' THEN 'critical'
+                WHEN subscription_expires_at < NOW() + INTERVAL '3 days' THEN 'warning'
+                ELSE 'ok'
+            END
+        WHERE id = ANY(%s::int[])
+    """, (listing_ids,))
+
+
+def schedule_expiry(cur, listing_ids: list):
+    '''Запланировать события под текущий subscription_expires_at объектов.
+    Вызывается в транзакции, изменившей срок (или снявшей подписку)'''
+    listing_ids = _ids(listing_ids)
+    if not listing_ids:
+        return
+    cur.execute(f"""
+        DELETE FROM {SCHEMA}.subscription_events
+        WHERE listing_id = ANY(%s::int[]) AND fired_at IS NULL
+    """, (listing_ids,))
+    # Напоминание, время которого уже прошло, не планируется; «истекла» — всегда
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.subscription_events (listing_id, kind, expires_at, fire_at)
+        SELECT l.id, k.kind, l.subscription_expires_at, l.subscription_expires_at - k.lead::interval
+        FROM {SCHEMA}.listings l
+        CROSS JOIN unnest(%s::text[], %s::text[]) AS k(kind, lead)
+        WHERE l.id = ANY(%s::int[])
+          AND l.is_archived = false
+          AND l.subscription_expires_at IS NOT NULL
+          AND (k.kind = 'expired' OR l.subscription_expires_at - k.lead::interval > NOW())
+        ON CONFLICT (listing_id, kind, expires_at) DO NOTHING
+    """, ([kind for kind, _ in EVENT_LEADS], [lead for _, lead in EVENT_LEADS], listing_ids))
+    refresh_urgency(cur, listing_ids)
+
+
+def reconcile_expiry(cur, limit: int = RECONCILE_BATCH_SIZE) -> int:
+    '''Запланировать события объектам вне архива, у которых нет «истекла» под
+    текущий срок. Вызывается в транзакции; возвращает число объектов'''
+    cur.execute(f"""
+        SELECT l.id
+        FROM {SCHEMA}.listings l
+        WHERE l.is_archived = false
+          AND l.subscription_expires_at IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM {SCHEMA}.subscription_events e
+              WHERE e.listing_id = l.id AND e.kind = 'expired'
+                AND e.expires_at = l.subscription_expires_at
+          )
+        ORDER BY l.subscription_expires_at, l.id
+        LIMIT %s
+    """, (limit,))
+    listing_ids = [row['id'] if isinstance(row, dict) else row[0] for row in cur.fetchall()]
+    schedule_expiry(cur, listing_ids)
+    return len(listing_ids)
+
+
+def dispatch_batch(cur, limit: int = DISPATCH_BATCH_SIZE) -> dict:
+    '''Сработать до limit наступивших событий. Вызывается в транзакции;
+    возвращает {fired, reminders, archived, renewed}'''
+    cur.execute(f"""
+        WITH due AS (
+            SELECT id FROM {SCHEMA}.subscription_events
+            WHERE fired_at IS NULL AND fire_at <= NOW()
+            ORDER BY fire_at, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE {SCHEMA}.subscription_events e
+        SET fired_at = NOW()
+        FROM due
+        WHERE e.id = due.id
+        RETURNING e.id, e.listing_id, e.kind
+    """, (limit,))
+    columns = [column[0] for column in cur.description]
+    events = [dict(row) if isinstance(row, dict) else dict(zip(columns, row)) for row in cur.fetchall()]
+    result = {'fired': len(events), 'reminders': 0, 'archived': 0, 'renewed': 0}
+    if not events:
+        return result
+
+    reminder_ids = [event['id'] for event in events if event['kind'] in REMINDER_KINDS]
+    if reminder_ids:
+        enqueue(cur, SUBSCRIPTION_REMINDERS, {'event_ids': reminder_ids},
+                idempotency_key=f'{SUBSCRIPTION_REMINDERS}:{min(reminder_ids)}')
+        result['reminders'] = len(reminder_ids)
+
+    # expire_batch сам проверяет, что подписка действительно истекла и объект не в архиве
+    expired_ids = sorted({event['listing_id'] for event in events if event['kind'] == 'expired'})
+    if expired_ids:
+        transitions = expire_batch(cur, len(expired_ids), listing_ids=expired_ids)
+        renewed_ids = [t['listing_id'] for t in transitions if t['event'] == 'renewed']
+        result['archived'] = len(transitions) - len(renewed_ids)
+        result['renewed'] = len(renewed_ids)
+        schedule_expiry(cur, renewed_ids)
+
+    refresh_urgency(cur, sorted({event['listing_id'] for event in events}))
+    return result
+
+
+def dispatch_due(budget_seconds: int, batch_size: int = DISPATCH_BATCH_SIZE) -> dict:
+    '''Срабатывать пачки событий, пока они есть и не вышло время.
+    Возвращает {fired, reminders, archived, renewed, batches, has_more}'''
+    deadline = time.monotonic() + budget_seconds
+    result = {'fired': 0, 'reminders': 0, 'archived': 0, 'renewed': 0, 'batches': 0, 'has_more': False}
+
+    while True:
+        with transaction() as conn:
+            batch = dispatch_batch(conn.cursor(), batch_size)
+        if batch['fired']:
+            result['batches'] += 1
+        for key in ('fired', 'reminders', 'archived', 'renewed'):
+            result[key] += batch[key]
+
+        # Неполная пачка — наступивших событий больше нет (или остальные заняты)
+        if batch['fired'] < batch_size:
+            break
+        if time.monotonic() >= deadline:
+            result['has_more'] = True
+            break
+
+    return result
+
+
+def schedule_dispatch(cur, idempotency_key: str = DISPATCH_SUBSCRIPTION_EVENTS) -> dict:
+    '''Поставить в очередь продолжение диспетчера, не уложившегося во время'''
+    return enqueue(cur, DISPATCH_SUBSCRIPTION_EVENTS, {}, idempotency_key=idempotency_key)
@@ -0,0 +1,237 @@
+"""Загрузка фотографий напрямую в хранилище по presigned URL.
+
+Клиент запрашивает загрузку (presign) с именем, типом и размером файла и
+получает либо один presigned PUT, либо multipart-загрузку с URL на каждую
+часть. Файл идёт прямо в бакет files, минуя память функции. После загрузки
+клиент вызывает complete: SHA-256 объекта считается потоковым чтением из
+хранилища, и, если этот же файл уже есть, объект удаляется в пользу
+существующего; иначе переносится под ключ от хэша содержимого, а уменьшенные
+копии строит job-worker (задача PROCESS_UPLOAD, см. _common/images.py).
+
+Сессии загрузок хранятся в upload_sessions; незавершённые можно отменить (abort).
+Транзакции здесь короткие: ни одна не открыта во время обращений к хранилищу.
+"""
+import hashlib
+import os
+import uuid
+
+from _common.db import get_db_connection, transaction
+from _common.images import BUCKET, CONTENT_TYPES, IMMUTABLE_CACHE_CONTROL, S3_ENDPOINT, \
+    cdn_url, get_s3, perceptual_hash, find_duplicate, count_reuse, store_variants, record_variants, register_hash
+from _common.job_tasks import PROCESS_UPLOAD
+from _common.jobs import enqueue
+
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+# Крупнее — multipart: части по PART_SIZE (минимум S3 — 5 МБ, кроме последней)
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+PART_SIZE = 8 * 1024 * 1024
+PRESIGN_EXPIRES_SECONDS = 900
+# Хэш считается по частям: в памяти функции не больше одного куска файла
+HASH_CHUNK_BYTES = 1024 * 1024
+
+ALLOWED_CONTENT_TYPES = {content_type: extension for extension, content_type in CONTENT_TYPES.items()
+                         if extension != 'jpg'}
+
+
+def get_presign_s3():
+    import boto3
+    from botocore.config import Config
+    return boto3.client('s3',
+        endpoint_url=S3_ENDPOINT,
+        aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+        aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'],
+        config=Config(signature_version='s3v4')
+    )
+
+
+def presign_upload(s3, cur, content_type: str, size: int) -> dict:
+    '''Открыть сессию загрузки: presigned PUT или multipart с URL частей'''
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise ValueError(f'Недопустимый тип файла: {content_type}')
+    if not isinstance(size, int) or size <= 0 or size > MAX_UPLOAD_BYTES:
+        raise ValueError(f'Размер файла должен быть от 1 байта до {MAX_UPLOAD_BYTES // (1024 * 1024)} МБ')
+
+    upload_id = str(uuid.uuid4())
+    key = f'uploads/{upload_id}.{ALLOWED_CONTENT_TYPES[content_type]}'
+
+    if size <= MULTIPART_THRESHOLD:
+        # Тип и длина входят в подпись: файл другого размера или типа S3 отклонит
+        url = s3.generate_presigned_url('put_object', Params={
+            'Bucket': BUCKET,
+            'Key': key,
+            'ContentType': content_type,
+            'ContentLength': size
+        }, ExpiresIn=PRESIGN_EXPIRES_SECONDS)
+        multipart_id = None
+        result = {'upload_id': upload_id, 'method': 'PUT', 'url': url,
+                  'headers': {'Content-Type': content_type}}
+    else:
+        multipart = s3.create_multipart_upload(Bucket=BUCKET, Key=key, ContentType=content_type)
+        multipart_id = multipart['UploadId']
+        parts = []
+        for number in range(1, -(-size // PART_SIZE) + 1):
+            parts.append({
+                'part_number': number,
+                'url': s3.generate_presigned_url('upload_part', Params={
+                    'Bucket': BUCKET,
+                    'Key': key,
+                    'UploadId': multipart_id,
+                    'PartNumber': number
+                }, ExpiresIn=PRESIGN_EXPIRES_SECONDS)
+            })
+        result = {'upload_id': upload_id, 'method': 'MULTIPART', 'part_size': PART_SIZE, 'parts': parts}
+
+    cur.execute("""
+        INSERT INTO upload_sessions (id, object_key, content_type, size, multipart_id, status)
+        VALUES (%s, %s, %s, %s, %s, 'pending')
+    """, (upload_id, key, content_type, size, multipart_id))
+    result['expires_in'] = PRESIGN_EXPIRES_SECONDS
+    return result
+
+
+def _pending_session(upload_id: str) -> dict:
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, object_key, content_type, size, multipart_id
+            FROM upload_sessions
+            WHERE id = %s AND status = 'pending'
+        """, (upload_id,))
+        row = cur.fetchone()
+    if not row:
+        raise LookupError('Загрузка не найдена или уже завершена')
+    return {'id': row[0], 'key': row[1], 'content_type': row[2], 'size': row[3], 'multipart_id': row[4]}
+
+
+def _finish_session(cur, upload_id: str, status: str, url: str = None):
+    '''Закрыть сессию; параллельный complete/abort той же загрузки получит LookupError'''
+    cur.execute("""
+        UPDATE upload_sessions
+        SET status = %s, url = %s, completed_at = NOW()
+        WHERE id = %s AND status = 'pending'
+    """, (status, url, upload_id))
+    if cur.rowcount == 0:
+        raise LookupError('Загрузка не найдена или уже завершена')
+
+
+def _stream_hash(s3, key: str) -> str:
+    body = s3.get_object(Bucket=BUCKET, Key=key)['Body']
+    digest = hashlib.sha256()
+    for chunk in body.iter_chunks(HASH_CHUNK_BYTES):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def complete_upload(s3, upload_id: str, parts: list = None) -> dict:
+    '''Зарегистрировать загруженный объект: проверка размера, ключ от хэша.
+    Копии строит job-worker; в ответе job_id задачи'''
+    session = _pending_session(upload_id)
+
+    if session['multipart_id']:
+        if not parts:
+            raise ValueError('parts required for multipart upload')
+        s3.complete_multipart_upload(
+            Bucket=BUCKET,
+            Key=session['key'],
+            UploadId=session['multipart_id'],
+            MultipartUpload={'Parts': sorted(
+                ({'PartNumber': int(p['part_number']), 'ETag': p['etag']} for p in parts),
+                key=lambda p: p['PartNumber']
+            )}
+        )
+
+    head = s3.head_object(Bucket=BUCKET, Key=session['key'])
+    if head['ContentLength'] > MAX_UPLOAD_BYTES or head['ContentLength'] != session['size']:
+        s3.delete_object(Bucket=BUCKET, Key=session['key'])
+        with transaction() as conn:
+            _finish_session(conn.cursor(), upload_id, 'rejected')
+        raise ValueError('Размер загруженного файла не совпадает с заявленным')
+
+    digest = _stream_hash(s3, session['key'])
+    with transaction() as conn:
+        duplicate = find_duplicate(conn.cursor(), digest)
+
+    if duplicate:
+        s3.delete_object(Bucket=BUCKET, Key=session['key'])
+        with transaction() as conn:
+            cur = conn.cursor()
+            _finish_session(cur, upload_id, 'completed', duplicate['url'])
+            count_reuse(cur, duplicate)
+        duplicate.pop('sha256', None)
+        return duplicate
+
+    extension = ALLOWED_CONTENT_TYPES[session['content_type']]
+    original_key = f'listings/{digest}/original.{extension}'
+    s3.copy_object(
+        Bucket=BUCKET,
+        Key=original_key,
+        CopySource={'Bucket': BUCKET, 'Key': session['key']},
+        ContentType=session['content_type'],
+        CacheControl=IMMUTABLE_CACHE_CONTROL,
+        MetadataDirective='REPLACE'
+    )
+    s3.delete_object(Bucket=BUCKET, Key=session['key'])
+
+    url = cdn_url(original_key)
+    with transaction() as conn:
+        cur = conn.cursor()
+        _finish_session(cur, upload_id, 'completed', url)
+        job = enqueue(cur, PROCESS_UPLOAD, {'key': original_key, 'sha256': digest},
+                      idempotency_key=f'{PROCESS_UPLOAD}:{digest}')
+    return {'url': url, 'variants': {}, 'lqip': None, 'width': None, 'height': None,
+            'duplicate': None, 'job_id': job['id']}
+
+
+def process_upload(payload: dict) -> dict:
+    '''Задача job-worker: уменьшенные копии и перцептивный хэш загруженного оригинала'''
+    key, digest = payload['key'], payload['sha256']
+    s3 = get_s3()
+    data = s3.get_object(Bucket=BUCKET, Key=key)['Body'].read()
+    phash = perceptual_hash(data)
+    image = store_variants(s3, data, digest, key)
+    with transaction() as conn:
+        cur = conn.cursor()
+        record_variants(cur, image)
+        register_hash(cur, image, digest, phash)
+    return {'url': image['url'], 'variants': sorted(image['variants'])}
+
+
+def abort_upload(s3, upload_id: str):
+    session = _pending_session(upload_id)
+    with transaction() as conn:
+        _finish_session(conn.cursor(), upload_id, 'aborted')
+    if session['multipart_id']:
+        s3.abort_multipart_upload(Bucket=BUCKET, Key=session['key'], UploadId=session['multipart_id'])
+    else:
+        s3.delete_object(Bucket=BUCKET, Key=session['key'])
+
+
+def handle_upload_action(body: dict):
+    '''Действия presign/complete/abort для функций загрузки: (statusCode, payload) или None'''
+    action = body.get('action')
+    if action not in ('presign', 'complete', 'abort'):
+        return None
+
+    s3 = get_presign_s3()
+    try:
+        if action == 'presign':
+            size = body.get('size')
+            conn = get_db_connection()
+            try:
+                cur = conn.cursor()
+                result = presign_upload(s3, cur, body.get('content_type') or body.get('contentType'),
+                                        int(size) if str(size).isdigit() else size)
+                conn.commit()
+                cur.close()
+            finally:
+                conn.close()
+        elif action == 'complete':
+            result = complete_upload(s3, body.get('upload_id'), body.get('parts'))
+        else:
+            abort_upload(s3, body.get('upload_id'))
+            result = {'success': True}
+    except ValueError as e:
+        return 400, {'error': str(e)}
+    except LookupError as e:
+        return 404, {'error': str(e)}
+    return 200, result
@@ -0,0 +1,108 @@
+"""Выдача виртуальных номеров из пула.
+
+Номер выдаётся в аренду (lease) на LEASE_MINUTES. Истёкшая аренда считается
+свободной прямо в запросе захвата, поэтому глобальная чистка пула на каждом
+запросе не нужна. Захват — один UPDATE ... FOR UPDATE SKIP LOCKED: параллельные
+запросы не ждут друг друга, а берут разные номера.
+
+Повторный запрос того же клиента по тому же объекту продлевает его прежний
+номер (sticky), если тот не успели отдать другому.
+"""
+
+LEASE_MINUTES = 5
+DIRECT_NUMBER = 'direct'
+
+# Свободен: не занят или аренда истекла; отключённые номера не выдаются
+AVAILABLE_CONDITION = "(is_busy = FALSE OR assigned_until < NOW()) AND is_active IS NOT FALSE"
+
+
+def claim_number(cur, listing_id: int, client_phone: str = None, lease_minutes: int = LEASE_MINUTES):
+    '''Захватить номер для объекта: (phone, assigned_until, sticky) или None, если пул исчерпан'''
+    lease = f'{int(lease_minutes)} minutes'
+
+    if client_phone:
+        cur.execute("""
+            UPDATE virtual_numbers
+            SET is_busy = TRUE, assigned_at = NOW(), assigned_until = NOW() + %s::interval
+            WHERE id = (
+                SELECT id FROM virtual_numbers
+                WHERE assigned_listing_id = %s AND assigned_client_phone = %s
+                  AND is_active IS NOT FALSE
+                ORDER BY assigned_until DESC NULLS LAST
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING phone, assigned_until
+        """, (lease, listing_id, client_phone))
+        row = cur.fetchone()
+        if row:
+            return row['phone'], row['assigned_until'], True
+
+    # Дольше всех простаивавший номер: меньше шанс, что по нему перезвонит прежний клиент
+    cur.execute(f"""
+        UPDATE virtual_numbers
+        SET is_busy = TRUE,
+            assigned_listing_id = %s,
+            assigned_client_phone = %s,
+            assigned_at = NOW(),
+            assigned_until = NOW() + %s::interval
+        WHERE id = (
+            SELECT id FROM virtual_numbers
+            WHERE {AVAILABLE_CONDITION}
+            ORDER BY assigned_until NULLS FIRST, id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING phone, assigned_until
+    """, (listing_id, client_phone, lease))
+    row = cur.fetchone()
+    if row:
+        return row['phone'], row['assigned_until'], False
+    return None
+
+
+def pool_metrics(cur, days: int = 7) -> dict:
+    '''Состояние пула и выдачи по дням: показы, прямые номера из-за исчерпания, пиковая занятость'''
+    cur.execute(f"""
+        SELECT
+            COUNT(*) FILTER (WHERE is_active IS NOT FALSE) AS active,
+            COUNT(*) FILTER (WHERE is_active IS NOT FALSE AND is_busy = TRUE AND assigned_until >= NOW()) AS leased,
+            COUNT(*) FILTER (WHERE {AVAILABLE_CONDITION}) AS available
+        FROM virtual_numbers
+    """)
+    pool = dict(cur.fetchone())
+
+    cur.execute("""
+        SELECT shown_at::date AS date,
+               COUNT(*) AS requests,
+               COUNT(*) FILTER (WHERE virtual_number = %s) AS exhausted,
+               COUNT(called_at) AS calls
+        FROM call_tracking
+        WHERE shown_at >= CURRENT_DATE - %s
+        GROUP BY 1
+        ORDER BY 1 DESC
+    """, (DIRECT_NUMBER, days))
+    daily = []
+    for row in cur.fetchall():
+        item = dict(row)
+        item['date'] = item['date'].isoformat()
+        item['exhausted_rate'] = round(item['exhausted'] / item['requests'] * 100, 1) if item['requests'] else 0
+        daily.append(item)
+
+    # Пиковое число одновременных аренд за период — ориентир для размера пула
+    cur.execute("""
+        SELECT COALESCE(MAX(concurrent), 0) AS peak_leased
+        FROM (
+            SELECT SUM(delta) OVER (ORDER BY at, delta ROWS UNBOUNDED PRECEDING) AS concurrent
+            FROM (
+                SELECT shown_at AS at, 1 AS delta FROM call_tracking
+                WHERE shown_at >= CURRENT_DATE - %s AND virtual_number <> %s
+                UNION ALL
+                SELECT expires_at, -1 FROM call_tracking
+                WHERE shown_at >= CURRENT_DATE - %s AND virtual_number <> %s AND expires_at IS NOT NULL
+            ) events
+        ) running
+    """, (days, DIRECT_NUMBER, days, DIRECT_NUMBER))
+    pool['peak_leased'] = cur.fetchone()['peak_leased']
+
+    return {'pool': pool, 'daily': daily}
@@ -1,8 +1,10 @@
 """API для бухгалтерии - управление заявками на вывод средств"""
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 def handler(event: dict, context) -> dict:
     """Управление заявками на вывод: просмотр, обработка, история"""
@@ -21,7 +23,7 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = get_db_connection()
         
         # GET - получить список заявок и историю
         if method == 'GET':
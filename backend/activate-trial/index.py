@@ -1,7 +1,11 @@
 import json
 import os
-import psycopg2
 from datetime import datetime, timedelta
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.inbox import record_owner_message
+from _common.subscription_events import schedule_expiry
 
 def send_manager_notification(cur, owner_id: int, listing_id: int, owner_name: str, listing_title: str, new_expiry: str, days: int) -> None:
     '''Отправляет уведомление менеджеру в систему сообщений'''
@@ -30,7 +34,9 @@ def send_manager_notification(cur, owner_id: int, listing_id: int, owner_name: s
             INSERT INTO owner_manager_messages 
             (owner_id, manager_id, listing_id, sender_type, message)
             VALUES (%s, %s, %s, 'system', %s)
+            RETURNING id
         ''', (owner_id, manager_id, listing_id, message))
+        record_owner_message(cur, cur.fetchone()[0], owner_id, manager_id, 'system')
     except Exception as e:
         print(f'Manager notification error: {e}')
 
@@ -63,7 +69,7 @@ def handler(event: dict, context) -> dict:
         }
     
     dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_db_connection(dsn)
     cur = conn.cursor()
     
     try:
@@ -205,6 +211,8 @@ def handler(event: dict, context) -> dict:
             days_text = 'день' if days == 1 else 'дня' if days < 5 else 'дней'
             message = f'Пробная подписка активирована на {days} {days_text} до {new_expiry.strftime("%d.%m.%Y")}'
         
+        schedule_expiry(cur, [listing_id])
+        
         # Отмечаем, что владелец активировал пробную подписку
         cur.execute(f'''
             UPDATE {schema}.owners 
@@ -1,9 +1,11 @@
 import json
 import os
 import jwt
-import psycopg2
 import hashlib
 from datetime import datetime, timedelta
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 # Admin authentication handler
 def handler(event: dict, context) -> dict:
@@ -55,7 +57,7 @@ def handler(event: dict, context) -> dict:
         conn = None
         cur = None
         try:
-            conn = psycopg2.connect(os.environ['DATABASE_URL'])
+            conn = get_db_connection()
             cur = conn.cursor()
             
             # Хеширование пароля для проверки
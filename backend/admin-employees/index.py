@@ -1,10 +1,12 @@
 import json
 import os
 import jwt
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
 import hashlib
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 def handler(event: dict, context) -> dict:
     '''API для управления сотрудниками (админами) - просмотр, создание, редактирование, удаление'''
@@ -36,7 +38,7 @@ def handler(event: dict, context) -> dict:
         }
     
     dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_db_connection(dsn)
     
     try:
         # Верификация JWT токена
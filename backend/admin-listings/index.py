@@ -1,8 +1,15 @@
 import json
 import os
 import jwt
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.catalog import invalidate_catalog
+from _common.manager_dashboard import refresh_dashboards
+from _common.listing_rooms import save_rooms, save_metro_stations
+from _common.auction_ranks import move_listing
+from _common.subscription_events import schedule_expiry
 
 # Admin listings management
 def verify_token(token: str) -> dict:
@@ -46,7 +53,7 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = get_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         # GET - получение списка объектов ИЛИ одного объекта
@@ -225,7 +232,7 @@ def handler(event: dict, context) -> dict:
                            submitted_for_moderation, created_by_owner
                     FROM t_p39732784_hourly_rentals_platf.listings 
                     WHERE {active_where}
-                    ORDER BY auction ASC 
+                    ORDER BY auction_rank ASC 
                     LIMIT {limit} OFFSET {offset}""")
             
             try:
@@ -365,27 +372,16 @@ def handler(event: dict, context) -> dict:
             new_listing = cur.fetchone()
             listing_id = new_listing['id']
             
-            # Добавление станций метро
+            # Новый объект встаёт в конец города; явно заданная позиция — среди соседей
+            if body.get('auction') not in (None, 999):
+                move_listing(cur, listing_id, body['auction'])
+            
+            # Станции метро и номера — пакетной вставкой
             if 'metro_stations' in body and body['metro_stations']:
-                for station in body['metro_stations']:
-                    cur.execute(
-                        "INSERT INTO t_p39732784_hourly_rentals_platf.metro_stations (listing_id, station_name, walk_minutes) VALUES (%s, %s, %s)",
-                        (listing_id, station['station_name'], station['walk_minutes'])
-                    )
+                save_metro_stations(cur, listing_id, body['metro_stations'])
             
-            # Удаление старых комнат и добавление новых
             if 'rooms' in body:
-                cur.execute("DELETE FROM t_p39732784_hourly_rentals_platf.rooms WHERE listing_id = %s", (listing_id,))
-                for room in body['rooms']:
-                    cur.execute("""
-                        INSERT INTO t_p39732784_hourly_rentals_platf.rooms (listing_id, type, price, description, images, 
-                                         square_meters, features, min_hours, payment_methods, cancellation_policy)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (listing_id, room['type'], room['price'], 
-                          room.get('description'), room.get('images', []),
-                          room.get('square_meters', 0), room.get('features', []),
-                          room.get('min_hours', 1), room.get('payment_methods', 'Наличные, банковская карта при заселении'),
-                          room.get('cancellation_policy', 'Бесплатная отмена за 1 час до заселения')))
+                save_rooms(cur, listing_id, body['rooms'])
             
             # Логирование действия
             cur.execute("""
@@ -429,7 +425,9 @@ def handler(event: dict, context) -> dict:
                     bonus_amount,
                     f'Добавление: {body["type"]} в городе {body["city"]}'
                 ))
+                refresh_dashboards(cur, [admin.get('admin_id')])
             
+            invalidate_catalog(cur, listing_ids=[listing_id])
             conn.commit()
             cur.close()
             conn.close()
@@ -511,11 +509,14 @@ def handler(event: dict, context) -> dict:
                     'isBase64Encoded': False
                 }
             else:
-                # Полное обновление объекта
+                # Полное обновление объекта (старый город тоже инвалидируем)
+                invalidate_catalog(cur, listing_ids=[listing_id])
+                cur.execute("SELECT auction FROM t_p39732784_hourly_rentals_platf.listings WHERE id = %s", (listing_id,))
+                previous = cur.fetchone()
                 cur.execute("""
                     UPDATE t_p39732784_hourly_rentals_platf.listings SET 
                         title=%s, type=%s, city=%s, district=%s, price=%s, rating=%s, 
-                        reviews=%s, auction=%s, image_url=%s, metro=%s, metro_walk=%s, 
+                        reviews=%s, image_url=%s, metro=%s, metro_walk=%s, 
                         has_parking=%s, parking_type=%s, parking_price_per_hour=%s,
                         features=%s, lat=%s, lng=%s, min_hours=%s, 
                         phone=%s, telegram=%s, logo_url=%s, is_archived=%s,
@@ -529,7 +530,7 @@ def handler(event: dict, context) -> dict:
                     body['city'].strip() if isinstance(body.get('city'), str) else body['city'],
                     body['district'].strip() if isinstance(body.get('district'), str) else body['district'],
                     body['price'], body.get('rating', 0), body.get('reviews', 0),
-                    body.get('auction', 999), body.get('image_url'), body.get('metro'),
+                    body.get('image_url'), body.get('metro'),
                     body.get('metro_walk', 0), body.get('has_parking', False),
                     body.get('parking_type', 'none'), body.get('parking_price_per_hour', 0),
                     body.get('features', []), body.get('lat'), body.get('lng'),
@@ -541,29 +542,23 @@ def handler(event: dict, context) -> dict:
             
             updated_listing = cur.fetchone()
             
-            # Обновление станций метро
+            # Позиция пишется только перестановкой: auction и auction_rank меняются вместе
+            if previous and body.get('auction') not in (None, 999, previous['auction']):
+                move_listing(cur, listing_id, body['auction'])
+            
+            # is_archived мог измениться: объекту вне архива нужны события подписки
+            schedule_expiry(cur, [listing_id])
+            
+            # Станции метро и номера сохраняются разницей: неизменённые строки
+            # не трогаются, id номеров сохраняются
             if 'metro_stations' in body:
-                cur.execute("DELETE FROM t_p39732784_hourly_rentals_platf.metro_stations WHERE listing_id = %s", (listing_id,))
-                for station in body['metro_stations']:
-                    cur.execute(
-                        "INSERT INTO t_p39732784_hourly_rentals_platf.metro_stations (listing_id, station_name, walk_minutes) VALUES (%s, %s, %s)",
-                        (listing_id, station['station_name'], station['walk_minutes'])
-                    )
+                save_metro_stations(cur, listing_id, body['metro_stations'])
             
-            # Обновление комнат
             if 'rooms' in body:
-                cur.execute("DELETE FROM t_p39732784_hourly_rentals_platf.rooms WHERE listing_id = %s", (listing_id,))
-                for room in body['rooms']:
-                    cur.execute("""
-                        INSERT INTO t_p39732784_hourly_rentals_platf.rooms (listing_id, type, price, description, images, 
-                                         square_meters, features, min_hours, payment_methods, cancellation_policy)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (listing_id, room['type'], room['price'], 
-                          room.get('description'), room.get('images', []),
-                          room.get('square_meters', 0), room.get('features', []),
-                          room.get('min_hours', 1), room.get('payment_methods', 'Наличные, банковская карта при заселении'),
-                          room.get('cancellation_policy', 'Бесплатная отмена за 1 час до заселения')))
+                changes = save_rooms(cur, listing_id, body['rooms'])
+                print(f'Rooms saved: {changes}')
             
+            invalidate_catalog(cur, listing_ids=[listing_id])
             conn.commit()
             cur.close()
             conn.close()
@@ -611,6 +606,7 @@ def handler(event: dict, context) -> dict:
                 """, (listing_id,))
                 
                 result = cur.fetchone()
+                invalidate_catalog(cur, listing_ids=[listing_id])
                 conn.commit()
                 
                 return {
@@ -654,6 +650,7 @@ def handler(event: dict, context) -> dict:
                 """, (listing_id,))
                 
                 result = cur.fetchone()
+                invalidate_catalog(cur, listing_ids=[listing_id])
                 conn.commit()
                 
                 return {
@@ -759,6 +756,9 @@ def handler(event: dict, context) -> dict:
                 """, (moderation_status, moderation_comment, admin.get('admin_id'), is_archived, listing_id))
                 
                 result = cur.fetchone()
+                # Одобренный объект выходит из архива — события подписки под его срок
+                schedule_expiry(cur, [listing_id])
+                invalidate_catalog(cur, listing_ids=[listing_id])
                 conn.commit()
                 
                 return {
@@ -784,11 +784,10 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
-                # Получаем текущую позицию и город
-                cur.execute("SELECT auction, city FROM t_p39732784_hourly_rentals_platf.listings WHERE id = %s", (listing_id,))
-                listing = cur.fetchone()
+                # Перестановка меняет одну строку: ранг между новыми соседями
+                moved = move_listing(cur, listing_id, new_position)
                 
-                if not listing:
+                if not moved:
                     return {
                         'statusCode': 404,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -796,49 +795,15 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
-                old_position = listing['auction']
-                city = listing['city']
+                old_position = moved['old_position']
                 
-                # Если позиция не изменилась
-                if old_position == new_position:
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'success': True, 'message': 'Позиция не изменилась'}),
-                        'isBase64Encoded': False
-                    }
-                
-                # Обновляем позиции в городе
-                if old_position < new_position:
-                    # Перемещение вниз: сдвигаем вверх объекты между old и new
-                    cur.execute("""
-                        UPDATE t_p39732784_hourly_rentals_platf.listings 
-                        SET auction = auction - 1
-                        WHERE city = %s 
-                          AND auction > %s 
-                          AND auction <= %s
-                          AND id != %s
-                    """, (city, old_position, new_position, listing_id))
-                else:
-                    # Перемещение вверх: сдвигаем вниз объекты между new и old
-                    cur.execute("""
-                        UPDATE t_p39732784_hourly_rentals_platf.listings 
-                        SET auction = auction + 1
-                        WHERE city = %s 
-                          AND auction >= %s 
-                          AND auction < %s
-                          AND id != %s
-                    """, (city, new_position, old_position, listing_id))
-                
-                # Устанавливаем новую позицию
                 cur.execute("""
-                    UPDATE t_p39732784_hourly_rentals_platf.listings 
-                    SET auction = %s
+                    SELECT id, title, auction
+                    FROM t_p39732784_hourly_rentals_platf.listings
                     WHERE id = %s
-                    RETURNING id, title, auction
-                """, (new_position, listing_id))
-                
+                """, (listing_id,))
                 result = cur.fetchone()
+                invalidate_catalog(cur, cities=[moved['city']])
                 conn.commit()
                 
                 return {
@@ -846,7 +811,7 @@ def handler(event: dict, context) -> dict:
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'body': json.dumps({
                         'success': True,
-                        'message': f'Позиция изменена с #{old_position} на #{new_position}',
+                        'message': f"Позиция изменена с #{old_position} на #{moved['position']}",
                         'listing': dict(result)
                     }, default=str),
                     'isBase64Encoded': False
@@ -888,6 +853,7 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
+                invalidate_catalog(cur, listing_ids=[listing_id])
                 # Удаляем комнаты
                 cur.execute("DELETE FROM t_p39732784_hourly_rentals_platf.rooms WHERE listing_id = %s", (listing_id,))
                 # Удаляем станции метро
@@ -913,6 +879,8 @@ def handler(event: dict, context) -> dict:
             )
             
             archived_listing = cur.fetchone()
+            schedule_expiry(cur, [listing_id])
+            invalidate_catalog(cur, listing_ids=[listing_id])
             conn.commit()
             cur.close()
             conn.close()
@@ -1,9 +1,120 @@
 import json
 import os
 import jwt
-import psycopg2
 import hashlib
 from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+
+HOTELS_COUNT = '(SELECT COUNT(*) FROM listings l WHERE l.owner_id = o.id AND l.is_archived = FALSE)'
+
+# Допустимые поля сортировки каталога владельцев -> SQL-выражение
+OWNER_SORT_FIELDS = {
+    'id': 'o.id',
+    'full_name': 'o.full_name',
+    'balance': 'o.balance',
+    'bonus_balance': 'o.bonus_balance',
+    'last_login': 'o.last_login',
+    'created_at': 'o.created_at',
+    'hotels_count': HOTELS_COUNT
+}
+
+DIRECTORY_PARAMS = ('q', 'archived', 'sort', 'order', 'limit', 'offset', 'min_balance', 'max_balance')
+
+
+def list_owners(cur, params: dict) -> dict:
+    '''Владельцы вместе с их отелями одним запросом: фильтры, сортировка и страница на стороне БД'''
+    conditions = []
+    args = []
+
+    q = (params.get('q') or '').strip()
+    if q:
+        conditions.append("""(o.email ILIKE %s OR o.login ILIKE %s OR o.full_name ILIKE %s
+                              OR o.phone ILIKE %s OR o.id::text = %s)""")
+        pattern = f'%{q}%'
+        args.extend([pattern, pattern, pattern, pattern, q])
+
+    archived = params.get('archived', 'all')
+    if archived not in ('all', 'true', 'false'):
+        raise ValueError('archived должен быть all, true или false')
+    if archived != 'all':
+        conditions.append('COALESCE(o.is_archived, false) = %s')
+        args.append(archived == 'true')
+
+    for name, operator in (('min_balance', '>='), ('max_balance', '<=')):
+        if params.get(name) not in (None, ''):
+            try:
+                value = float(params[name])
+            except ValueError:
+                raise ValueError(f'Некорректный параметр {name}')
+            conditions.append(f'COALESCE(o.balance, 0) {operator} %s')
+            args.append(value)
+
+    sort = params.get('sort')
+    if sort:
+        if sort not in OWNER_SORT_FIELDS:
+            raise ValueError(f'sort должен быть одним из: {", ".join(OWNER_SORT_FIELDS)}')
+        direction = 'ASC' if params.get('order') == 'asc' else 'DESC'
+        order = f'{OWNER_SORT_FIELDS[sort]} {direction} NULLS LAST, o.id DESC'
+    else:
+        order = 'o.is_archived, o.id DESC'
+
+    limit = None
+    offset = 0
+    if params.get('limit') or params.get('offset'):
+        try:
+            limit = int(params.get('limit') or DEFAULT_PAGE_LIMIT)
+            offset = int(params.get('offset') or 0)
+        except ValueError:
+            raise ValueError('Некорректные limit/offset')
+        if limit < 1 or limit > MAX_PAGE_LIMIT or offset < 0:
+            raise ValueError(f'limit должен быть от 1 до {MAX_PAGE_LIMIT}')
+
+    where = ' AND '.join(conditions) if conditions else 'TRUE'
+
+    # Отели агрегируются только для владельцев выбранной страницы
+    cur.execute(f"""
+        WITH page AS (
+            SELECT 
+                o.id, o.email, o.login, o.full_name, o.phone, 
+                o.balance, o.bonus_balance, o.created_at, o.last_login, o.is_archived,
+                {HOTELS_COUNT} AS hotels_count,
+                COUNT(*) OVER () AS total_count,
+                ROW_NUMBER() OVER (ORDER BY {order}) AS position
+            FROM owners o
+            WHERE {where}
+            ORDER BY {order}
+            LIMIT %s OFFSET %s
+        )
+        SELECT p.*, COALESCE(h.hotels, '[]'::json) AS hotels
+        FROM page p
+        LEFT JOIN LATERAL (
+            SELECT json_agg(json_build_object('id', l.id, 'title', l.title, 'city', l.city) ORDER BY l.title) AS hotels
+            FROM listings l
+            WHERE l.owner_id = p.id AND l.is_archived = FALSE
+        ) h ON TRUE
+        ORDER BY p.position
+    """, args + [limit, offset])
+    rows = cur.fetchall()
+
+    owners = []
+    for row in rows:
+        owner = dict(row)
+        owner.pop('total_count')
+        owner.pop('position')
+        owners.append(owner)
+
+    return {
+        'owners': owners,
+        'total': rows[0]['total_count'] if rows else 0,
+        'limit': limit,
+        'offset': offset
+    }
+
 
 def verify_token(token: str) -> dict:
     '''Проверка JWT токена администратора'''
@@ -45,37 +156,28 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
         if method == 'GET':
-            cur.execute("""
-                SELECT 
-                    o.id, o.email, o.login, o.full_name, o.phone, 
-                    o.balance, o.bonus_balance, o.created_at, o.last_login, o.is_archived,
-                    COUNT(DISTINCT l.id) as hotels_count
-                FROM owners o
-                LEFT JOIN listings l ON l.owner_id = o.id AND l.is_archived = FALSE
-                GROUP BY o.id
-                ORDER BY o.is_archived, o.id DESC
-            """)
-            owners = cur.fetchall()
-            
-            # Добавляем список отелей для каждого владельца
-            for owner in owners:
-                cur.execute("""
-                    SELECT id, title, city 
-                    FROM listings 
-                    WHERE owner_id = %s AND is_archived = FALSE
-                    ORDER BY title
-                """, (owner['id'],))
-                owner['hotels'] = [dict(row) for row in cur.fetchall()]
+            params = event.get('queryStringParameters') or {}
+            try:
+                result = list_owners(cur, params)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
             
+            # Без параметров каталога — прежний формат: массив всех владельцев
+            directory = any(name in params for name in DIRECTORY_PARAMS)
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps([dict(row) for row in owners], default=str),
+                'body': json.dumps(result if directory else result['owners'], default=str),
                 'isBase64Encoded': False
             }
         
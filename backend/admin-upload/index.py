@@ -1,9 +1,11 @@
 import json
 import os
 import jwt
-import boto3
 import base64
-import uuid
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.images import get_s3, upload_image
+from _common.uploads import handle_upload_action
 
 # Photo upload handler
 def verify_token(token: str) -> dict:
@@ -18,7 +20,7 @@ def verify_token(token: str) -> dict:
         return None
 
 def handler(event: dict, context) -> dict:
-    '''API для загрузки фотографий объектов'''
+    '''API для загрузки фотографий объектов (с уменьшенными копиями WebP/AVIF и LQIP)'''
     print('=== HANDLER CALLED ===')
     print(f'Event: {json.dumps(event, default=str, ensure_ascii=False)}')
     
@@ -71,6 +73,18 @@ def handler(event: dict, context) -> dict:
     try:
         print('=== UPLOAD PHOTO START ===')
         body = json.loads(event.get('body', '{}'))
+        
+        # Прямая загрузка в хранилище: presign -> PUT/multipart с клиента -> complete
+        handled = handle_upload_action(body)
+        if handled:
+            status, payload = handled
+            return {
+                'statusCode': status,
+                'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                'body': json.dumps(payload),
+                'isBase64Encoded': False
+            }
+        
         print(f'Body keys: {list(body.keys())}')
         
         # Получаем base64 изображение
@@ -93,35 +107,21 @@ def handler(event: dict, context) -> dict:
         image_data = base64.b64decode(image_base64)
         print(f'Image size: {len(image_data)} bytes')
         
-        # Генерируем уникальное имя файла
+        # Оригинал и копии под ключами от хэша содержимого
         file_extension = content_type.split('/')[-1]
-        file_name = f"listings/{uuid.uuid4()}.{file_extension}"
-        print(f'File name: {file_name}')
-        
-        # Загружаем в S3
-        print('Uploading to S3...')
-        s3 = boto3.client('s3',
-            endpoint_url='https://bucket.poehali.dev',
-            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
-            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
-        )
-        
-        s3.put_object(
-            Bucket='files',
-            Key=file_name,
-            Body=image_data,
-            ContentType=content_type
-        )
-        print('S3 upload complete')
-        
-        # Формируем CDN URL
-        cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{file_name}"
-        print(f'CDN URL: {cdn_url}')
+        print('Uploading original and variants to S3...')
+        image = upload_image(get_s3(), image_data, file_extension)
+        print(f'CDN URL: {image["url"]}, variants: {list(image["variants"])}')
         
         response = {
             'statusCode': 200,
             'headers': {**cors_headers, 'Content-Type': 'application/json'},
-            'body': json.dumps({'url': cdn_url}),
+            'body': json.dumps({
+                'url': image['url'],
+                'variants': image['variants'],
+                'lqip': image['lqip'],
+                'duplicate': image['duplicate']
+            }),
             'isBase64Encoded': False
         }
         print(f'Response: {response}')
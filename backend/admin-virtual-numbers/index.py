@@ -1,7 +1,10 @@
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.virtual_numbers import pool_metrics
 
 
 def handler(event: dict, context) -> dict:
@@ -22,15 +25,17 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = get_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
-        # GET - список всех номеров
+        # GET - список всех номеров и метрики пула
         if method == 'GET':
+            params = event.get('queryStringParameters') or {}
+            # Истёкшая аренда не занимает номер, даже если is_busy ещё TRUE
             cur.execute("""
                 SELECT 
                     phone,
-                    is_busy,
+                    (is_busy = TRUE AND assigned_until >= NOW()) AS is_busy,
                     assigned_listing_id,
                     assigned_at,
                     assigned_until,
@@ -47,6 +52,7 @@ def handler(event: dict, context) -> dict:
                     if num.get(key):
                         num[key] = num[key].isoformat()
             
+            metrics = pool_metrics(cur, int(params.get('days', 7)))
             conn.close()
             
             return {
@@ -54,7 +60,8 @@ def handler(event: dict, context) -> dict:
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({
                     'numbers': numbers,
-                    'total': len(numbers)
+                    'total': len(numbers),
+                    'metrics': metrics
                 })
             }
         
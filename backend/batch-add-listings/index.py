@@ -1,11 +1,16 @@
 """API для массового добавления объектов в сопровождение менеджера"""
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.manager_assignments import assign_listings
 
 def handler(event: dict, context) -> dict:
-    """Массовое добавление объектов в сопровождение менеджера"""
+    """Массовое добавление объектов в сопровождение менеджера.
+    partial=true — добавить сколько влезает в лимит, иначе всё или ничего.
+    В results — исход по каждому id: added, already_yours, taken, not_found, limit"""
     method = event.get('httpMethod', 'POST')
     
     if method == 'OPTIONS':
@@ -49,19 +54,26 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        try:
+            listing_ids = [int(listing_id) for listing_id in listing_ids]
+        except (TypeError, ValueError):
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'listing_ids должны быть числами'}),
+                'isBase64Encoded': False
+            }
+        
+        conn = get_db_connection()
         conn.autocommit = False
         
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # Проверяем лимит менеджера
-                cur.execute("""
-                    SELECT object_limit FROM t_p39732784_hourly_rentals_platf.admins 
-                    WHERE id = %s
-                """, (manager_id,))
-                manager = cur.fetchone()
+                # Все объекты назначаются одним запросом; лимит проверяется под блокировкой менеджера
+                assignment = assign_listings(cur, int(manager_id), listing_ids, bool(body.get('partial')))
                 
-                if not manager:
+                if assignment is None:
+                    conn.rollback()
                     return {
                         'statusCode': 404,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -69,48 +81,20 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
-                # Проверяем текущее количество объектов
-                cur.execute("""
-                    SELECT COUNT(*) as count 
-                    FROM t_p39732784_hourly_rentals_platf.manager_listings
-                    WHERE manager_id = %s
-                """, (manager_id,))
-                current_count = cur.fetchone()['count']
-                
-                # Проверяем не превысит ли лимит
-                if current_count + len(listing_ids) > manager['object_limit']:
+                limited = sum(1 for r in assignment['results'] if r['outcome'] == 'limit')
+                if limited and not assignment['added']:
+                    conn.rollback()
+                    free = assignment['object_limit'] - assignment['current_count']
                     return {
                         'statusCode': 400,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                         'body': json.dumps({
-                            'error': f'Превышен лимит объектов. Текущий: {current_count}, Лимит: {manager["object_limit"]}, Пытаетесь добавить: {len(listing_ids)}'
+                            'error': f'Превышен лимит объектов. Текущий: {assignment["current_count"]}, Лимит: {assignment["object_limit"]}, Свободно: {max(free, 0)}, Пытаетесь добавить: {limited}',
+                            'results': assignment['results']
                         }),
                         'isBase64Encoded': False
                     }
                 
-                # Добавляем объекты
-                added_count = 0
-                skipped_count = 0
-                
-                for listing_id in listing_ids:
-                    # Проверяем что объект не занят
-                    cur.execute("""
-                        SELECT id FROM t_p39732784_hourly_rentals_platf.manager_listings
-                        WHERE listing_id = %s
-                    """, (listing_id,))
-                    
-                    if cur.fetchone():
-                        skipped_count += 1
-                        continue
-                    
-                    # Добавляем объект
-                    cur.execute("""
-                        INSERT INTO t_p39732784_hourly_rentals_platf.manager_listings 
-                            (manager_id, listing_id)
-                        VALUES (%s, %s)
-                    """, (manager_id, listing_id))
-                    added_count += 1
-                
                 conn.commit()
                 
                 return {
@@ -118,9 +102,10 @@ def handler(event: dict, context) -> dict:
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'body': json.dumps({
                         'success': True,
-                        'added': added_count,
-                        'skipped': skipped_count,
-                        'total_now': current_count + added_count
+                        'added': assignment['added'],
+                        'skipped': assignment['skipped'],
+                        'total_now': assignment['current_count'],
+                        'results': assignment['results']
                     }),
                     'isBase64Encoded': False
                 }
@@ -1,7 +1,9 @@
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 UNLOCK_TIERS = {
     10: 10000,   # до 10 квартир — 10 000₽
@@ -27,7 +29,7 @@ def handler(event: dict, context) -> dict:
         }
 
     schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
@@ -1,13 +1,19 @@
 import json
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import transaction
+from _common.subscription_events import dispatch_due, reconcile_expiry, schedule_dispatch
+
+# Сколько времени запуск обрабатывает пачки; остаток доделает job-worker
+DISPATCH_RUN_SECONDS = 25
 
 def handler(event: dict, context) -> dict:
-    '''Автоматическая архивация объектов с истекшей подпиской.
-    Если объект не привязан к менеджеру — подписка продлевается на 30 дней автоматически.
-    Если привязан к менеджеру — объект архивируется.'''
+    '''Диспетчер событий подписки: срабатывают наступившие «осталось 3 дня»,
+    «остался 1 день» и «истекла» (см. _common/subscription_events.py).
+    По «истекла» объект без менеджера продлевается на 30 дней автоматически,
+    привязанный к менеджеру — архивируется. Переходы пишутся в
+    listing_lifecycle_events, уведомления отправляет job-worker.'''
     
     method = event.get('httpMethod', 'GET')
     
@@ -23,79 +29,32 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
     try:
-        # Найти все объекты с истекшей подпиской
-        cur.execute("""
-            SELECT 
-                l.id, 
-                l.title, 
-                l.subscription_expires_at,
-                ml.manager_id
-            FROM listings l
-            LEFT JOIN manager_listings ml ON ml.listing_id = l.id
-            WHERE l.is_archived = FALSE 
-            AND l.subscription_expires_at IS NOT NULL
-            AND l.subscription_expires_at < NOW()
-        """)
-        
-        expired_listings = cur.fetchall()
-        
-        if not expired_listings:
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': True,
-                    'message': 'Нет объектов с истекшей подпиской',
-                    'archived_count': 0,
-                    'renewed_count': 0
-                }),
-                'isBase64Encoded': False
-            }
-        
-        # Разделить на две группы
-        to_archive = [l for l in expired_listings if l['manager_id'] is not None]
-        to_renew = [l for l in expired_listings if l['manager_id'] is None]
-        
-        archived_titles = []
-        renewed_titles = []
+        # Объекты, снятые с архива без schedule_expiry, получают события до диспетчера
+        with transaction() as conn:
+            rescheduled = reconcile_expiry(conn.cursor())
+        if rescheduled:
+            print(f'[SUBSCRIPTION] Events rescheduled for {rescheduled} listings')
+
+        result = dispatch_due(DISPATCH_RUN_SECONDS)
+        if result['has_more']:
+            with transaction() as conn:
+                schedule_dispatch(conn.cursor())
 
-        # Архивировать объекты с менеджером
-        if to_archive:
-            archive_ids = [l['id'] for l in to_archive]
-            cur.execute("""
-                UPDATE listings 
-                SET is_archived = TRUE
-                WHERE id = ANY(%s)
-            """, (archive_ids,))
-            archived_titles = [l['title'] for l in to_archive]
-        
-        # Продлить подписку на 30 дней для объектов без менеджера
-        if to_renew:
-            renew_ids = [l['id'] for l in to_renew]
-            cur.execute("""
-                UPDATE listings 
-                SET subscription_expires_at = NOW() + INTERVAL '30 days'
-                WHERE id = ANY(%s)
-            """, (renew_ids,))
-            renewed_titles = [l['title'] for l in to_renew]
-        
-        conn.commit()
-        
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({
                 'success': True,
-                'message': f'Архивировано: {len(to_archive)}, продлено: {len(to_renew)}',
-                'archived_count': len(to_archive),
-                'archived_listings': archived_titles,
-                'renewed_count': len(to_renew),
-                'renewed_listings': renewed_titles
-            }, default=str),
+                'message': f"Архивировано: {result['archived']}, продлено: {result['renewed']}",
+                'archived_count': result['archived'],
+                'renewed_count': result['renewed'],
+                'reminders_count': result['reminders'],
+                'events_fired': result['fired'],
+                'rescheduled_count': rescheduled,
+                'batches': result['batches'],
+                'has_more': result['has_more']
+            }),
             'isBase64Encoded': False
         }
     
@@ -109,6 +68,3 @@ def handler(event: dict, context) -> dict:
             'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
         }
-    finally:
-        cur.close()
-        conn.close()
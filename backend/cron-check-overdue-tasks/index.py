@@ -1,8 +1,11 @@
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.inbox import record_employee_message
 
 
 def handler(event: dict, context) -> dict:
@@ -24,7 +27,7 @@ def handler(event: dict, context) -> dict:
     
     try:
         dsn = os.environ['DATABASE_URL']
-        conn = psycopg2.connect(dsn)
+        conn = get_db_connection(dsn)
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         now = datetime.now()
@@ -67,7 +70,9 @@ def handler(event: dict, context) -> dict:
                 INSERT INTO t_p39732784_hourly_rentals_platf.employee_messages 
                 (sender_id, recipient_id, message, related_task_id, message_type, created_at)
                 VALUES (%s, %s, %s, %s, %s, NOW())
+                RETURNING id
             """, (task['manager_id'], task['om_id'], message, task['id'], 'task_overdue_notification'))
+            record_employee_message(cur, cur.fetchone()['id'], task['manager_id'], task['om_id'])
             
             notifications_sent += 1
         
@@ -1,10 +1,15 @@
 import json
 import os
-from datetime import datetime, timedelta, timezone
-import random
+import sys
+from datetime import datetime, timezone
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import transaction
+from _common.promotion_rotation import rotate_promotions
 
 def handler(event: dict, context) -> dict:
-    '''Ежедневная ротация позиций для пакетов продвижения'''
+    '''Ежедневная ротация позиций для пакетов продвижения и броней ТОП-20.
+    Вызывается по расписанию раз в сутки; повторный вызов в тот же день
+    даёт ту же раскладку'''
     
     method = event.get('httpMethod', 'GET')
     
@@ -39,14 +44,20 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
+    now = datetime.now(timezone.utc)
+    with transaction() as conn:
+        result = rotate_promotions(conn.cursor(), now.date())
+
     return {
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
         'body': json.dumps({
             'success': True,
-            'rotated': 0,
-            'timestamp': datetime.now(timezone.utc).isoformat(),
-            'note': 'Rotation logic will be added via database trigger'
+            'rotated': result['promoted'],
+            'cities': result['cities'],
+            'updated': result['updated'],
+            'date': now.date().isoformat(),
+            'timestamp': now.isoformat()
         }),
         'isBase64Encoded': False
     }
@@ -1,9 +1,11 @@
 import json
 import os
 import jwt
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 def verify_token(token: str) -> dict:
     '''Проверка JWT токена администратора'''
@@ -45,7 +47,7 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
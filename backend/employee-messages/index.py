@@ -1,12 +1,77 @@
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.inbox import page_params, keyset, page_result, record_employee_message, mark_employee_read, employee_unread
+from _common.message_feed import EMPLOYEE_CHANNEL, wait_seconds, wait_for_messages
+
+MESSAGES_TABLE = 't_p39732784_hourly_rentals_platf.employee_messages'
+
+
+def fetch_messages(cur, admin_id: int, peer_id, page: dict) -> dict:
+    '''Страница сообщений сотрудника (новые первыми).
+    Входящие и исходящие выбираются отдельно по своим индексам и сливаются:
+    OR по sender_id/recipient_id заставил бы читать всю переписку'''
+    cursor_sql, cursor_params, order = keyset(MESSAGES_TABLE, 'em', page)
+    incoming_peer = 'AND em.sender_id = %s' if peer_id else ''
+    outgoing_peer = 'AND em.recipient_id = %s' if peer_id else ''
+    peer_params = [peer_id] if peer_id else []
+    
+    cur.execute(f"""
+        WITH page AS (
+            (SELECT em.id, em.created_at
+             FROM {MESSAGES_TABLE} em
+             WHERE em.recipient_id = %s {incoming_peer} {cursor_sql}
+             ORDER BY em.created_at {order}, em.id {order}
+             LIMIT %s)
+            UNION ALL
+            (SELECT em.id, em.created_at
+             FROM {MESSAGES_TABLE} em
+             WHERE em.sender_id = %s AND em.recipient_id <> %s {outgoing_peer} {cursor_sql}
+             ORDER BY em.created_at {order}, em.id {order}
+             LIMIT %s)
+            ORDER BY created_at {order}, id {order}
+            LIMIT %s
+        )
+        SELECT 
+            em.id,
+            em.sender_id,
+            em.recipient_id,
+            em.recipient_id = %s as is_incoming,
+            em.message,
+            em.attachments,
+            em.is_read,
+            em.related_task_id,
+            em.message_type,
+            em.created_at,
+            sender.full_name as sender_name,
+            sender.role as sender_role,
+            recipient.full_name as recipient_name,
+            recipient.role as recipient_role
+        FROM page
+        JOIN {MESSAGES_TABLE} em ON em.id = page.id
+        LEFT JOIN t_p39732784_hourly_rentals_platf.admins sender ON em.sender_id = sender.id
+        LEFT JOIN t_p39732784_hourly_rentals_platf.admins recipient ON em.recipient_id = recipient.id
+        ORDER BY em.created_at {order}, em.id {order}
+    """, [admin_id] + peer_params + cursor_params + [page['limit'] + 1,
+          admin_id, admin_id] + peer_params + cursor_params + [page['limit'] + 1,
+          page['limit'] + 1, admin_id])
+    
+    result = page_result([dict(row) for row in cur.fetchall()], page, order, newest_first=True)
+    for msg in result['items']:
+        if msg['created_at']:
+            msg['created_at'] = msg['created_at'].isoformat()
+    return result
 
 
 def handler(event: dict, context) -> dict:
-    '''Управление сообщениями между сотрудниками (менеджер, ОМ, УМ, суперадмин)'''
+    '''Управление сообщениями между сотрудниками (менеджер, ОМ, УМ, суперадмин).
+    GET ?admin_id=&peer_id=&before=|after=&limit= — страница сообщений (новые первыми) и счётчик непрочитанных;
+    GET ?admin_id=&after=<id>&wait=25 — дождаться новых сообщений (long-poll);
+    PUT {admin_id, peer_id?} — отметить входящие прочитанными'''
     
     method = event.get('httpMethod', 'GET')
     
@@ -15,7 +80,7 @@ def handler(event: dict, context) -> dict:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
                 'Access-Control-Allow-Headers': 'Content-Type',
                 'Access-Control-Max-Age': '86400'
             },
@@ -25,11 +90,12 @@ def handler(event: dict, context) -> dict:
     
     try:
         dsn = os.environ['DATABASE_URL']
-        conn = psycopg2.connect(dsn)
+        conn = get_db_connection(dsn)
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'GET':
-            admin_id = event.get('queryStringParameters', {}).get('admin_id')
+            params = event.get('queryStringParameters') or {}
+            admin_id = params.get('admin_id')
             
             if not admin_id:
                 cur.close()
@@ -41,31 +107,40 @@ def handler(event: dict, context) -> dict:
                     'isBase64Encoded': False
                 }
             
-            cur.execute("""
-                SELECT 
-                    em.id,
-                    em.message,
-                    em.attachments,
-                    em.is_read,
-                    em.related_task_id,
-                    em.message_type,
-                    em.created_at,
-                    sender.full_name as sender_name,
-                    sender.role as sender_role,
-                    recipient.full_name as recipient_name,
-                    recipient.role as recipient_role
-                FROM t_p39732784_hourly_rentals_platf.employee_messages em
-                LEFT JOIN t_p39732784_hourly_rentals_platf.admins sender ON em.sender_id = sender.id
-                LEFT JOIN t_p39732784_hourly_rentals_platf.admins recipient ON em.recipient_id = recipient.id
-                WHERE em.sender_id = %s OR em.recipient_id = %s
-                ORDER BY em.created_at DESC
-            """, (admin_id, admin_id))
+            try:
+                page = page_params(params)
+                wait = wait_seconds(params)
+                peer_id = int(params['peer_id']) if params.get('peer_id') else None
+                admin_id = int(admin_id)
+            except ValueError as e:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
             
-            messages = [dict(row) for row in cur.fetchall()]
+            if page['after'] and wait:
+                # Новые сообщения длинным опросом: ответ придёт, как только кто-то напишет.
+                # На время ожидания соединение запроса возвращается в пул — слушает одно
+                cur.close()
+                conn.close()
+                result = wait_for_messages(
+                    EMPLOYEE_CHANNEL,
+                    lambda ids: admin_id in ids[:2] and (not peer_id or peer_id in ids[:2]),
+                    lambda feed_conn: fetch_messages(feed_conn.cursor(cursor_factory=RealDictCursor),
+                                                     admin_id, peer_id, page),
+                    wait
+                )
+                conn = get_db_connection(dsn)
+                cur = conn.cursor(cursor_factory=RealDictCursor)
+            else:
+                result = fetch_messages(cur, admin_id, peer_id, page)
+            messages = result['items']
             
-            for msg in messages:
-                if msg['created_at']:
-                    msg['created_at'] = msg['created_at'].isoformat()
+            unread_count = employee_unread(cur, admin_id)
             
             cur.close()
             conn.close()
@@ -73,7 +148,13 @@ def handler(event: dict, context) -> dict:
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'messages': messages}),
+                'body': json.dumps({
+                    'messages': messages,
+                    'has_more': result['has_more'],
+                    'before': result['before'],
+                    'after': result['after'],
+                    'unread_count': unread_count
+                }),
                 'isBase64Encoded': False
             }
         
@@ -105,6 +186,7 @@ def handler(event: dict, context) -> dict:
             """, (sender_id, recipient_id, message, json.dumps(attachments), related_task_id, message_type))
             
             message_id = cur.fetchone()['id']
+            record_employee_message(cur, message_id, int(sender_id), int(recipient_id))
             
             conn.commit()
             cur.close()
@@ -121,6 +203,34 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
         
+        elif method == 'PUT':
+            # Отметить входящие прочитанными: от одного собеседника (peer_id) или все
+            body = json.loads(event.get('body') or '{}')
+            admin_id = body.get('admin_id')
+            
+            if not admin_id:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'admin_id is required'}),
+                    'isBase64Encoded': False
+                }
+            
+            peer_id = body.get('peer_id')
+            marked = mark_employee_read(cur, int(admin_id), int(peer_id) if peer_id else None)
+            conn.commit()
+            cur.close()
+            conn.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': True, 'marked': marked}),
+                'isBase64Encoded': False
+            }
+        
         else:
             cur.close()
             conn.close()
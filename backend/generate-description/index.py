@@ -1,46 +1,17 @@
 import json
 import os
-import psycopg2
-import urllib.request
 from psycopg2.extras import RealDictCursor
-
-
-def call_yandex_gpt(prompt: str) -> str:
-    api_key = os.environ.get('YANDEX_GPT_API_KEY', '')
-    folder_id = os.environ.get('YANDEX_FOLDER_ID', '')
-    if not api_key or not folder_id:
-        raise ValueError('YANDEX_GPT_API_KEY or YANDEX_FOLDER_ID not configured')
-
-    payload = json.dumps({
-        "modelUri": f"gpt://{folder_id}/yandexgpt-lite",
-        "completionOptions": {"stream": False, "temperature": 0.7, "maxTokens": 1000},
-        "messages": [
-            {"role": "system", "text": "Ты — копирайтер для сайта почасовой аренды номеров. Пиши живо, без воды, по делу. Без приветствий и заголовков. Только текст описания."},
-            {"role": "user", "text": prompt}
-        ]
-    }).encode('utf-8')
-
-    req = urllib.request.Request(
-        'https://llm.api.cloud.yandex.net/foundationModels/v1/completion',
-        data=payload,
-        headers={
-            'Content-Type': 'application/json',
-            'Authorization': f'Api-Key {api_key}',
-            'x-folder-id': folder_id
-        }
-    )
-    try:
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            result = json.loads(resp.read().decode('utf-8'))
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8') if e.fp else ''
-        print(f"YandexGPT HTTP {e.code}: {error_body}")
-        raise ValueError(f"YandexGPT API error {e.code}: {error_body}")
-    return result['result']['alternatives'][0]['message']['text'].strip()
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.jobs import enqueue, get_job
+from _common.job_tasks import LISTING_DESCRIPTION
 
 
 def handler(event: dict, context) -> dict:
-    """Генерация описания объекта через AI на основе данных и фото"""
+    """Генерация описания объекта через AI на основе данных и фото.
+    POST {listing_id} — поставить генерацию в очередь (202, job_id);
+    GET ?job_id= — статус, в result.description — готовый текст"""
 
     method = event.get('httpMethod', 'GET')
 
@@ -49,13 +20,35 @@ def handler(event: dict, context) -> dict:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
                 'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Authorization'
             },
             'body': '',
             'isBase64Encoded': False
         }
 
+    if method == 'GET':
+        params = event.get('queryStringParameters') or {}
+        job_id = params.get('job_id') or ''
+        if not job_id.isdigit():
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'job_id is required'}),
+                'isBase64Encoded': False
+            }
+        conn = get_db_connection()
+        try:
+            job = get_job(conn.cursor(cursor_factory=RealDictCursor), int(job_id), LISTING_DESCRIPTION)
+        finally:
+            conn.close()
+        return {
+            'statusCode': 200 if job else 404,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(job if job else {'error': 'Job not found'}, default=str),
+            'isBase64Encoded': False
+        }
+
     if method != 'POST':
         return {
             'statusCode': 405,
@@ -90,12 +83,11 @@ def handler(event: dict, context) -> dict:
     try:
         dsn = os.environ.get('DATABASE_URL')
         schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
-        conn = psycopg2.connect(dsn)
+        conn = get_db_connection(dsn)
         cur = conn.cursor(cursor_factory=RealDictCursor)
 
         cur.execute(f"""
-            SELECT id, title, type, city, district, address, metro, 
-                   has_parking, parking_type, image_url, description
+            SELECT id
             FROM {schema}.listings
             WHERE id = %s
         """, (listing_id,))
@@ -111,95 +103,19 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
 
-        cur.execute(f"""
-            SELECT type, price, square_meters, min_hours, features
-            FROM {schema}.rooms
-            WHERE listing_id = %s
-            ORDER BY id
-        """, (listing_id,))
-        rooms = cur.fetchall()
-
-        cur.execute(f"""
-            SELECT station_name, walk_minutes
-            FROM {schema}.metro_stations
-            WHERE listing_id = %s
-        """, (listing_id,))
-        metro_stations = cur.fetchall()
-
+        # YandexGPT отвечает до 30 секунд — генерацию выполняет job-worker.
+        # Повторный запрос, пока генерация не завершена, вернёт ту же задачу
+        job = enqueue(cur, LISTING_DESCRIPTION, {'listing_id': listing['id']},
+                      idempotency_key=f"{LISTING_DESCRIPTION}:{listing['id']}")
+        conn.commit()
         cur.close()
         conn.close()
         conn = None
 
-        print(f"DB DONE: listing_found={listing is not None}, rooms_count={len(rooms)}, metro_count={len(metro_stations)}")
-        parts = []
-        parts.append(f"Название: {listing['title']}")
-        if listing.get('type'):
-            parts.append(f"Тип: {listing['type']}")
-        parts.append(f"Город: {listing['city']}")
-        if listing.get('district'):
-            parts.append(f"Район: {listing['district']}")
-        if listing.get('address'):
-            parts.append(f"Адрес: {listing['address']}")
-
-        if metro_stations:
-            metro_info = ', '.join([f"{m['station_name']} ({m['walk_minutes']} мин пешком)" for m in metro_stations])
-            parts.append(f"Метро: {metro_info}")
-        elif listing.get('metro'):
-            parts.append(f"Метро: {listing['metro']}")
-
-        if listing.get('has_parking'):
-            parking_desc = {'free': 'бесплатная', 'paid': 'платная', 'street': 'стихийная', 'spontaneous': 'стихийная'}
-            p_type = parking_desc.get(listing.get('parking_type', ''), listing.get('parking_type', ''))
-            parts.append(f"Парковка: {p_type}")
-
-        if rooms:
-            parts.append(f"\nКатегории номеров ({len(rooms)}):")
-            for r in rooms:
-                room_info = f"- {r['type']}"
-                if r.get('price'):
-                    room_info += f", от {r['price']}₽"
-                if r.get('square_meters'):
-                    room_info += f", {r['square_meters']} м²"
-                if r.get('min_hours'):
-                    room_info += f", мин. {r['min_hours']}ч"
-                if r.get('features'):
-                    feats = r['features'] if isinstance(r['features'], list) else []
-                    if feats:
-                        room_info += f" ({', '.join(feats[:8])})"
-                parts.append(room_info)
-
-        images = []
-        if listing.get('image_url'):
-            try:
-                parsed = json.loads(listing['image_url']) if isinstance(listing['image_url'], str) else listing['image_url']
-                if isinstance(parsed, list):
-                    images = parsed[:3]
-                else:
-                    images = [str(listing['image_url'])]
-            except (json.JSONDecodeError, TypeError):
-                images = [str(listing['image_url'])]
-
-        if images:
-            parts.append(f"\nФото объекта: {len(images)} шт.")
-
-        listing_info = '\n'.join(parts)
-
-        prompt = f"""Напиши привлекательное описание для объекта почасовой аренды. 
-Описание должно быть 3-5 абзацев, без заголовков. Упомяни ключевые преимущества: расположение, удобства номеров, особенности.
-Пиши от третьего лица. Не придумывай то, чего нет в данных. Если информации мало — сделай акцент на том что есть.
-
-Данные объекта:
-{listing_info}"""
-
-        if images:
-            prompt += f"\n\nОбъект имеет {len(images)} фотографий — упомяни что можно оценить обстановку по фото."
-
-        description = call_yandex_gpt(prompt)
-
         return {
-            'statusCode': 200,
+            'statusCode': 202,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'description': description}),
+            'body': json.dumps({'job_id': job['id'], 'status': job['status']}),
             'isBase64Encoded': False
         }
 
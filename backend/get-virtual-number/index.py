@@ -1,10 +1,13 @@
 import json
 import os
-from datetime import datetime, timedelta
-import psycopg2
+from datetime import datetime
 from psycopg2.extras import RealDictCursor
 import urllib.request
 import urllib.parse
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.virtual_numbers import LEASE_MINUTES, DIRECT_NUMBER, claim_number
 
 
 def setup_mts_forwarding(api_key: str, virtual_number: str, target_phone: str, expires_at: datetime) -> bool:
@@ -24,8 +27,9 @@ def setup_mts_forwarding(api_key: str, virtual_number: str, target_phone: str, e
 def handler(event: dict, context) -> dict:
     """
     Выдаёт виртуальный номер из пула для звонка по объекту.
-    Привязывает номер к объекту на 5 минут.
-    Если все подменные номера заняты — возвращает прямой номер владельца.
+    Привязывает номер к объекту на 5 минут; тому же клиенту по тому же объекту
+    продлевает прежний номер. Если все подменные номера заняты — возвращает
+    прямой номер владельца (учитывается в метриках пула admin-virtual-numbers).
     """
     method = event.get('httpMethod', 'POST')
     
@@ -80,7 +84,7 @@ def handler(event: dict, context) -> dict:
     
     try:
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = get_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         # Получаем реальный номер владельца объекта
@@ -96,34 +100,16 @@ def handler(event: dict, context) -> dict:
         
         owner_phone = owner_data['phone']
         
-        # Освобождаем истёкшие номера
-        cur.execute("""
-            UPDATE virtual_numbers 
-            SET is_busy = FALSE, 
-                assigned_listing_id = NULL, 
-                assigned_at = NULL,
-                assigned_until = NULL
-            WHERE is_busy = TRUE 
-              AND assigned_until < NOW()
-        """)
-        
-        # Ищем свободный активный номер
-        cur.execute("""
-            SELECT phone 
-            FROM virtual_numbers 
-            WHERE is_busy = FALSE AND (is_active = TRUE OR is_active IS NULL)
-            LIMIT 1
-            FOR UPDATE SKIP LOCKED
-        """)
+        # Истёкшие аренды считаются свободными внутри claim_number — без глобальной чистки пула
+        claimed = claim_number(cur, listing_id, client_phone)
         
-        result = cur.fetchone()
-        
-        if not result:
+        if not claimed:
+            print(f"[POOL] Exhausted: listing {listing_id} gets direct owner number")
             cur.execute("""
                 INSERT INTO call_tracking 
                 (virtual_number, listing_id, client_phone, shown_at, expires_at)
-                VALUES ('direct', %s, %s, NOW(), NOW() + INTERVAL '5 minutes')
-            """, (listing_id, client_phone))
+                VALUES (%s, %s, %s, NOW(), NOW() + %s::interval)
+            """, (DIRECT_NUMBER, listing_id, client_phone, f'{LEASE_MINUTES} minutes'))
             conn.commit()
             cur.close()
             conn.close()
@@ -137,12 +123,12 @@ def handler(event: dict, context) -> dict:
                 })
             }
         
-        virtual_number = result['phone']
-        expires_at = datetime.now() + timedelta(minutes=5)
+        virtual_number, expires_at, sticky = claimed
         
         # Настраиваем переадресацию через Exolve API
         exolve_success = setup_mts_forwarding(exolve_api_key, virtual_number, owner_phone, expires_at)
         if not exolve_success:
+            conn.rollback()
             conn.close()
             return {
                 'statusCode': 500,
@@ -150,16 +136,6 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({'error': 'Failed to configure call forwarding'})
             }
         
-        # Привязываем номер к объекту
-        cur.execute("""
-            UPDATE virtual_numbers 
-            SET is_busy = TRUE,
-                assigned_listing_id = %s,
-                assigned_at = NOW(),
-                assigned_until = %s
-            WHERE phone = %s
-        """, (listing_id, expires_at, virtual_number))
-        
         # Записываем в историю звонков
         cur.execute("""
             INSERT INTO call_tracking 
@@ -177,7 +153,8 @@ def handler(event: dict, context) -> dict:
             'body': json.dumps({
                 'virtual_number': virtual_number,
                 'owner_phone': owner_phone,
-                'expires_at': expires_at.isoformat()
+                'expires_at': expires_at.isoformat(),
+                'sticky': sticky
             })
         }
         
@@ -1,11 +1,12 @@
 """API для управления иерархией менеджеров (ОМ/УМ)"""
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.manager_dashboard import refresh_dashboards
 
-def get_db_connection():
-    return psycopg2.connect(os.environ['DATABASE_URL'])
 
 def handler(event: dict, context) -> dict:
     """Привязка/отвязка менеджеров к ОМ и ОМ к УМ"""
@@ -199,6 +200,11 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
+                # ОМ, УМ и их команды видят новую иерархию в кабинете сразу
+                cur.execute(f"SELECT manager_id FROM manager_hierarchy WHERE operational_manager_id = {target_id_int}")
+                team_ids = [row['manager_id'] for row in cur.fetchall()]
+                refresh_dashboards(cur, [target_id_int, initiator_id_int] + team_ids)
+                
                 conn.commit()
                 
                 return {
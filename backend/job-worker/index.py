@@ -0,0 +1,119 @@
+import json
+import os
+import time
+import uuid
+from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection, transaction
+from _common.jobs import get_job, work
+from _common.job_tasks import TASKS
+from _common.subscription_events import dispatch_due, schedule_dispatch
+
+# Запуск по таймеру раз в минуту: воркер работает почти до следующего запуска
+WORKER_RUN_SECONDS = float(os.environ.get('JOB_WORKER_RUN_SECONDS', '50'))
+# Каждый запуск сначала срабатывает наступившие события подписки: напоминания,
+# архивация и subscription_urgency в кабинете менеджера отстают не больше чем на минуту
+SUBSCRIPTION_DISPATCH_SECONDS = 10
+
+
+def handler(event: dict, context) -> dict:
+    '''Воркер очереди фоновых задач (SMTP, YandexGPT, геокодирование, Exolve).
+    POST (или триггер-таймер) — сработать наступившие события подписки и выполнять
+    задачи из очереди до WORKER_RUN_SECONDS;
+    GET ?job_id= — статус и результат задачи.
+    HTTP-запросы — только с X-Authorization: Bearer CRON_SECRET'''
+    
+    # Триггер-таймер вызывает функцию напрямую, не через HTTP: httpMethod и заголовков нет
+    is_timer = 'httpMethod' not in event
+    method = event.get('httpMethod', 'POST')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    cron_secret = (event.get('headers') or {}).get('X-Authorization', '')
+    expected_secret = os.environ.get('CRON_SECRET', '')
+    
+    if not is_timer and (not expected_secret or cron_secret != f'Bearer {expected_secret}'):
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Unauthorized'}),
+            'isBase64Encoded': False
+        }
+    
+    if method == 'GET':
+        params = event.get('queryStringParameters') or {}
+        try:
+            job_id = int(params.get('job_id') or 0)
+        except ValueError:
+            job_id = 0
+        if not job_id:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'job_id обязателен'}),
+                'isBase64Encoded': False
+            }
+        
+        conn = get_db_connection()
+        try:
+            job = get_job(conn.cursor(cursor_factory=RealDictCursor), job_id)
+        finally:
+            conn.close()
+        
+        if not job:
+            return {
+                'statusCode': 404,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Задача не найдена'}),
+                'isBase64Encoded': False
+            }
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(job, default=str),
+            'isBase64Encoded': False
+        }
+    
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+    
+    worker_id = getattr(context, 'request_id', None) or str(uuid.uuid4())
+    try:
+        started = time.monotonic()
+        dispatched = dispatch_due(SUBSCRIPTION_DISPATCH_SECONDS)
+        if dispatched['has_more']:
+            with transaction() as conn:
+                schedule_dispatch(conn.cursor())
+        stats = work(TASKS, worker_id, max(WORKER_RUN_SECONDS - (time.monotonic() - started), 0))
+        stats['subscription_events'] = dispatched['fired']
+        print(f"[JOBS] Воркер {worker_id}: {stats}")
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'success': True, 'worker_id': worker_id, **stats}),
+            'isBase64Encoded': False
+        }
+    except Exception as e:
+        print(f"[JOBS ERROR] {type(e).__name__}: {e}")
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
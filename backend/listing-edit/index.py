@@ -1,6 +1,9 @@
 import json
 import os
-import psycopg2
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.catalog import invalidate_catalog
 
 def handler(event: dict, context) -> dict:
     '''API для редактирования объектов менеджерами'''
@@ -21,7 +24,7 @@ def handler(event: dict, context) -> dict:
     
     dsn = os.environ.get('DATABASE_URL')
     schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
-    conn = psycopg2.connect(dsn)
+    conn = get_db_connection(dsn)
     cur = conn.cursor()
     
     try:
@@ -292,6 +295,7 @@ def handler(event: dict, context) -> dict:
                             WHERE id = %s AND listing_id = %s
                         ''', (room_images, room_id, listing_id))
             
+            invalidate_catalog(cur, listing_ids=[listing_id])
             conn.commit()
             
             return {
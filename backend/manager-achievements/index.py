@@ -1,14 +1,62 @@
 """API для обработки достижений менеджеров с начислением бонусов"""
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.leaderboard import ACHIEVEMENTS, ACHIEVEMENT_BONUS, award_achievements, top, around
+
+MAX_TOP = 100
+MAX_AROUND = 20
+
+
+def leaderboard(params: dict) -> dict:
+    """Рейтинг менеджеров: ?metric=objects|tasks|revenue&limit= — топ-N;
+    &admin_id=&around=k — место сотрудника и k соседей выше и ниже"""
+    metric = params.get('metric') or 'objects'
+    try:
+        limit = min(int(params.get('limit') or 10), MAX_TOP)
+        k = min(int(params.get('around') or 2), MAX_AROUND)
+        admin_id = int(params['admin_id']) if params.get('admin_id') else None
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Неверные параметры рейтинга'}),
+            'isBase64Encoded': False
+        }
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            result = {'metric': metric, 'top': top(cur, metric, limit)}
+            if admin_id:
+                nearby = around(cur, metric, admin_id, k)
+                result['me'] = nearby['me'] if nearby else None
+                result['around'] = nearby['entries'] if nearby else []
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    finally:
+        conn.close()
+
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps(result, default=str),
+        'isBase64Encoded': False
+    }
 
-def get_db_connection():
-    return psycopg2.connect(os.environ['DATABASE_URL'])
 
 def handler(event: dict, context) -> dict:
-    """Проверка и начисление бонусов за достижения"""
+    """Проверка и начисление бонусов за достижения.
+    POST {admin_id} — проверить все достижения по витрине и начислить новые одним вызовом;
+    POST {admin_id, achievement_id} — начислить одно достижение. GET — рейтинг менеджеров"""
     method = event.get('httpMethod', 'POST')
     
     if method == 'OPTIONS':
@@ -16,13 +64,24 @@ def handler(event: dict, context) -> dict:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
                 'Access-Control-Allow-Headers': 'Content-Type, X-Authorization'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    if method == 'GET':
+        try:
+            return leaderboard(event.get('queryStringParameters') or {})
+        except Exception as e:
+            return {
+                'statusCode': 500,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': str(e)}),
+                'isBase64Encoded': False
+            }
+    
     if method != 'POST':
         return {
             'statusCode': 405,
@@ -38,80 +97,69 @@ def handler(event: dict, context) -> dict:
         
         print(f"[ACHIEVEMENT] Запрос на начисление бонуса: admin_id={admin_id}, achievement_id={achievement_id}")
         
-        if not admin_id or not achievement_id:
+        if not admin_id:
             print(f"[ACHIEVEMENT ERROR] Отсутствуют параметры")
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Не указаны admin_id или achievement_id'}),
+                'body': json.dumps({'error': 'Не указан admin_id'}),
+                'isBase64Encoded': False
+            }
+        
+        if achievement_id and achievement_id not in ACHIEVEMENTS:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': f'Неизвестное достижение: {achievement_id}'}),
                 'isBase64Encoded': False
             }
         
         admin_id_int = int(admin_id)
-        bonus_amount = 1000
-        print(f"[ACHIEVEMENT] Начисляем {bonus_amount}₽ для admin_id={admin_id_int}")
         
         conn = get_db_connection()
         
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # Проверяем, не было ли уже начислено
+                # Условия достижений проверяются по витрине; повторное начисление
+                # отсекает уникальный ключ (admin_id, achievement_id)
+                granted = award_achievements(cur, admin_id_int, [achievement_id] if achievement_id else None)
+                
                 cur.execute("""
-                    SELECT id FROM t_p39732784_hourly_rentals_platf.achievement_bonuses
-                    WHERE admin_id = %s AND achievement_id = %s
-                """, (admin_id_int, achievement_id))
+                    SELECT balance FROM t_p39732784_hourly_rentals_platf.admins WHERE id = %s
+                """, (admin_id_int,))
+                row = cur.fetchone()
+                new_balance = float(row['balance']) if row else 0
+                conn.commit()
                 
-                existing = cur.fetchone()
-                if existing:
-                    print(f"[ACHIEVEMENT] Бонус уже был начислен ранее")
+                bonus_amount = ACHIEVEMENT_BONUS * len(granted)
+                print(f"[ACHIEVEMENT] Начислено {bonus_amount}₽ за {granted}, новый баланс = {new_balance}₽")
+                
+                if achievement_id and not granted:
+                    cur.execute("""
+                        SELECT id FROM t_p39732784_hourly_rentals_platf.achievement_bonuses
+                        WHERE admin_id = %s AND achievement_id = %s
+                    """, (admin_id_int, achievement_id))
+                    already_awarded = cur.fetchone() is not None
                     return {
                         'statusCode': 200,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                         'body': json.dumps({
                             'success': True,
-                            'message': 'Бонус уже был начислен',
-                            'already_awarded': True
+                            'message': 'Бонус уже был начислен' if already_awarded else 'Условие достижения ещё не выполнено',
+                            'already_awarded': already_awarded
                         }),
                         'isBase64Encoded': False
                     }
                 
-                # Начисляем бонус на баланс
-                print(f"[ACHIEVEMENT] Начисляем {bonus_amount}₽ на баланс...")
-                cur.execute("""
-                    UPDATE t_p39732784_hourly_rentals_platf.admins
-                    SET balance = balance + %s
-                    WHERE id = %s
-                    RETURNING balance
-                """, (bonus_amount, admin_id_int))
-                
-                result = cur.fetchone()
-                new_balance = float(result['balance']) if result else 0
-                print(f"[ACHIEVEMENT] Баланс обновлен: новый баланс = {new_balance}₽")
-                
-                # Записываем историю начисления
-                cur.execute("""
-                    INSERT INTO t_p39732784_hourly_rentals_platf.achievement_bonuses
-                    (admin_id, achievement_id, amount, created_at)
-                    VALUES (%s, %s, %s, NOW())
-                """, (admin_id_int, achievement_id, bonus_amount))
-                
-                # Записываем в историю комиссий для отслеживания
-                cur.execute("""
-                    INSERT INTO t_p39732784_hourly_rentals_platf.commission_history
-                    (admin_id, amount, description, created_at)
-                    VALUES (%s, %s, %s, NOW())
-                """, (admin_id_int, bonus_amount, f'Бонус за достижение: {achievement_id}'))
-                
-                conn.commit()
-                
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'body': json.dumps({
                         'success': True,
+                        'awarded': granted,
                         'bonus_amount': bonus_amount,
                         'new_balance': new_balance,
-                        'message': f'Начислено {bonus_amount}₽ за достижение!'
+                        'message': f'Начислено {bonus_amount}₽ за достижения!' if granted else 'Новых достижений нет'
                     }),
                     'isBase64Encoded': False
                 }
@@ -1,8 +1,10 @@
 import json
 import os
-import psycopg2
 from datetime import datetime
 import hashlib
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 def handler(event, context):
     '''Добавление владельца менеджером с созданием учетной записи и привязкой к объекту'''
@@ -64,7 +66,7 @@ def handler(event, context):
             }
         
         dsn = os.environ['DATABASE_URL']
-        conn = psycopg2.connect(dsn)
+        conn = get_db_connection(dsn)
         cur = conn.cursor()
         
         # Проверка прав менеджера
@@ -1,7 +1,9 @@
 import json
 import os
-import psycopg2
 from datetime import datetime
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 def handler(event: dict, context) -> dict:
     '''API для управления подарками менеджеров владельцам'''
@@ -21,7 +23,7 @@ def handler(event: dict, context) -> dict:
         }
     
     dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_db_connection(dsn)
     cur = conn.cursor()
     
     try:
@@ -1,8 +1,11 @@
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.subscription_events import schedule_expiry
 
 def handler(event: dict, context) -> dict:
     '''API для отправки подарка "Пакет Золото на 14 дней" владельцу'''
@@ -22,7 +25,7 @@ def handler(event: dict, context) -> dict:
         }
     
     schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
@@ -116,6 +119,7 @@ def handler(event: dict, context) -> dict:
                     gold_gift_sent_at = NOW()
                 WHERE id = %s
             ''', (new_subscription_end, listing_id))
+            schedule_expiry(cur, [listing_id])
             
             # Создаем запись о подарке
             cur.execute(f'''
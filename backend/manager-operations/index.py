@@ -2,12 +2,13 @@
 import json
 import os
 from datetime import datetime
-import psycopg2
 from psycopg2.extras import RealDictCursor
-
-def get_db_connection():
-    """Подключение к БД"""
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.manager_assignments import assign_listings
+from _common.manager_dashboard import refresh_dashboards, listing_managers
+from _common.subscription_events import schedule_expiry
 
 def log_action(conn, manager_id: int, action_type: str, listing_id: int = None, details: dict = None):
     """Логирование действий менеджера"""
@@ -112,33 +113,23 @@ def handler(event: dict, context) -> dict:
                 
                 # Действие: ВЗЯТЬ В СОПРОВОЖДЕНИЕ
                 if action == 'take':
-                    # Проверяем, свободен ли объект
-                    cur.execute(f"SELECT manager_id FROM manager_listings WHERE listing_id = {listing_id_int}")
-                    existing = cur.fetchone()
-                    if existing:
-                        return {
-                            'statusCode': 400,
-                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                            'body': json.dumps({'error': 'Объект уже занят другим менеджером'}),
-                            'isBase64Encoded': False
+                    # Тот же путь, что и пакетное добавление: лимит проверяется под блокировкой менеджера
+                    assignment = assign_listings(cur, manager_id_int, [listing_id_int])
+                    outcome = assignment['results'][0]['outcome']
+                    if outcome != 'added':
+                        errors = {
+                            'taken': 'Объект уже занят другим менеджером',
+                            'already_yours': 'Объект уже в вашем сопровождении',
+                            'not_found': 'Объект не найден',
+                            'limit': f'Превышен лимит объектов ({manager["object_limit"]})'
                         }
-                    
-                    # Проверяем лимит объектов
-                    cur.execute(f"SELECT COUNT(*) as count FROM manager_listings WHERE manager_id = {manager_id_int}")
-                    current_count = cur.fetchone()['count']
-                    if current_count >= manager['object_limit']:
+                        conn.rollback()
                         return {
                             'statusCode': 400,
                             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                            'body': json.dumps({'error': f'Превышен лимит объектов ({manager["object_limit"]})'})
+                            'body': json.dumps({'error': errors[outcome]})
                         }
                     
-                    # Привязываем объект
-                    cur.execute(f"""
-                        INSERT INTO manager_listings (manager_id, listing_id)
-                        VALUES ({manager_id_int}, {listing_id_int})
-                    """)
-                    
                     log_action(conn, manager_id_int, 'take_listing', listing_id_int, {'reason': reason})
                     message = 'Объект взят в сопровождение'
                 
@@ -156,6 +147,7 @@ def handler(event: dict, context) -> dict:
                             'isBase64Encoded': False
                         }
                     
+                    refresh_dashboards(cur, [manager_id_int])
                     log_action(conn, manager_id_int, 'release_listing', listing_id_int, {'reason': reason})
                     message = 'Объект снят с сопровождения'
                 
@@ -197,10 +189,12 @@ def handler(event: dict, context) -> dict:
                         WHERE id = {listing_id_int}
                     """)
                     
+                    affected_managers = listing_managers(cur, [listing_id_int])
                     cur.execute(f"""
                         DELETE FROM manager_listings 
                         WHERE listing_id = {listing_id_int}
                     """)
+                    refresh_dashboards(cur, affected_managers)
                     
                     log_action(conn, manager_id_int, 'deactivate_listing', listing_id_int, {'reason': reason})
                     message = 'Объект перемещён в неактивные и отвязан от менеджера'
@@ -280,7 +274,9 @@ def handler(event: dict, context) -> dict:
                     """)
                     
                     # Снимаем привязку менеджера
+                    affected_managers = listing_managers(cur, [listing_id_int])
                     cur.execute(f"DELETE FROM manager_listings WHERE listing_id = {listing_id_int}")
+                    refresh_dashboards(cur, affected_managers)
                     
                     log_action(conn, manager_id_int, 'archive_listing', listing_id_int, {'reason': reason})
                     message = 'Объект перенесен в архив'
@@ -333,6 +329,7 @@ def handler(event: dict, context) -> dict:
                         SET subscription_expires_at = NULL
                         WHERE id = {listing_id_int}
                     """)
+                    schedule_expiry(cur, [listing_id_int])
                     
                     log_action(conn, manager_id_int, 'reset_subscription', listing_id_int, {'reason': 'Обнуление подписки менеджером'})
                     message = 'Подписка обнулена'
@@ -2,6 +2,9 @@ import json
 import os
 import psycopg2
 import psycopg2.extras
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 SCHEMA = 't_p39732784_hourly_rentals_platf'
 
@@ -42,7 +45,7 @@ def handler(event, context):
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     
     try:
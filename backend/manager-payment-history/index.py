@@ -1,8 +1,10 @@
 """API для получения истории выплат менеджера"""
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 def handler(event: dict, context) -> dict:
     """Получение истории выплат и активных заявок менеджера"""
@@ -40,7 +42,7 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = get_db_connection()
         
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
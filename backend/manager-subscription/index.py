@@ -2,11 +2,11 @@
 import json
 import os
 from datetime import datetime, timedelta
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
-def get_db_connection():
-    return psycopg2.connect(os.environ['DATABASE_URL'])
 
 def handler(event: dict, context) -> dict:
     """Активация/изменение подписки менеджером с учетом лимитов"""
@@ -1,8 +1,10 @@
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 
 SCHEMA = 't_p39732784_hourly_rentals_platf'
@@ -27,7 +29,7 @@ def handler(event: dict, context) -> dict:
         }
     
     dsn = os.environ['DATABASE_URL']
-    conn = psycopg2.connect(dsn)
+    conn = get_db_connection(dsn)
     cur = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
@@ -0,0 +1,237 @@
+"""API поиска объектов рядом с точкой: радиус, ближайшие и прямоугольник карты"""
+import json
+import math
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.catalog import get_catalog_snapshot
+
+EARTH_RADIUS_M = 6371000
+CELL_DEG = 0.01  # ~1.1 км по широте
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+MAX_RADIUS_M = 50000
+
+
+class GeoGrid:
+    '''Сеточный пространственный индекс объектов каталога в памяти'''
+
+    def __init__(self, listings: list):
+        self.cells = {}
+        self.size = 0
+        for listing in listings:
+            try:
+                lat = float(listing.get('lat'))
+                lng = float(listing.get('lng'))
+            except (TypeError, ValueError):
+                continue
+            if lat == 0 and lng == 0:
+                continue
+            auction = listing.get('auction')
+            city_key = (listing.get('city') or '').lower()
+            entry = (lat, lng, 999 if auction is None else auction, listing['id'], summarize(listing), city_key)
+            self.cells.setdefault(self.cell(lat, lng), []).append(entry)
+            self.size += 1
+
+    @staticmethod
+    def cell(lat: float, lng: float) -> tuple:
+        return (math.floor(lat / CELL_DEG), math.floor(lng / CELL_DEG))
+
+    def in_box(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float, city: str = None):
+        '''Объекты в прямоугольнике; city — только объекты этого города (LOWER)'''
+        lat_from, lng_from = self.cell(min_lat, min_lng)
+        lat_to, lng_to = self.cell(max_lat, max_lng)
+        # Для больших прямоугольников дешевле пройти по заполненным ячейкам
+        if (lat_to - lat_from + 1) * (lng_to - lng_from + 1) > len(self.cells):
+            keys = [k for k in self.cells if lat_from <= k[0] <= lat_to and lng_from <= k[1] <= lng_to]
+        else:
+            keys = [(i, j) for i in range(lat_from, lat_to + 1) for j in range(lng_from, lng_to + 1)]
+        for key in keys:
+            for entry in self.cells.get(key, ()):
+                if city and entry[5] != city:
+                    continue
+                if min_lat <= entry[0] <= max_lat and min_lng <= entry[1] <= max_lng:
+                    yield entry
+
+    def within(self, lat: float, lng: float, radius_m: float, city: str = None) -> list:
+        '''Объекты в радиусе: [(distance_m, entry)]'''
+        d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+        d_lng = d_lat / max(math.cos(math.radians(lat)), 0.01)
+        result = []
+        for entry in self.in_box(lat - d_lat, lng - d_lng, lat + d_lat, lng + d_lng, city):
+            distance = haversine(lat, lng, entry[0], entry[1])
+            if distance <= radius_m:
+                result.append((distance, entry))
+        return result
+
+    def nearest(self, lat: float, lng: float, k: int, max_radius_m: float = MAX_RADIUS_M,
+                city: str = None) -> list:
+        '''k ближайших объектов (города city, если задан): радиус поиска удваивается,
+        пока не наберётся k'''
+        radius = 1000.0
+        while True:
+            found = self.within(lat, lng, radius, city)
+            if len(found) >= k or radius >= max_radius_m:
+                return found
+            radius = min(radius * 2, max_radius_m)
+
+
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def summarize(listing: dict) -> dict:
+    '''Карточка объекта для выдачи: комнаты без массивов фотографий'''
+    item = {k: v for k, v in listing.items() if k != 'rooms'}
+    item['rooms'] = [
+        {**{k: v for k, v in room.items() if k != 'images'}, 'images_count': len(room.get('images') or [])}
+        for room in listing.get('rooms') or []
+    ]
+    return item
+
+
+# Индекс переживает тёплые вызовы и пересобирается при смене ETag снимка каталога
+_grid = None
+_grid_etag = None
+
+
+def get_grid() -> GeoGrid:
+    global _grid, _grid_etag
+    conn = get_db_connection()
+    try:
+        snapshot = get_catalog_snapshot(conn, None, _grid_etag if _grid is not None else None)
+    finally:
+        conn.close()
+    if not snapshot['not_modified'] or _grid is None:
+        _grid = GeoGrid(json.loads(snapshot['body']))
+        _grid_etag = snapshot['etag']
+    return _grid
+
+
+def parse_float(value, name: str) -> float:
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Некорректный параметр {name}')
+    if math.isnan(result) or math.isinf(result):
+        raise ValueError(f'Некорректный параметр {name}')
+    return result
+
+
+def handler(event: dict, context) -> dict:
+    '''Поиск объектов рядом: ?lat=&lng=[&radius=] или ?bbox=min_lng,min_lat,max_lng,max_lat.
+    Сортировка по расстоянию, при равном расстоянии — по позиции в аукционе.'''
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+
+    params = event.get('queryStringParameters', {}) or {}
+
+    try:
+        limit = int(params.get('limit') or DEFAULT_LIMIT)
+        if limit < 1 or limit > MAX_LIMIT:
+            raise ValueError(f'limit должен быть от 1 до {MAX_LIMIT}')
+
+        lat = parse_float(params['lat'], 'lat') if params.get('lat') else None
+        lng = parse_float(params['lng'], 'lng') if params.get('lng') else None
+        if (lat is None) != (lng is None):
+            raise ValueError('lat и lng указываются вместе')
+
+        bbox = None
+        if params.get('bbox'):
+            parts = params['bbox'].split(',')
+            if len(parts) != 4:
+                raise ValueError('bbox: min_lng,min_lat,max_lng,max_lat')
+            min_lng, min_lat, max_lng, max_lat = (parse_float(p, 'bbox') for p in parts)
+            if min_lat > max_lat or min_lng > max_lng:
+                raise ValueError('bbox: минимум больше максимума')
+            bbox = (min_lat, min_lng, max_lat, max_lng)
+
+        radius = None
+        if params.get('radius'):
+            radius = parse_float(params['radius'], 'radius')
+            if radius <= 0 or radius > MAX_RADIUS_M:
+                raise ValueError(f'radius должен быть от 1 до {MAX_RADIUS_M} м')
+
+        if lat is None and bbox is None:
+            raise ValueError('Укажите lat и lng или bbox')
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+
+    try:
+        grid = get_grid()
+        city = (params.get('city') or '').strip().lower()
+
+        if bbox is not None:
+            entries = grid.in_box(*bbox, city=city)
+            found = [(haversine(lat, lng, e[0], e[1]) if lat is not None else None, e) for e in entries]
+            if radius is not None and lat is not None:
+                found = [(d, e) for d, e in found if d <= radius]
+        elif radius is not None:
+            found = grid.within(lat, lng, radius, city)
+        else:
+            # Город фильтруется внутри поиска: иначе у границы города ближайшие
+            # k могли оказаться чужими и выдача — пустой
+            found = grid.nearest(lat, lng, limit, city=city)
+
+        if lat is not None:
+            found.sort(key=lambda item: (round(item[0]), item[1][2], item[1][3]))
+        else:
+            found.sort(key=lambda item: (item[1][2], item[1][3]))
+
+        items = []
+        for distance, entry in found[:limit]:
+            item = dict(entry[4])
+            if distance is not None:
+                item['distance_m'] = round(distance)
+            items.append(item)
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'listings': items,
+                'total': len(found),
+                'indexed': grid.size
+            }, default=str),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] {str(e)}")
+        print(f"[TRACEBACK] {traceback.format_exc()}")
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
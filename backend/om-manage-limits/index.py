@@ -1,8 +1,10 @@
 """API для управления лимитами менеджеров (для ОМ)"""
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 def handler(event: dict, context) -> dict:
     """Управление лимитами объектов для менеджеров в команде ОМ"""
@@ -21,7 +23,7 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = get_db_connection()
         
         # GET - получить менеджеров в команде ОМ
         if method == 'GET':
@@ -1,7 +1,10 @@
 import json
 import os
-import psycopg2
 from datetime import datetime, timedelta
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.subscription_events import schedule_expiry
 
 def handler(event: dict, context) -> dict:
     '''API для получения и активации подарков владельцами'''
@@ -21,7 +24,7 @@ def handler(event: dict, context) -> dict:
         }
     
     dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_db_connection(dsn)
     cur = conn.cursor()
     
     try:
@@ -167,6 +170,7 @@ def handler(event: dict, context) -> dict:
                     SET subscription_expires_at = %s, status = 'active', updated_at = %s
                     WHERE id = %s
                 ''', (new_expires, now, listing_id))
+                schedule_expiry(cur, [listing_id])
             
             # Отмечаем подарок как активированный
             cur.execute('''
@@ -1,9 +1,11 @@
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 import secrets
 import string
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 def generate_password(length=12):
     """Генерация случайного пароля"""
@@ -58,7 +60,7 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = get_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         # Проверяем, существует ли владелец с таким email
@@ -1,8 +1,10 @@
 import json
 import os
 import jwt
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 def verify_token(token: str) -> dict:
     '''Проверка JWT токена администратора'''
@@ -36,7 +38,7 @@ def handler(event: dict, context) -> dict:
     token = auth_header.replace('Bearer ', '') if auth_header else ''
     
     schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
@@ -1,10 +1,60 @@
 import json
 import os
-import psycopg2
 from datetime import datetime
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.inbox import page_params, keyset, page_result, record_owner_message, mark_owner_chat_read
+from _common.message_feed import OWNER_CHAT_CHANNEL, wait_seconds, wait_for_messages
+
+
+def fetch_owner_messages(cur, owner_id, page: dict) -> dict:
+    '''Страница переписки владельца по индексу (owner_id, created_at, id), по возрастанию времени'''
+    cursor_sql, cursor_params, order = keyset('owner_manager_messages', 'm', page)
+    cur.execute(f'''
+        SELECT 
+            m.id, m.manager_id, m.listing_id, m.sender_type, 
+            m.message, m.is_read, m.created_at,
+            e.name as manager_name, e.phone as manager_phone,
+            l.title as listing_name
+        FROM owner_manager_messages m
+        LEFT JOIN employees e ON m.manager_id = e.id
+        LEFT JOIN listings l ON m.listing_id = l.id
+        WHERE m.owner_id = %s {cursor_sql}
+        ORDER BY m.created_at {order}, m.id {order}
+        LIMIT %s
+    ''', [owner_id] + cursor_params + [page['limit'] + 1])
+    
+    messages = []
+    manager_info = None
+    for row in cur.fetchall():
+        messages.append({
+            'id': row[0],
+            'manager_id': row[1],
+            'listing_id': row[2],
+            'sender_type': row[3],
+            'message': row[4],
+            'is_read': row[5],
+            'created_at': row[6].isoformat() if row[6] else None,
+            'listing_name': row[9]
+        })
+        
+        if not manager_info and row[1]:
+            manager_info = {
+                'id': row[1],
+                'name': row[7],
+                'phone': row[8]
+            }
+    
+    result = page_result(messages, page, order, newest_first=False)
+    result['manager'] = manager_info
+    return result
 
 def handler(event: dict, context) -> dict:
-    '''API для сообщений между владельцами и менеджерами'''
+    '''API для сообщений между владельцами и менеджерами.
+    GET ?owner_id=&before=|after=&limit= — страница переписки владельца (по возрастанию времени);
+    GET ?owner_id=&after=<id>&wait=25 — дождаться новых сообщений владельца (long-poll);
+    GET ?manager_id=&before=&limit= — диалоги менеджера со счётчиками непрочитанных'''
     
     method = event.get('httpMethod', 'GET')
     
@@ -21,51 +71,65 @@ def handler(event: dict, context) -> dict:
         }
     
     dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_db_connection(dsn)
     cur = conn.cursor()
     
     try:
         if method == 'GET':
             # Получить сообщения для владельца или менеджера
-            owner_id = event.get('queryStringParameters', {}).get('owner_id')
-            manager_id = event.get('queryStringParameters', {}).get('manager_id')
+            params = event.get('queryStringParameters') or {}
+            owner_id = params.get('owner_id')
+            manager_id = params.get('manager_id')
+            
+            try:
+                page = page_params(params)
+                wait = wait_seconds(params)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
             
             if owner_id:
-                # Получаем сообщения для владельца
-                cur.execute('''
-                    SELECT 
-                        m.id, m.manager_id, m.listing_id, m.sender_type, 
-                        m.message, m.is_read, m.created_at,
-                        e.name as manager_name, e.phone as manager_phone,
-                        l.title as listing_name
-                    FROM owner_manager_messages m
-                    LEFT JOIN employees e ON m.manager_id = e.id
-                    LEFT JOIN listings l ON m.listing_id = l.id
-                    WHERE m.owner_id = %s
-                    ORDER BY m.created_at ASC
-                ''', (owner_id,))
-                
-                rows = cur.fetchall()
-                messages = []
-                manager_info = None
+                if page['after'] and wait:
+                    # Новые сообщения длинным опросом: ответ придёт сразу после отправки.
+                    # На время ожидания соединение запроса возвращается в пул — слушает одно
+                    cur.close()
+                    conn.close()
+                    result = wait_for_messages(
+                        OWNER_CHAT_CHANNEL,
+                        lambda ids: ids[0] == int(owner_id),
+                        lambda feed_conn: fetch_owner_messages(feed_conn.cursor(), owner_id, page),
+                        wait
+                    )
+                    conn = get_db_connection(dsn)
+                    cur = conn.cursor()
+                else:
+                    result = fetch_owner_messages(cur, owner_id, page)
+                manager_info = result.pop('manager')
                 
-                for row in rows:
-                    messages.append({
-                        'id': row[0],
-                        'manager_id': row[1],
-                        'listing_id': row[2],
-                        'sender_type': row[3],
-                        'message': row[4],
-                        'is_read': row[5],
-                        'created_at': row[6].isoformat() if row[6] else None,
-                        'listing_name': row[9]
-                    })
+                # Менеджер последнего диалога, если на странице его нет
+                if not manager_info:
+                    cur.execute('''
+                        SELECT e.id, e.name, e.phone
+                        FROM owner_manager_conversations c
+                        JOIN employees e ON c.manager_id = e.id
+                        WHERE c.owner_id = %s
+                        ORDER BY c.last_message_id DESC
+                        LIMIT 1
+                    ''', (owner_id,))
                     
-                    if not manager_info and row[1]:
+                    row = cur.fetchone()
+                    if row:
                         manager_info = {
-                            'id': row[1],
-                            'name': row[7],
-                            'phone': row[8]
+                            'id': row[0],
+                            'name': row[1],
+                            'phone': row[2]
                         }
                 
                 # Если менеджер не найден в сообщениях, получаем из первого объекта владельца
@@ -86,6 +150,13 @@ def handler(event: dict, context) -> dict:
                             'phone': row[2]
                         }
                 
+                cur.execute('''
+                    SELECT COALESCE(SUM(unread_by_owner), 0)
+                    FROM owner_manager_conversations
+                    WHERE owner_id = %s
+                ''', (owner_id,))
+                unread_count = int(cur.fetchone()[0])
+                
                 return {
                     'statusCode': 200,
                     'headers': {
@@ -93,38 +164,46 @@ def handler(event: dict, context) -> dict:
                         'Access-Control-Allow-Origin': '*'
                     },
                     'body': json.dumps({
-                        'messages': messages,
-                        'manager': manager_info
+                        'messages': result['items'],
+                        'manager': manager_info,
+                        'has_more': result['has_more'],
+                        'before': result['before'],
+                        'after': result['after'],
+                        'unread_count': unread_count
                     }),
                     'isBase64Encoded': False
                 }
                 
             elif manager_id:
-                # Получаем сообщения для менеджера (сгруппированные по владельцам)
-                cur.execute('''
-                    SELECT DISTINCT
-                        m.owner_id,
+                # Диалоги менеджера из owner_manager_conversations: счётчики уже посчитаны,
+                # страницы по последнему сообщению (before=<last_message_id>)
+                cursor_sql = 'AND c.last_message_id < %s' if page['before'] else ''
+                cur.execute(f'''
+                    SELECT
+                        c.owner_id,
                         o.full_name as owner_name,
                         o.phone as owner_phone,
-                        COUNT(*) FILTER (WHERE m.sender_type = 'owner' AND NOT m.is_read) as unread_count,
-                        MAX(m.created_at) as last_message_time
-                    FROM owner_manager_messages m
-                    LEFT JOIN owners o ON m.owner_id = o.id
-                    WHERE m.manager_id = %s
-                    GROUP BY m.owner_id, o.full_name, o.phone
-                    ORDER BY MAX(m.created_at) DESC
-                ''', (manager_id,))
+                        c.unread_by_manager as unread_count,
+                        c.last_message_at as last_message_time,
+                        c.last_message_id
+                    FROM owner_manager_conversations c
+                    LEFT JOIN owners o ON c.owner_id = o.id
+                    WHERE c.manager_id = %s {cursor_sql}
+                    ORDER BY c.last_message_id DESC
+                    LIMIT %s
+                ''', [manager_id] + ([page['before']] if page['before'] else []) + [page['limit'] + 1])
                 
                 rows = cur.fetchall()
                 conversations = []
                 
-                for row in rows:
+                for row in rows[:page['limit']]:
                     conversations.append({
                         'owner_id': row[0],
                         'owner_name': row[1],
                         'owner_phone': row[2],
                         'unread_count': row[3],
-                        'last_message_time': row[4].isoformat() if row[4] else None
+                        'last_message_time': row[4].isoformat() if row[4] else None,
+                        'last_message_id': row[5]
                     })
                 
                 return {
@@ -133,7 +212,11 @@ def handler(event: dict, context) -> dict:
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*'
                     },
-                    'body': json.dumps({'conversations': conversations}),
+                    'body': json.dumps({
+                        'conversations': conversations,
+                        'has_more': len(rows) > page['limit'],
+                        'before': conversations[-1]['last_message_id'] if conversations else None
+                    }),
                     'isBase64Encoded': False
                 }
             
@@ -180,6 +263,7 @@ def handler(event: dict, context) -> dict:
             ''', (owner_id, manager_id, listing_id, sender_type, message))
             
             message_id, created_at = cur.fetchone()
+            record_owner_message(cur, message_id, owner_id, manager_id, sender_type)
             conn.commit()
             
             return {
@@ -214,6 +298,7 @@ def handler(event: dict, context) -> dict:
                     SET is_read = TRUE
                     WHERE owner_id = %s AND sender_type = 'manager' AND NOT is_read
                 ''', (owner_id,))
+                mark_owner_chat_read(cur, 'owner', owner_id)
             elif mark_as_read_by == 'manager' and manager_id and owner_id:
                 # Менеджер читает сообщения от владельца
                 cur.execute('''
@@ -221,6 +306,7 @@ def handler(event: dict, context) -> dict:
                     SET is_read = TRUE
                     WHERE manager_id = %s AND owner_id = %s AND sender_type = 'owner' AND NOT is_read
                 ''', (manager_id, owner_id))
+                mark_owner_chat_read(cur, 'manager', owner_id, manager_id)
             else:
                 return {
                     'statusCode': 400,
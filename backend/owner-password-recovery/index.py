@@ -1,8 +1,10 @@
 import json
 import os
-import psycopg2
 import secrets
 from datetime import datetime, timedelta
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 def handler(event: dict, context) -> dict:
     '''API для восстановления пароля владельцев отелей'''
@@ -32,7 +34,7 @@ def handler(event: dict, context) -> dict:
     body = json.loads(event.get('body', '{}'))
     action = body.get('action')
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = get_db_connection()
     cur = conn.cursor()
     
     try:
@@ -1,6 +1,8 @@
 import json
 import os
-import psycopg2
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 def handler(event: dict, context) -> dict:
     '''API для получения истории транзакций владельца'''
@@ -45,7 +47,7 @@ def handler(event: dict, context) -> dict:
             'body': json.dumps({'error': 'owner_id required'})
         }
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = get_db_connection()
     cur = conn.cursor()
     
     try:
@@ -3,9 +3,12 @@ API для обновления объекта владельцем с отпр
 """
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.catalog import invalidate_catalog
 
 def verify_owner_token(token: str):
     """Проверка токена владельца"""
@@ -14,7 +17,7 @@ def verify_owner_token(token: str):
     
     try:
         dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
+        conn = get_db_connection(dsn)
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         cur.execute("SELECT * FROM owners WHERE token = %s", (token,))
@@ -59,7 +62,7 @@ def handler(event: dict, context) -> dict:
             }
         
         dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
+        conn = get_db_connection(dsn)
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'PUT':
@@ -205,6 +208,8 @@ def handler(event: dict, context) -> dict:
                 RETURNING *
             """
             
+            # Объект уходит на модерацию и пропадает из публичного каталога
+            invalidate_catalog(cur, cities=[listing['city']])
             cur.execute(query, update_values)
             updated_listing = cur.fetchone()
             conn.commit()
@@ -1,10 +1,12 @@
 import json
 import os
-import psycopg2
 import uuid
 import base64
 import urllib.request
 import urllib.error
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 def handler(event: dict, context) -> dict:
     '''API для пополнения баланса через ЮKassa'''
@@ -46,7 +48,7 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = get_db_connection()
         cur = conn.cursor()
     except Exception as e:
         print(f'Database connection error: {str(e)}')
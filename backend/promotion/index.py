@@ -1,9 +1,11 @@
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta, timezone
-import random
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.promotion_rotation import rotate_promotions
 
 PACKAGE_PRICES = {
     'bronze': 3000,
@@ -11,21 +13,6 @@ PACKAGE_PRICES = {
     'gold': 7000
 }
 
-PACKAGE_RANGES = {
-    'bronze': (20, 50),
-    'silver': (10, 40),
-    'gold': (1, 30)
-}
-
-def get_daily_position(package_type: str, start_date: datetime) -> int:
-    '''Вычисляет позицию на основе типа пакета и даты начала'''
-    min_pos, max_pos = PACKAGE_RANGES[package_type]
-    
-    days_since_start = (datetime.now(timezone.utc).date() - start_date.date()).days
-    random.seed(f"{package_type}-{days_since_start}")
-    
-    return random.randint(min_pos, max_pos)
-
 def handler(event: dict, context) -> dict:
     '''API для управления пакетами продвижения с фиксированными ценами'''
     
@@ -43,7 +30,7 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
@@ -151,7 +138,7 @@ def handler(event: dict, context) -> dict:
                 
                 price = PACKAGE_PRICES[package_type]
                 
-                cur.execute("SELECT owner_id FROM t_p39732784_hourly_rentals_platf.listings WHERE id = %s", (listing_id,))
+                cur.execute("SELECT owner_id, city FROM t_p39732784_hourly_rentals_platf.listings WHERE id = %s", (listing_id,))
                 listing_owner = cur.fetchone()
                 if not listing_owner or listing_owner['owner_id'] != owner_id:
                     return {
@@ -220,13 +207,10 @@ def handler(event: dict, context) -> dict:
                             (SELECT balance + bonus_balance FROM t_p39732784_hourly_rentals_platf.owners WHERE id = %s))
                 """, (owner_id, -price, f'Пакет {package_names[package_type]} для города {city}', owner_id))
                 
-                daily_position = get_daily_position(package_type, start_date)
-                
-                cur.execute("""
-                    UPDATE t_p39732784_hourly_rentals_platf.listings 
-                    SET auction = %s 
-                    WHERE id = %s
-                """, (daily_position, listing_id))
+                # Позиция на сегодня — по тем же правилам, что и у ежедневной ротации
+                rotate_promotions(cur, start_date.date(), cities=[listing_owner['city']])
+                cur.execute("SELECT auction FROM t_p39732784_hourly_rentals_platf.listings WHERE id = %s", (listing_id,))
+                daily_position = cur.fetchone()['auction']
                 
                 conn.commit()
                 
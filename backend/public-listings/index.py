@@ -1,12 +1,37 @@
+import base64
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.catalog import get_catalog_snapshot, get_listings_page, LISTING_FIELDS, NESTED_FIELDS, ROOM_SHAPES
+
+DEFAULT_PAGE_LIMIT = 20
+MAX_PAGE_LIMIT = 100
+
+def get_header(event: dict, name: str):
+    '''Заголовок запроса без учёта регистра'''
+    headers = event.get('headers') or {}
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+def parse_etag(value):
+    '''Значение If-None-Match без кавычек и префикса W/'''
+    if not value:
+        return None
+    value = value.split(',')[0].strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    return value.strip('"') or None
 
 def get_room_details(listing_id: str, room_index: str) -> dict:
     '''Получить детали конкретного номера с фотографиями'''
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = get_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         # Получаем все комнаты для этого объекта
@@ -51,13 +76,15 @@ def get_single_listing(listing_id: str) -> dict:
     '''Получить один объект по ID со всеми комнатами'''
     conn = None
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = get_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         cur.execute("""
             SELECT 
                 l.id, l.title, l.type, l.city, l.district, l.address, l.price, l.rating, l.reviews,
-                l.auction, l.image_url, l.logo_url, l.metro, l.metro_walk as "metroWalk",
+                (SELECT COUNT(*) FROM t_p39732784_hourly_rentals_platf.listings a
+                 WHERE a.city = l.city AND (a.auction_rank, a.id) <= (l.auction_rank, l.id)) AS auction,
+                l.image_url, l.logo_url, l.metro, l.metro_walk as "metroWalk",
                 l.has_parking as "hasParking", l.parking_type, l.parking_price_per_hour,
                 l.lat, l.lng,
                 l.min_hours as "minHours", l.phone, l.telegram,
@@ -116,6 +143,66 @@ def get_single_listing(listing_id: str) -> dict:
         }
 
 
+def get_listings_page_response(params: dict) -> dict:
+    '''Страница каталога: ?limit=&cursor=&fields=&rooms=summary|full'''
+    try:
+        limit = int(params.get('limit') or DEFAULT_PAGE_LIMIT)
+    except ValueError:
+        limit = 0
+    if limit < 1 or limit > MAX_PAGE_LIMIT:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f'limit должен быть от 1 до {MAX_PAGE_LIMIT}'}),
+            'isBase64Encoded': False
+        }
+    
+    fields = [f.strip() for f in (params.get('fields') or '').split(',') if f.strip()]
+    unknown = [f for f in fields if f not in LISTING_FIELDS and f not in NESTED_FIELDS]
+    room_shape = params.get('rooms') or 'summary'
+    if unknown or room_shape not in ROOM_SHAPES:
+        error = f'Неизвестные поля: {", ".join(unknown)}' if unknown else 'rooms должен быть summary или full'
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': error}),
+            'isBase64Encoded': False
+        }
+    
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        page = get_listings_page(cur, params.get('city'), params.get('cursor'), limit, fields, room_shape)
+        cur.close()
+        conn.close()
+        
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(page, default=str),
+            'isBase64Encoded': False
+        }
+    except ValueError as e:
+        if conn:
+            conn.close()
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    except Exception as e:
+        if conn:
+            conn.close()
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+
+
 def handler(event: dict, context) -> dict:
     '''Публичный API для получения списка активных объектов и деталей номеров'''
     method = event.get('httpMethod', 'GET')
@@ -126,7 +213,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match'
             },
             'body': '',
             'isBase64Encoded': False
@@ -152,106 +239,46 @@ def handler(event: dict, context) -> dict:
     if listing_id and room_index is None:
         return get_single_listing(listing_id)
     
+    # Постраничный режим с проекцией полей
+    if any(params.get(key) for key in ('limit', 'cursor', 'fields', 'rooms')):
+        return get_listings_page_response(params)
+    
     conn = None
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Формируем WHERE условие с учетом фильтра по городу
-        where_conditions = ["l.is_archived = false", "(l.moderation_status IS NULL OR l.moderation_status = 'approved')"]
-        
-        if city_filter:
-            # Экранируем для SQL (простая защита от SQL injection)
-            safe_city = city_filter.replace("'", "''")
-            where_conditions.append(f"LOWER(l.city) = LOWER('{safe_city}')")
-        
-        where_clause = " AND ".join(where_conditions)
-        
-        # Получаем объекты с учётом фильтра
-        query = f"""
-            SELECT 
-                l.id, l.title, l.type, l.city, l.district, l.address, l.price, l.rating, l.reviews,
-                l.auction, 
-                CASE 
-                    WHEN l.image_url LIKE '[%' THEN (l.image_url::json->>0)
-                    ELSE l.image_url
-                END as image_url,
-                l.logo_url, l.metro, l.metro_walk as "metroWalk", 
-                l.has_parking as "hasParking", l.parking_type, l.parking_price_per_hour,
-                l.lat, l.lng, 
-                l.min_hours as "minHours", l.phone, l.telegram,
-                l.price_warning_holidays, l.price_warning_daytime,
-                l.subscription_expires_at
-            FROM t_p39732784_hourly_rentals_platf.listings l
-            WHERE {where_clause}
-            ORDER BY l.city ASC, l.auction ASC, l.id ASC
-        """
+        conn = get_db_connection()
+        snapshot = get_catalog_snapshot(conn, city_filter, parse_etag(get_header(event, 'If-None-Match')))
+        conn.close()
         
-        cur.execute(query)
-        listings = cur.fetchall()
+        headers = {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag',
+            'ETag': f'"{snapshot["etag"]}"',
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding'
+        }
         
-        if not listings:
-            cur.close()
-            conn.close()
+        if snapshot['not_modified']:
             return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps([]),
+                'statusCode': 304,
+                'headers': headers,
+                'body': '',
                 'isBase64Encoded': False
             }
         
-        # Получаем комнаты (включая images для единственного номера)
-        listing_ids = tuple(l['id'] for l in listings)
-        placeholders = ','.join(['%s'] * len(listing_ids))
-        cur.execute(
-            f"""SELECT listing_id, type, price, square_meters, min_hours, features, images
-                FROM t_p39732784_hourly_rentals_platf.rooms 
-                WHERE listing_id IN ({placeholders})""",
-            listing_ids
-        )
-        all_rooms = cur.fetchall()
-        
-        # Получаем станции метро
-        cur.execute(
-            f"""SELECT listing_id, station_name, walk_minutes 
-                FROM t_p39732784_hourly_rentals_platf.metro_stations 
-                WHERE listing_id IN ({placeholders})""",
-            listing_ids
-        )
-        all_metro = cur.fetchall()
-        
-        # Группируем по listing_id
-        rooms_by_listing = {}
-        for room in all_rooms:
-            room_dict = dict(room)
-            lid = room_dict.pop('listing_id')
-            if lid not in rooms_by_listing:
-                rooms_by_listing[lid] = []
-            rooms_by_listing[lid].append(room_dict)
-        
-        metro_by_listing = {}
-        for metro in all_metro:
-            metro_dict = dict(metro)
-            lid = metro_dict.pop('listing_id')
-            if lid not in metro_by_listing:
-                metro_by_listing[lid] = []
-            metro_by_listing[lid].append(metro_dict)
-        
-        # Присваиваем данные каждому объекту
-        result = []
-        for listing in listings:
-            listing_dict = dict(listing)
-            listing_dict['rooms'] = rooms_by_listing.get(listing_dict['id'], [])
-            listing_dict['metro_stations'] = metro_by_listing.get(listing_dict['id'], [])
-            result.append(listing_dict)
-        
-        cur.close()
-        conn.close()
+        if 'gzip' in (get_header(event, 'Accept-Encoding') or ''):
+            headers['Content-Encoding'] = 'gzip'
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': base64.b64encode(snapshot['body_gzip']).decode('ascii'),
+                'isBase64Encoded': True
+            }
         
         return {
             'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps(result, default=str),
+            'headers': headers,
+            'body': snapshot['body'].decode('utf-8'),
             'isBase64Encoded': False
         }
         
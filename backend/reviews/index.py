@@ -1,7 +1,9 @@
 import json
 import os
-import psycopg2
 from datetime import datetime
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
 
 def handler(event: dict, context) -> dict:
     '''API для управления отзывами об объектах'''
@@ -21,7 +23,7 @@ def handler(event: dict, context) -> dict:
     db_url = os.environ.get('DATABASE_URL')
     schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
     
-    conn = psycopg2.connect(db_url)
+    conn = get_db_connection(db_url)
     cur = conn.cursor()
 
     try:
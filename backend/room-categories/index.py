@@ -1,8 +1,11 @@
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.listing_rooms import save_rooms
 
 def verify_owner_token(token: str):
     '''Проверка токена владельца'''
@@ -13,7 +16,7 @@ def verify_owner_token(token: str):
     try:
         dsn = os.environ.get('DATABASE_URL')
         print(f'[DEBUG] token length: {len(token)}')
-        conn = psycopg2.connect(dsn)
+        conn = get_db_connection(dsn)
         conn.autocommit = True
         cur = conn.cursor()
         
@@ -68,7 +71,7 @@ def handler(event: dict, context) -> dict:
             }
         
         dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
+        conn = get_db_connection(dsn)
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'GET':
@@ -142,27 +145,19 @@ def handler(event: dict, context) -> dict:
                     'isBase64Encoded': False
                 }
             
-            # Сохраняем в таблицу rooms (как админ-панель)
-            cur.execute(
-                f"DELETE FROM t_p39732784_hourly_rentals_platf.rooms WHERE listing_id = {listing_id}"
-            )
-            
-            for category in categories:
-                # Simple Query Protocol - экранируем данные
-                name = str(category.get('name', '')).replace("'", "''")
-                price = float(category.get('price_per_hour', 0))
-                sqm = float(category.get('square_meters', 0))
-                description = str(category.get('description', '')).replace("'", "''")
-                features = json.dumps(category.get('features', [])).replace("'", "''")
-                images = json.dumps(category.get('image_urls', [])).replace("'", "''")
-                
-                cur.execute(
-                    f"""
-                    INSERT INTO t_p39732784_hourly_rentals_platf.rooms 
-                    (listing_id, type, price, square_meters, description, features, images, min_hours, payment_methods, cancellation_policy)
-                    VALUES ({listing_id}, '{name}', {price}, {sqm}, '{description}', ARRAY{features}::text[], ARRAY{images}::text[], 1, 'Наличные, банковская карта при заселении', 'Бесплатная отмена за 1 час до заселения')
-                    """
-                )
+            # Сохраняем в таблицу rooms (как админ-панель) разницей: id категорий не меняются
+            save_rooms(cur, listing['id'], [
+                {
+                    'id': category.get('id'),
+                    'type': str(category.get('name', '')),
+                    'price': float(category.get('price_per_hour', 0)),
+                    'square_meters': float(category.get('square_meters', 0)),
+                    'description': str(category.get('description', '')),
+                    'features': category.get('features', []),
+                    'images': category.get('image_urls', [])
+                }
+                for category in categories
+            ])
             
             conn.commit()
             cur.close()
@@ -1,7 +1,105 @@
 import json
 import os
-import psycopg2
+import re
+import time
 from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.stats_rollups import add_call
+
+# Маршрут кэшируется до конца аренды номера, но не дольше этого срока
+# (страховка от ручных правок номеров и телефонов владельцев)
+ROUTE_CACHE_MAX_SECONDS = 60
+
+# virtual_number -> (маршрут, monotonic-время окончания аренды, monotonic-время протухания записи)
+_routes = {}
+
+
+def normalize_phone(phone: str) -> str:
+    '''Номер в международном формате без + для МТС Exolve: 89104676860 -> 79104676860'''
+    digits = re.sub(r'[^\d]', '', phone)
+    if digits.startswith('8'):
+        digits = '7' + digits[1:]
+    return digits
+
+
+def lookup_route(virtual_number: str):
+    '''Маршрут номера из кэша контейнера или из БД: dict с is_valid или None.
+
+    Номер переназначается другому объекту только после окончания аренды
+    (get-virtual-number захватывает лишь истёкшие номера), поэтому запись
+    кэша не может указать на чужой объект, пока аренда не истекла.
+    '''
+    now = time.monotonic()
+    cached = _routes.get(virtual_number)
+    if cached and now < cached[2]:
+        route, lease_deadline, _ = cached
+        return {**route, 'is_valid': now < lease_deadline}
+
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("""
+            SELECT 
+                vn.assigned_listing_id as listing_id,
+                vn.assigned_until as expires_at,
+                l.short_title,
+                l.phone as owner_phone,
+                EXTRACT(EPOCH FROM vn.assigned_until - NOW()) as seconds_left
+            FROM virtual_numbers vn
+            JOIN listings l ON vn.assigned_listing_id = l.id
+            WHERE vn.phone = %s 
+              AND vn.is_busy = TRUE
+            LIMIT 1
+        """, (virtual_number,))
+        row = cur.fetchone()
+        cur.close()
+    finally:
+        conn.close()
+
+    if not row:
+        _routes.pop(virtual_number, None)
+        return None
+
+    seconds_left = float(row.pop('seconds_left') or 0)
+    route = dict(row)
+    route['redirect_number'] = normalize_phone(route['owner_phone'] or '')
+    if seconds_left > 0:
+        # Время аренды считается по часам БД и переводится в monotonic контейнера
+        lease_deadline = now + seconds_left
+        _routes[virtual_number] = (route, lease_deadline, now + min(seconds_left, ROUTE_CACHE_MAX_SECONDS))
+    return {**route, 'is_valid': seconds_left > 0}
+
+
+def record_call(virtual_number: str, listing_id: int, client_phone: str, expires_at):
+    '''Записать звонок в call_tracking и агрегаты до ответа Exolve.
+
+    Контейнер функции замораживается после ответа, поэтому запись в фоне после
+    return могла задержаться до следующего вызова или потеряться. Это один
+    INSERT без ожидания fsync; ошибка записи не мешает переадресации звонка.
+    '''
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        # Потеря последних миллисекунд WAL при сбое БД допустима, ожидание fsync — нет
+        cur.execute("SET LOCAL synchronous_commit TO OFF")
+        cur.execute("""
+            INSERT INTO call_tracking 
+            (virtual_number, listing_id, client_phone, shown_at, called_at, expires_at)
+            VALUES (%s, %s, %s, NOW(), NOW(), %s)
+            ON CONFLICT DO NOTHING
+            RETURNING listing_id
+        """, (virtual_number, listing_id, client_phone, expires_at))
+        if cur.fetchone():
+            add_call(cur, listing_id)
+        conn.commit()
+        cur.close()
+    except Exception as e:
+        conn.rollback()
+        print(f"[ROUTE] call_tracking write failed: {e}")
+    finally:
+        conn.close()
 
 
 def handler(event: dict, context) -> dict:
@@ -29,7 +127,7 @@ def handler(event: dict, context) -> dict:
         
         if action == 'stats':
             try:
-                conn = psycopg2.connect(os.environ['DATABASE_URL'])
+                conn = get_db_connection()
                 cur = conn.cursor(cursor_factory=RealDictCursor)
                 
                 # Фильтры
@@ -184,55 +282,20 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Ищем активное назначение виртуального номера на объект
-        cur.execute("""
-            SELECT 
-                vn.assigned_listing_id as listing_id,
-                vn.assigned_until as expires_at,
-                l.short_title,
-                l.phone as owner_phone,
-                l.id as listing_number,
-                (vn.assigned_until > NOW()) as is_valid
-            FROM virtual_numbers vn
-            JOIN listings l ON vn.assigned_listing_id = l.id
-            WHERE vn.phone = %s 
-              AND vn.is_busy = TRUE
-            LIMIT 1
-        """, (virtual_number,))
-        
-        result = cur.fetchone()
-        
-        cur.close()
-        conn.close()
+        # Маршрут из кэша контейнера; обращение к БД только при промахе
+        result = lookup_route(virtual_number)
         
         if result:
             # Проверяем, действителен ли номер (не истёк ли срок 30 минут)
             if result['is_valid']:
                 # Номер действителен - записываем звонок в историю
-                conn = psycopg2.connect(os.environ['DATABASE_URL'])
-                cur = conn.cursor()
-                cur.execute("""
-                    INSERT INTO call_tracking 
-                    (virtual_number, listing_id, client_phone, shown_at, called_at, expires_at)
-                    VALUES (%s, %s, %s, NOW(), NOW(), %s)
-                    ON CONFLICT DO NOTHING
-                """, (virtual_number, result['listing_id'], client_phone, result['expires_at']))
-                conn.commit()
-                cur.close()
-                conn.close()
+                record_call(virtual_number, result['listing_id'], client_phone, result['expires_at'])
                 
                 # Формат ответа для МТС Exolve JSON-RPC
                 print(f"[ROUTE] Forwarding {virtual_number} -> {result['owner_phone']} (listing {result['listing_id']})")
                 
-                # Конвертируем номер в международный формат для МТС Exolve
-                import re
-                owner_phone = re.sub(r'[^\d]', '', result['owner_phone'])
-                if owner_phone.startswith('8'):
-                    owner_phone = '7' + owner_phone[1:]  # 89104676860 -> 79104676860
+                # Номер уже в международном формате для МТС Exolve (см. normalize_phone)
+                owner_phone = result['redirect_number']
                 
                 print(f"[ROUTE] Converted phone: {result['owner_phone']} -> {owner_phone}")
                 
@@ -0,0 +1,243 @@
+"""API полнотекстового поиска по объектам с фильтрами и фасетами"""
+import json
+import os
+from psycopg2.extras import RealDictCursor
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.catalog import SCHEMA, RANKED_LISTINGS, VISIBLE_CONDITION, LISTING_FIELDS, listing_columns, fetch_rooms, fetch_metro
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Выражение должно совпадать с индексом idx_listings_search_document (V0109)
+SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('russian', COALESCE(l.title, '')), 'A') || "
+    "setweight(to_tsvector('russian', COALESCE(l.district, '') || ' ' || COALESCE(l.metro, '')), 'B') || "
+    "setweight(to_tsvector('russian', COALESCE(l.address, '')), 'C') || "
+    "setweight(to_tsvector('russian', COALESCE(l.description, '')), 'D')"
+)
+
+# Границы ценовых корзин фасета (цена объекта за час)
+PRICE_BUCKETS = [1000, 1500, 2000, 3000]
+
+
+def parse_filters(params: dict) -> dict:
+    '''Фильтры из query string; ValueError при некорректных значениях'''
+    def to_int(name):
+        value = params.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f'Некорректный параметр {name}')
+
+    filters = {
+        'q': (params.get('q') or '').strip(),
+        'city': (params.get('city') or '').strip(),
+        'type': (params.get('type') or '').strip(),
+        'has_parking': params.get('has_parking') == 'true',
+        'min_price': to_int('min_price'),
+        'max_price': to_int('max_price'),
+        'min_hours': to_int('min_hours'),
+        'features': [f.strip() for f in (params.get('features') or '').split(',') if f.strip()],
+        'limit': to_int('limit') or DEFAULT_LIMIT,
+        'offset': to_int('offset') or 0
+    }
+    if filters['limit'] < 1 or filters['limit'] > MAX_LIMIT:
+        raise ValueError(f'limit должен быть от 1 до {MAX_LIMIT}')
+    if filters['offset'] < 0:
+        raise ValueError('offset не может быть отрицательным')
+    return filters
+
+
+def build_where(filters: dict):
+    '''WHERE для объектов, прошедших фильтры, и его параметры'''
+    conditions = [VISIBLE_CONDITION]
+    params = []
+
+    if filters['q']:
+        conditions.append(f"""l.id IN (
+            SELECT l.id FROM {SCHEMA}.listings l
+            WHERE ({SEARCH_DOCUMENT}) @@ websearch_to_tsquery('russian', %s)
+            UNION
+            SELECT ms.listing_id FROM {SCHEMA}.metro_stations ms
+            WHERE to_tsvector('russian', COALESCE(ms.station_name, '')) @@ websearch_to_tsquery('russian', %s)
+        )""")
+        params.extend([filters['q'], filters['q']])
+    if filters['city']:
+        conditions.append('LOWER(l.city) = LOWER(%s)')
+        params.append(filters['city'])
+    if filters['type']:
+        conditions.append('l.type = %s')
+        params.append(filters['type'])
+    if filters['has_parking']:
+        conditions.append('l.has_parking = true')
+    if filters['min_price'] is not None:
+        conditions.append('l.price >= %s')
+        params.append(filters['min_price'])
+    if filters['max_price'] is not None:
+        conditions.append('l.price <= %s')
+        params.append(filters['max_price'])
+    if filters['min_hours'] is not None:
+        conditions.append('l.min_hours <= %s')
+        params.append(filters['min_hours'])
+    if filters['features']:
+        conditions.append(f"""EXISTS (
+            SELECT 1 FROM {SCHEMA}.rooms r
+            WHERE r.listing_id = l.id AND r.features @> %s::text[]
+        )""")
+        params.append(filters['features'])
+
+    return ' AND '.join(conditions), params
+
+
+def search(cur, filters: dict) -> dict:
+    where, params = build_where(filters)
+
+    if filters['q']:
+        rank = f"ts_rank({SEARCH_DOCUMENT}, websearch_to_tsquery('russian', %s))"
+        rank_params = [filters['q']]
+    else:
+        rank = '0'
+        rank_params = []
+
+    cur.execute(f"""
+        SELECT {listing_columns(LISTING_FIELDS)}, {rank} AS "_rank"
+        FROM {RANKED_LISTINGS} l
+        WHERE {where}
+        ORDER BY "_rank" DESC, l.city, l.auction_rank, l.id
+        LIMIT %s OFFSET %s
+    """, rank_params + params + [filters['limit'], filters['offset']])
+    rows = cur.fetchall()
+
+    listing_ids = [row['id'] for row in rows]
+    rooms_by_listing = fetch_rooms(cur, listing_ids, 'summary') if listing_ids else {}
+    metro_by_listing = fetch_metro(cur, listing_ids) if listing_ids else {}
+
+    items = []
+    for row in rows:
+        item = dict(row)
+        item.pop('_rank')
+        item['rooms'] = rooms_by_listing.get(item['id'], [])
+        item['metro_stations'] = metro_by_listing.get(item['id'], [])
+        items.append(item)
+
+    # Фасеты считаются по всему отфильтрованному набору одним запросом
+    cur.execute(f"""
+        WITH matched AS (
+            SELECT l.id, l.type, l.price, l.has_parking
+            FROM {SCHEMA}.listings l
+            WHERE {where}
+        )
+        SELECT
+            (SELECT COUNT(*) FROM matched) AS total,
+            (SELECT COALESCE(json_object_agg(bucket, cnt), '{{}}'::json) FROM (
+                SELECT width_bucket(price, %s::int[]) AS bucket, COUNT(*) AS cnt
+                FROM matched WHERE price IS NOT NULL GROUP BY 1
+            ) p) AS price_buckets,
+            (SELECT COALESCE(json_object_agg(COALESCE(has_parking, false), cnt), '{{}}'::json) FROM (
+                SELECT COALESCE(has_parking, false) AS has_parking, COUNT(*) AS cnt
+                FROM matched GROUP BY 1
+            ) hp) AS has_parking,
+            (SELECT COALESCE(json_object_agg(type, cnt), '{{}}'::json) FROM (
+                SELECT type, COUNT(*) AS cnt FROM matched WHERE type IS NOT NULL GROUP BY type
+            ) t) AS types,
+            (SELECT COALESCE(json_object_agg(feature, cnt), '{{}}'::json) FROM (
+                SELECT f.feature, COUNT(DISTINCT r.listing_id) AS cnt
+                FROM {SCHEMA}.rooms r
+                JOIN matched m ON m.id = r.listing_id
+                CROSS JOIN LATERAL unnest(r.features) AS f(feature)
+                WHERE f.feature IS NOT NULL
+                GROUP BY f.feature
+            ) rf) AS features
+    """, params + [PRICE_BUCKETS])
+    facets_row = cur.fetchone()
+
+    bounds = [None] + PRICE_BUCKETS + [None]
+    price_facet = []
+    for index in range(len(bounds) - 1):
+        price_facet.append({
+            'min': bounds[index],
+            'max': bounds[index + 1],
+            'count': (facets_row['price_buckets'] or {}).get(str(index), 0)
+        })
+
+    return {
+        'listings': items,
+        'total': facets_row['total'],
+        'facets': {
+            'price': price_facet,
+            'has_parking': {
+                'true': facets_row['has_parking'].get('true', 0),
+                'false': facets_row['has_parking'].get('false', 0)
+            },
+            'type': facets_row['types'],
+            'features': facets_row['features']
+        }
+    }
+
+
+def handler(event: dict, context) -> dict:
+    '''Поиск объектов: ?q=&city=&type=&has_parking=&min_price=&max_price=&min_hours=&features=&limit=&offset=
+    Возвращает страницу объектов (по релевантности, затем по аукциону) и фасеты.'''
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+
+    try:
+        filters = parse_filters(event.get('queryStringParameters', {}) or {})
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        result = search(cur, filters)
+        cur.close()
+        conn.close()
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(result, default=str),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] {str(e)}")
+        print(f"[TRACEBACK] {traceback.format_exc()}")
+        if conn:
+            conn.close()
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
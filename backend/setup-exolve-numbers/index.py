@@ -1,15 +1,18 @@
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
-import urllib.request
-import urllib.error
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.jobs import enqueue, get_job
+from _common.job_tasks import EXOLVE_FORWARDING
 
 
 def handler(event: dict, context) -> dict:
     """
     Настраивает webhook для всех виртуальных номеров в МТС Exolve.
     Привязывает номера к webhook route-call для автоматической переадресации.
+    POST — поставить настройку в очередь (202, job_id); GET ?job_id= — статус и результаты по номерам.
     """
     method = event.get('httpMethod', 'POST')
     
@@ -18,12 +21,32 @@ def handler(event: dict, context) -> dict:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
                 'Access-Control-Allow-Headers': 'Content-Type'
             },
             'body': ''
         }
     
+    if method == 'GET':
+        params = event.get('queryStringParameters') or {}
+        job_id = params.get('job_id') or ''
+        if not job_id.isdigit():
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'job_id is required'})
+            }
+        conn = get_db_connection()
+        try:
+            job = get_job(conn.cursor(cursor_factory=RealDictCursor), int(job_id), EXOLVE_FORWARDING)
+        finally:
+            conn.close()
+        return {
+            'statusCode': 200 if job else 404,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(job if job else {'error': 'Job not found'}, default=str)
+        }
+    
     if method != 'POST':
         return {
             'statusCode': 405,
@@ -39,87 +62,23 @@ def handler(event: dict, context) -> dict:
             'body': json.dumps({'error': 'EXOLVE_API_KEY not configured'})
         }
     
-    webhook_url = 'https://functions.poehali.dev/118f6961-69ab-4912-bbec-0481012af402'
-    
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = get_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
-        cur.execute("SELECT phone FROM virtual_numbers WHERE is_active = TRUE OR is_active IS NULL ORDER BY id")
-        numbers = cur.fetchall()
+        # Каждый номер — отдельный HTTP-вызов в Exolve: привязку выполняет job-worker
+        job = enqueue(cur, EXOLVE_FORWARDING, {}, idempotency_key=EXOLVE_FORWARDING)
         
+        conn.commit()
         cur.close()
         conn.close()
         
-        results = []
-        
-        for row in numbers:
-            phone = row['phone']
-            # Убираем + — Exolve принимает number_code как целое число
-            import re
-            phone_digits = int(re.sub(r'[^\d]', '', phone))
-            
-            # POST https://api.exolve.ru/number/v1/SetCallForwarding
-            # call_forwarding_type: 3 = переадресация на URL (IPCR/webhook)
-            api_url = 'https://api.exolve.ru/number/v1/SetCallForwarding'
-            
-            config_data = {
-                'number_code': phone_digits,
-                'call_forwarding_type': 3,
-                'call_forwarding_ipcr': {
-                    'url': webhook_url
-                }
-            }
-            
-            headers = {
-                'Authorization': f'Bearer {exolve_api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            try:
-                req = urllib.request.Request(
-                    api_url,
-                    data=json.dumps(config_data).encode('utf-8'),
-                    headers=headers,
-                    method='POST'
-                )
-                
-                try:
-                    with urllib.request.urlopen(req, timeout=10) as response:
-                        resp_text = response.read().decode('utf-8')
-                        results.append({
-                            'phone': phone,
-                            'status': 'configured',
-                            'webhook': webhook_url,
-                            'response': resp_text
-                        })
-                        print(f"[SETUP] Configured {phone} -> {webhook_url}: {resp_text}")
-                except urllib.error.HTTPError as e:
-                    err_body = e.read().decode('utf-8')
-                    results.append({
-                        'phone': phone,
-                        'status': 'error',
-                        'error': f"HTTP {e.code}: {err_body}"
-                    })
-                    print(f"[SETUP] Error for {phone}: HTTP {e.code}: {err_body}")
-                        
-            except Exception as e:
-                results.append({
-                    'phone': phone,
-                    'status': 'error',
-                    'error': str(e)
-                })
-                print(f"[SETUP] Exception for {phone}: {str(e)}")
-        
-        success_count = sum(1 for r in results if r['status'] == 'configured')
-        
         return {
-            'statusCode': 200,
+            'statusCode': 202,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({
-                'success': success_count,
-                'total': len(results),
-                'results': results
+                'job_id': job['id'],
+                'status': job['status']
             })
         }
         
@@ -128,4 +87,4 @@ def handler(event: dict, context) -> dict:
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        }
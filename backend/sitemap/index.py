@@ -1,10 +1,264 @@
+import base64
+import gzip
 import json
 import os
 from datetime import datetime
+from io import StringIO
+from urllib.parse import quote
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+BASE_URL = "https://120minut.ru"
+# Адрес для ссылок индекса на дочерние файлы. Поисковики принимают в индексе
+# sitemap сайта только файлы того же хоста, поэтому по умолчанию — сам сайт:
+# запросы /sitemap.xml с query string проксируются на функцию (public/nginx.conf)
+SITEMAP_URL = os.environ.get('SITEMAP_URL', f'{BASE_URL}/sitemap.xml')
+
+# Лимит протокола sitemaps.org на один файл
+MAX_URLS_PER_FILE = 50000
+STREAM_BATCH = 2000
+
+VISIBLE_CONDITION = "is_archived = false AND (moderation_status IS NULL OR moderation_status = 'approved')"
+
+XML_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"\n'
+    '        xmlns:image="http://www.google.com/schemas/sitemap-image/1.1"\n'
+    '        xmlns:xhtml="http://www.w3.org/1999/xhtml">\n'
+)
+
+# Конвертируем название города в slug
+CITY_SLUGS = {
+    'Москва': 'moskva',
+    'Санкт-Петербург': 'sankt-peterburg',
+    'Казань': 'kazan',
+    'Екатеринбург': 'ekaterinburg',
+    'Новосибирск': 'novosibirsk',
+    'Нижний Новгород': 'nizhniy-novgorod',
+    'Челябинск': 'chelyabinsk',
+    'Самара': 'samara',
+    'Омск': 'omsk',
+    'Ростов-на-Дону': 'rostov-na-donu',
+    'Уфа': 'ufa',
+    'Красноярск': 'krasnoyarsk',
+    'Пермь': 'perm',
+    'Воронеж': 'voronezh',
+    'Волгоград': 'volgograd',
+    'Краснодар': 'krasnodar',
+    'Сочи': 'sochi',
+    'Тюмень': 'tyumen',
+    'Барнаул': 'barnaul',
+    'Владивосток': 'vladivostok',
+    'Иркутск': 'irkutsk',
+    'Хабаровск': 'khabarovsk',
+    'Тольятти': 'tolyatti',
+    'Ижевск': 'izhevsk',
+    'Ярославль': 'yaroslavl',
+    'Астрахань': 'astrakhan',
+    'Оренбург': 'orenburg',
+    'Новокузнецк': 'novokuznetsk',
+    'Томск': 'tomsk',
+    'Кемерово': 'kemerovo',
+    'Рязань': 'ryazan',
+    'Набережные Челны': 'naberezhnye-chelny',
+    'Пенза': 'penza',
+    'Чебоксары': 'cheboksary',
+    'Калининград': 'kaliningrad',
+    'Белгород': 'belgorod',
+    'Тула': 'tula',
+    'Курск': 'kursk',
+    'Брянск': 'bryansk',
+    'Улан-Удэ': 'ulan-ude',
+    'Тверь': 'tver',
+    'Магнитогорск': 'magnitogorsk',
+    'Чита': 'chita',
+    'Нижний Тагил': 'nizhniy-tagil',
+    'Вологда': 'vologda',
+    'Архангельск': 'arkhangelsk',
+    'Смоленск': 'smolensk',
+    'Саратов': 'saratov',
+    'Сургут': 'surgut',
+    'Ставрополь': 'stavropol',
+}
+
+# Fallback при недоступной БД: стандартный список городов
+FALLBACK_CITY_SLUGS = [
+    'moskva', 'sankt-peterburg', 'kazan', 'ekaterinburg', 'novosibirsk',
+    'nizhniy-novgorod', 'chelyabinsk', 'samara', 'omsk', 'rostov-na-donu',
+    'ufa', 'krasnoyarsk', 'perm', 'voronezh', 'volgograd', 'krasnodar',
+    'sochi', 'tyumen', 'barnaul', 'vladivostok', 'irkutsk'
+]
+
+
+def get_header(event: dict, name: str):
+    '''Заголовок запроса без учёта регистра'''
+    headers = event.get('headers') or {}
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def escape(value: str) -> str:
+    return (value or '').replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+
+def first_image(image_url: str):
+    '''Первое изображение объекта: image_url может быть JSON-массивом или строкой'''
+    if not image_url:
+        return None
+    try:
+        images = json.loads(image_url)
+        if isinstance(images, list) and images:
+            image = images[0]
+        elif isinstance(images, str):
+            image = images
+        else:
+            image = None
+    except Exception:
+        image = image_url
+    if isinstance(image, str) and image.startswith('http'):
+        return image
+    return None
+
+
+def write_url(out: StringIO, loc: str, lastmod: str, changefreq: str, priority: str,
+              image: str = None, image_title: str = None):
+    out.write('  <url>\n')
+    out.write(f'    <loc>{escape(loc)}</loc>\n')
+    out.write(f'    <lastmod>{lastmod}</lastmod>\n')
+    out.write(f'    <changefreq>{changefreq}</changefreq>\n')
+    out.write(f'    <priority>{priority}</priority>\n')
+    if image:
+        out.write('    <image:image>\n')
+        out.write(f'      <image:loc>{escape(image)}</image:loc>\n')
+        out.write(f'      <image:title>{escape(image_title)}</image:title>\n')
+        out.write('    </image:image>\n')
+    out.write('  </url>\n')
+
+
+def city_slugs(city_names) -> list:
+    slugs = []
+    for city_name in city_names:
+        slug = CITY_SLUGS.get(city_name)
+        if slug and slug not in slugs:
+            slugs.append(slug)
+    return slugs
+
+
+def write_main_urls(out: StringIO, slugs: list, today: str):
+    '''Главная и страницы городов'''
+    write_url(out, f'{BASE_URL}/', today, 'daily', '1.0')
+    for city_slug in slugs:
+        write_url(out, f'{BASE_URL}/city/{city_slug}', today, 'weekly', '0.9')
+
+
+def write_listing_urls(conn, out: StringIO, today: str, city: str = None, page: int = 1):
+    '''Страницы объявлений: строки читаются серверным курсором порциями, а не целиком'''
+    condition = VISIBLE_CONDITION
+    params = []
+    if city is not None:
+        condition += ' AND city = %s'
+        params.append(city)
+    params.extend([MAX_URLS_PER_FILE, (page - 1) * MAX_URLS_PER_FILE])
+
+    cursor = conn.cursor(name='sitemap_listings')
+    cursor.itersize = STREAM_BATCH
+    cursor.execute(f"""
+        SELECT id, image_url, title, updated_at
+        FROM listings
+        WHERE {condition}
+        ORDER BY id
+        LIMIT %s OFFSET %s
+    """, params)
+    for listing_id, image_url, title, updated_at in cursor:
+        lastmod = updated_at.strftime('%Y-%m-%d') if updated_at else today
+        write_url(out, f'{BASE_URL}/listing/{listing_id}', lastmod, 'weekly', '0.8',
+                  first_image(image_url), title)
+    cursor.close()
+
+
+def city_versions(cur) -> list:
+    '''[(city, count, max updated_at)] — по ним строится индекс и проверяется свежесть кэша'''
+    cur.execute(f"""
+        SELECT city, COUNT(*), MAX(updated_at)
+        FROM listings
+        WHERE {VISIBLE_CONDITION} AND city IS NOT NULL
+        GROUP BY city
+        ORDER BY city
+    """)
+    return cur.fetchall()
+
+
+def child_url(city: str, page: int) -> str:
+    return f'{SITEMAP_URL}?part=listings&city={quote(city)}&page={page}'
+
+
+def build_index(cities: list, today: str) -> str:
+    out = StringIO()
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    out.write('<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+    out.write(f'  <sitemap>\n    <loc>{escape(SITEMAP_URL + "?part=main")}</loc>\n    <lastmod>{today}</lastmod>\n  </sitemap>\n')
+    for city, count, updated_at in cities:
+        lastmod = updated_at.strftime('%Y-%m-%d') if updated_at else today
+        pages = max(1, -(-count // MAX_URLS_PER_FILE))
+        for page in range(1, pages + 1):
+            out.write(f'  <sitemap>\n    <loc>{escape(child_url(city, page))}</loc>\n    <lastmod>{lastmod}</lastmod>\n  </sitemap>\n')
+    out.write('</sitemapindex>')
+    return out.getvalue()
+
+
+def cached_file(conn, key: str, version: str, build) -> dict:
+    '''Готовый файл из sitemap_files; пересобирается, если изменилась версия источника'''
+    cur = conn.cursor()
+    cur.execute("SELECT body, body_gzip FROM sitemap_files WHERE key = %s AND version = %s", (key, version))
+    row = cur.fetchone()
+    if row:
+        cur.close()
+        return {'body': row[0], 'body_gzip': bytes(row[1])}
+
+    body = build()
+    body_gzip = gzip.compress(body.encode('utf-8'))
+    cur.execute("""
+        INSERT INTO sitemap_files (key, version, body, body_gzip, built_at)
+        VALUES (%s, %s, %s, %s, NOW())
+        ON CONFLICT (key) DO UPDATE
+        SET version = EXCLUDED.version, body = EXCLUDED.body,
+            body_gzip = EXCLUDED.body_gzip, built_at = EXCLUDED.built_at
+    """, (key, version, body, body_gzip))
+    conn.commit()
+    cur.close()
+    return {'body': body, 'body_gzip': body_gzip}
+
+
+def version_of(cities: list) -> str:
+    return ';'.join(f'{city}:{count}:{updated_at}' for city, count, updated_at in cities)
+
+
+def xml_response(event: dict, result: dict) -> dict:
+    headers = {
+        'Content-Type': 'application/xml; charset=utf-8',
+        'Access-Control-Allow-Origin': '*',
+        'Cache-Control': 'public, max-age=3600',
+        'Vary': 'Accept-Encoding',
+        'X-Robots-Tag': 'noindex'
+    }
+    if 'gzip' in (get_header(event, 'Accept-Encoding') or '') and result.get('body_gzip'):
+        headers['Content-Encoding'] = 'gzip'
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': base64.b64encode(result['body_gzip']).decode('ascii'),
+            'isBase64Encoded': True
+        }
+    return {'statusCode': 200, 'headers': headers, 'body': result['body'], 'isBase64Encoded': False}
 
 
 def handler(event: dict, context) -> dict:
-    """Генерация sitemap.xml для всех страниц сайта с поддержкой image:image для Яндекса"""
+    """Генерация sitemap.xml для всех страниц сайта с поддержкой image:image для Яндекса.
+    ?index=1 — индекс sitemap; ?part=main — главная и города; ?part=listings&city=&page= — объявления города.
+    Без параметров — один файл, пока объявлений меньше лимита, иначе индекс."""
 
     method = event.get('httpMethod', 'GET')
 
@@ -19,182 +273,96 @@ def handler(event: dict, context) -> dict:
             'body': ''
         }
 
+    params = event.get('queryStringParameters') or {}
+    part = params.get('part')
+    today = datetime.now().strftime('%Y-%m-%d')
+
     try:
-        listings = []
-        city_slugs = []
+        try:
+            page = int(params.get('page') or 1)
+            if page < 1:
+                raise ValueError
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Invalid page'})
+            }
 
+        conn = None
         try:
-            import psycopg2
+            from _common.db import get_db_connection
             dsn = os.environ.get('DATABASE_URL')
             if dsn:
-                conn = psycopg2.connect(dsn)
+                conn = get_db_connection(dsn)
                 cursor = conn.cursor()
-
-                # Получаем объявления с изображениями (moderation_status, не status)
-                cursor.execute("""
-                    SELECT id, city, image_url, title, updated_at
-                    FROM listings
-                    WHERE is_archived = false
-                    AND (moderation_status IS NULL OR moderation_status = 'approved')
-                    ORDER BY updated_at DESC
-                """)
-                listings = cursor.fetchall()
-
-                # Получаем уникальные города из БД для динамического sitemap
-                cursor.execute("""
-                    SELECT DISTINCT city
-                    FROM listings
-                    WHERE is_archived = false
-                    AND (moderation_status IS NULL OR moderation_status = 'approved')
-                    ORDER BY city
-                """)
-                db_cities = [row[0] for row in cursor.fetchall() if row[0]]
-
+                cities = city_versions(cursor)
                 cursor.close()
+        except Exception as db_error:
+            print(f'DB connection failed: {db_error}')
+            if conn:
                 conn.close()
+            conn = None
 
-                # Конвертируем название города в slug
-                city_slug_map = {
-                    'Москва': 'moskva',
-                    'Санкт-Петербург': 'sankt-peterburg',
-                    'Казань': 'kazan',
-                    'Екатеринбург': 'ekaterinburg',
-                    'Новосибирск': 'novosibirsk',
-                    'Нижний Новгород': 'nizhniy-novgorod',
-                    'Челябинск': 'chelyabinsk',
-                    'Самара': 'samara',
-                    'Омск': 'omsk',
-                    'Ростов-на-Дону': 'rostov-na-donu',
-                    'Уфа': 'ufa',
-                    'Красноярск': 'krasnoyarsk',
-                    'Пермь': 'perm',
-                    'Воронеж': 'voronezh',
-                    'Волгоград': 'volgograd',
-                    'Краснодар': 'krasnodar',
-                    'Сочи': 'sochi',
-                    'Тюмень': 'tyumen',
-                    'Барнаул': 'barnaul',
-                    'Владивосток': 'vladivostok',
-                    'Иркутск': 'irkutsk',
-                    'Хабаровск': 'khabarovsk',
-                    'Тольятти': 'tolyatti',
-                    'Ижевск': 'izhevsk',
-                    'Ярославль': 'yaroslavl',
-                    'Астрахань': 'astrakhan',
-                    'Оренбург': 'orenburg',
-                    'Новокузнецк': 'novokuznetsk',
-                    'Томск': 'tomsk',
-                    'Кемерово': 'kemerovo',
-                    'Рязань': 'ryazan',
-                    'Набережные Челны': 'naberezhnye-chelny',
-                    'Пенза': 'penza',
-                    'Чебоксары': 'cheboksary',
-                    'Калининград': 'kaliningrad',
-                    'Белгород': 'belgorod',
-                    'Тула': 'tula',
-                    'Курск': 'kursk',
-                    'Брянск': 'bryansk',
-                    'Улан-Удэ': 'ulan-ude',
-                    'Тверь': 'tver',
-                    'Магнитогорск': 'magnitogorsk',
-                    'Чита': 'chita',
-                    'Нижний Тагил': 'nizhniy-tagil',
-                    'Вологда': 'vologda',
-                    'Архангельск': 'arkhangelsk',
-                    'Смоленск': 'smolensk',
-                    'Саратов': 'saratov',
-                    'Сургут': 'surgut',
-                    'Ставрополь': 'stavropol',
-                }
-
-                seen_slugs = set()
-                for city_name in db_cities:
-                    slug = city_slug_map.get(city_name)
-                    if slug and slug not in seen_slugs:
-                        city_slugs.append(slug)
-                        seen_slugs.add(slug)
+        if conn is None:
+            # Без БД — только главная и стандартный список городов
+            out = StringIO()
+            out.write(XML_HEADER)
+            write_main_urls(out, FALLBACK_CITY_SLUGS, today)
+            out.write('</urlset>')
+            return xml_response(event, {'body': out.getvalue()})
 
-        except Exception as db_error:
-            print(f'DB connection failed: {db_error}')
-            # Fallback: стандартный список городов
-            city_slugs = [
-                'moskva', 'sankt-peterburg', 'kazan', 'ekaterinburg', 'novosibirsk',
-                'nizhniy-novgorod', 'chelyabinsk', 'samara', 'omsk', 'rostov-na-donu',
-                'ufa', 'krasnoyarsk', 'perm', 'voronezh', 'volgograd', 'krasnodar',
-                'sochi', 'tyumen', 'barnaul', 'vladivostok', 'irkutsk'
-            ]
-
-        base_url = "https://120minut.ru"
-        today = datetime.now().strftime('%Y-%m-%d')
-
-        xml_content = '<?xml version="1.0" encoding="UTF-8"?>\n'
-        xml_content += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"\n'
-        xml_content += '        xmlns:image="http://www.google.com/schemas/sitemap-image/1.1"\n'
-        xml_content += '        xmlns:xhtml="http://www.w3.org/1999/xhtml">\n'
-
-        # Главная страница
-        xml_content += '  <url>\n'
-        xml_content += f'    <loc>{base_url}/</loc>\n'
-        xml_content += f'    <lastmod>{today}</lastmod>\n'
-        xml_content += '    <changefreq>daily</changefreq>\n'
-        xml_content += '    <priority>1.0</priority>\n'
-        xml_content += '  </url>\n'
-
-        # Страницы городов
-        for city_slug in city_slugs:
-            xml_content += '  <url>\n'
-            xml_content += f'    <loc>{base_url}/city/{city_slug}</loc>\n'
-            xml_content += f'    <lastmod>{today}</lastmod>\n'
-            xml_content += '    <changefreq>weekly</changefreq>\n'
-            xml_content += '    <priority>0.9</priority>\n'
-            xml_content += '  </url>\n'
-
-        # Страницы объявлений с изображениями
-        for listing in listings:
-            listing_id, city, image_url, title, updated_at = listing
-            lastmod = updated_at.strftime('%Y-%m-%d') if updated_at else today
-
-            xml_content += '  <url>\n'
-            xml_content += f'    <loc>{base_url}/listing/{listing_id}</loc>\n'
-            xml_content += f'    <lastmod>{lastmod}</lastmod>\n'
-            xml_content += '    <changefreq>weekly</changefreq>\n'
-            xml_content += '    <priority>0.8</priority>\n'
-
-            # Добавляем изображение если есть
-            if image_url:
-                # image_url может быть JSON-массивом
-                first_image = None
-                try:
-                    import json as _json
-                    images = _json.loads(image_url)
-                    if isinstance(images, list) and images:
-                        first_image = images[0]
-                    elif isinstance(images, str):
-                        first_image = images
-                except Exception:
-                    first_image = image_url
-
-                if first_image and first_image.startswith('http'):
-                    safe_title = (title or '').replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
-                    xml_content += '    <image:image>\n'
-                    xml_content += f'      <image:loc>{first_image}</image:loc>\n'
-                    xml_content += f'      <image:title>{safe_title}</image:title>\n'
-                    xml_content += '    </image:image>\n'
-
-            xml_content += '  </url>\n'
-
-        xml_content += '</urlset>'
+        try:
+            slugs = city_slugs(city for city, _, _ in cities)
+            total = sum(count for _, count, _ in cities)
 
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/xml; charset=utf-8',
-                'Access-Control-Allow-Origin': '*',
-                'Cache-Control': 'public, max-age=3600',
-                'X-Robots-Tag': 'noindex'
-            },
-            'body': xml_content
-        }
+            def build_main():
+                out = StringIO()
+                out.write(XML_HEADER)
+                write_main_urls(out, slugs, today)
+                out.write('</urlset>')
+                return out.getvalue()
+
+            if part == 'main':
+                result = cached_file(conn, 'main', f'{today}|{",".join(slugs)}', build_main)
+
+            elif part == 'listings':
+                city = params.get('city') or ''
+                matched = [c for c in cities if c[0] == city]
+                if not matched or (page - 1) * MAX_URLS_PER_FILE >= matched[0][1]:
+                    return {
+                        'statusCode': 404,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Sitemap not found'})
+                    }
+
+                def build_listings():
+                    out = StringIO()
+                    out.write(XML_HEADER)
+                    write_listing_urls(conn, out, today, city, page)
+                    out.write('</urlset>')
+                    return out.getvalue()
+
+                result = cached_file(conn, f'listings:{city}:{page}', version_of(matched), build_listings)
+
+            elif params.get('index') or total + len(slugs) + 1 > MAX_URLS_PER_FILE:
+                body = build_index(cities, today)
+                result = {'body': body, 'body_gzip': gzip.compress(body.encode('utf-8'))}
+
+            else:
+                def build_full():
+                    out = StringIO()
+                    out.write(XML_HEADER)
+                    write_main_urls(out, slugs, today)
+                    write_listing_urls(conn, out, today)
+                    out.write('</urlset>')
+                    return out.getvalue()
+
+                result = cached_file(conn, 'full', f'{today}|{version_of(cities)}', build_full)
+        finally:
+            conn.close()
+
+        return xml_response(event, result)
 
     except Exception as e:
         return {
@@ -1,7 +1,110 @@
 import json
 import os
-import psycopg2
+import time
 from datetime import datetime, timedelta
+from psycopg2.extras import execute_values
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.stats_rollups import SCOPES, apply_daily_deltas_sql, stats_for_range
+
+MAX_BATCH_EVENTS = 500
+FLUSH_INTERVAL_SECONDS = 60
+FLUSH_CHUNK = 5000
+
+COUNTER_COLUMNS = ('views', 'clicks', 'phone_clicks', 'telegram_clicks')
+
+# Время последнего переноса staging -> listing_statistics в этом контейнере
+_last_flush_at = 0.0
+
+
+def event_deltas(action: str, click_type: str = 'general') -> dict:
+    '''Приращения счётчиков для одного события view/click'''
+    if action == 'view':
+        return {'views': 1}
+    if action == 'click':
+        deltas = {'clicks': 1}
+        if click_type == 'phone':
+            deltas['phone_clicks'] = 1
+        elif click_type == 'telegram':
+            deltas['telegram_clicks'] = 1
+        return deltas
+    raise ValueError(f'Unknown action: {action}')
+
+
+def coalesce_events(events: list, today) -> dict:
+    '''Сложить события пачки в дельты по (listing_id, date)'''
+    totals = {}
+    for event in events:
+        listing_id = int(event['listing_id'])
+        deltas = event_deltas(event.get('action'), event.get('click_type', 'general'))
+        row = totals.setdefault((listing_id, today), dict.fromkeys(COUNTER_COLUMNS, 0))
+        for column, value in deltas.items():
+            row[column] += value
+    return totals
+
+
+def stage_deltas(cur, totals: dict):
+    '''Дописать дельты в append-only staging: без ON CONFLICT и блокировок горячих строк'''
+    rows = [
+        (listing_id, date, row['views'], row['clicks'], row['phone_clicks'], row['telegram_clicks'])
+        for (listing_id, date), row in totals.items()
+    ]
+    execute_values(cur, """
+        INSERT INTO listing_statistics_staging
+            (listing_id, date, views, clicks, phone_clicks, telegram_clicks)
+        VALUES %s
+    """, rows)
+
+
+def flush_staging(cur, limit: int = FLUSH_CHUNK) -> int:
+    '''Перенести порцию staging в listing_statistics агрегированными дельтами.
+
+    Строки забираются через SKIP LOCKED, поэтому параллельные flush не мешают друг другу.
+    Те же дельты в том же запросе добавляются в недельные и месячные агрегаты.
+    '''
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM listing_statistics_staging
+            WHERE id IN (
+                SELECT id FROM listing_statistics_staging
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING listing_id, date, views, clicks, phone_clicks, telegram_clicks
+        ), aggregated AS (
+            INSERT INTO listing_statistics (listing_id, date, views, clicks, phone_clicks, telegram_clicks)
+            SELECT listing_id, date, SUM(views), SUM(clicks), SUM(phone_clicks), SUM(telegram_clicks)
+            FROM moved
+            GROUP BY listing_id, date
+            ORDER BY listing_id, date
+            ON CONFLICT (listing_id, date)
+            DO UPDATE SET views = listing_statistics.views + EXCLUDED.views,
+                          clicks = listing_statistics.clicks + EXCLUDED.clicks,
+                          phone_clicks = listing_statistics.phone_clicks + EXCLUDED.phone_clicks,
+                          telegram_clicks = listing_statistics.telegram_clicks + EXCLUDED.telegram_clicks
+            RETURNING 1
+        ), {apply_daily_deltas_sql('moved')}
+        SELECT (SELECT COUNT(*) FROM moved) AS moved_rows
+    """, (limit,))
+    return cur.fetchone()[0]
+
+
+def maybe_flush(conn, cur):
+    '''Периодический flush из тёплого контейнера, не чаще FLUSH_INTERVAL_SECONDS'''
+    global _last_flush_at
+    now = time.monotonic()
+    if now - _last_flush_at < FLUSH_INTERVAL_SECONDS:
+        return
+    _last_flush_at = now
+    try:
+        flush_staging(cur)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f'[WARN] statistics flush failed: {e}')
+
 
 def handler(event: dict, context) -> dict:
     '''API для сбора и получения статистики просмотров объявлений'''
@@ -19,7 +122,7 @@ def handler(event: dict, context) -> dict:
             'body': ''
         }
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = get_db_connection()
     cur = conn.cursor()
     
     try:
@@ -28,72 +131,114 @@ def handler(event: dict, context) -> dict:
             action = body.get('action')
             listing_id = body.get('listing_id')
             
-            if not listing_id:
+            # Пакетная отправка: {action: 'batch', events: [{listing_id, action, click_type}]}
+            if action == 'batch':
+                events = body.get('events') or []
+                if not isinstance(events, list) or len(events) > MAX_BATCH_EVENTS:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': f'events must be a list of at most {MAX_BATCH_EVENTS} items'})
+                    }
+                try:
+                    totals = coalesce_events(events, datetime.now().date())
+                except (KeyError, TypeError, ValueError) as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': f'Invalid event: {e}'})
+                    }
+                if totals:
+                    stage_deltas(cur, totals)
+                    conn.commit()
+                maybe_flush(conn, cur)
+                
                 return {
-                    'statusCode': 400,
+                    'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'listing_id required'})
+                    'body': json.dumps({'success': True, 'accepted': len(events)})
                 }
             
-            today = datetime.now().date()
-            
-            if action == 'view':
-                cur.execute("""
-                    INSERT INTO listing_statistics (listing_id, date, views)
-                    VALUES (%s, %s, 1)
-                    ON CONFLICT (listing_id, date) 
-                    DO UPDATE SET views = listing_statistics.views + 1
-                """, (listing_id, today))
-                conn.commit()
+            # Перенос накопленных событий в listing_statistics (по расписанию, см. CRON_SETUP.md)
+            if action == 'flush':
+                cron_secret = (event.get('headers') or {}).get('X-Authorization', '')
+                expected_secret = os.environ.get('CRON_SECRET', '')
+                if not expected_secret or cron_secret != f'Bearer {expected_secret}':
+                    return {
+                        'statusCode': 401,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Unauthorized'})
+                    }
+                
+                moved = 0
+                while True:
+                    chunk = flush_staging(cur)
+                    conn.commit()
+                    moved += chunk
+                    if chunk < FLUSH_CHUNK:
+                        break
                 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True})
+                    'body': json.dumps({'success': True, 'flushed_rows': moved})
                 }
             
-            elif action == 'click':
-                click_type = body.get('click_type', 'general')
-                
-                if click_type == 'phone':
-                    cur.execute("""
-                        INSERT INTO listing_statistics (listing_id, date, clicks, phone_clicks)
-                        VALUES (%s, %s, 1, 1)
-                        ON CONFLICT (listing_id, date) 
-                        DO UPDATE SET clicks = listing_statistics.clicks + 1,
-                                      phone_clicks = listing_statistics.phone_clicks + 1
-                    """, (listing_id, today))
-                elif click_type == 'telegram':
-                    cur.execute("""
-                        INSERT INTO listing_statistics (listing_id, date, clicks, telegram_clicks)
-                        VALUES (%s, %s, 1, 1)
-                        ON CONFLICT (listing_id, date) 
-                        DO UPDATE SET clicks = listing_statistics.clicks + 1,
-                                      telegram_clicks = listing_statistics.telegram_clicks + 1
-                    """, (listing_id, today))
-                else:
-                    cur.execute("""
-                        INSERT INTO listing_statistics (listing_id, date, clicks)
-                        VALUES (%s, %s, 1)
-                        ON CONFLICT (listing_id, date) 
-                        DO UPDATE SET clicks = listing_statistics.clicks + 1
-                    """, (listing_id, today))
-                
-                conn.commit()
-                
+            if not listing_id:
                 return {
-                    'statusCode': 200,
+                    'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True})
+                    'body': json.dumps({'error': 'listing_id required'})
                 }
             
-            else:
+            if action not in ('view', 'click'):
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'body': json.dumps({'error': 'Unknown action'})
                 }
+            
+            # Одиночное событие идёт тем же путём, что и пачка из одного события
+            totals = coalesce_events(
+                [{'listing_id': listing_id, 'action': action, 'click_type': body.get('click_type', 'general')}],
+                datetime.now().date()
+            )
+            stage_deltas(cur, totals)
+            conn.commit()
+            maybe_flush(conn, cur)
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': True})
+            }
         
+        elif method == 'GET' and (event.get('queryStringParameters') or {}).get('scope'):
+            # Произвольный период по объекту, владельцу или городу из агрегатов:
+            # ?scope=listing|owner|city&id=...&from=YYYY-MM-DD&to=YYYY-MM-DD
+            params = event.get('queryStringParameters') or {}
+            try:
+                scope = params['scope']
+                if scope not in SCOPES:
+                    raise ValueError(f'scope должен быть одним из: {", ".join(SCOPES)}')
+                if not params.get('id'):
+                    raise ValueError('id required')
+                end = datetime.strptime(params['to'], '%Y-%m-%d').date() if params.get('to') else datetime.now().date()
+                start = datetime.strptime(params['from'], '%Y-%m-%d').date() if params.get('from') else end - timedelta(days=29)
+                result = stats_for_range(cur, scope, params['id'], start, end)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e)})
+                }
+
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(result, default=str)
+            }
+
         elif method == 'GET':
             listing_id = event.get('queryStringParameters', {}).get('listing_id')
             days = int(event.get('queryStringParameters', {}).get('days', 30))
@@ -107,12 +252,21 @@ def handler(event: dict, context) -> dict:
             
             start_date = datetime.now().date() - timedelta(days=days)
             
+            # Ещё не перенесённые из staging события тоже учитываются
             cur.execute("""
-                SELECT date, views, clicks, phone_clicks, telegram_clicks
-                FROM listing_statistics
-                WHERE listing_id = %s AND date >= %s
+                SELECT date, SUM(views)::int, SUM(clicks)::int, SUM(phone_clicks)::int, SUM(telegram_clicks)::int
+                FROM (
+                    SELECT date, views, clicks, phone_clicks, telegram_clicks
+                    FROM listing_statistics
+                    WHERE listing_id = %s AND date >= %s
+                    UNION ALL
+                    SELECT date, views, clicks, phone_clicks, telegram_clicks
+                    FROM listing_statistics_staging
+                    WHERE listing_id = %s AND date >= %s
+                ) s
+                GROUP BY date
                 ORDER BY date DESC
-            """, (listing_id, start_date))
+            """, (listing_id, start_date, listing_id, start_date))
             
             stats = []
             total_views = 0
@@ -1,8 +1,11 @@
 """API для работы с историей отправки статистических отчётов владельцам"""
 import json
 import os
-import psycopg2
 from datetime import datetime
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.stats_rollups import stats_for_range
 
 def handler(event: dict, context) -> dict:
     method = event.get('httpMethod', 'GET')
@@ -27,7 +30,7 @@ def handler(event: dict, context) -> dict:
         }
     
     dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_db_connection(dsn)
     cur = conn.cursor()
     
     try:
@@ -112,6 +115,10 @@ def handler(event: dict, context) -> dict:
             period_end = datetime.now()
             period_start = datetime(period_end.year, period_end.month, 1)
             
+            # Без присланных данных отчёт собирается из агрегатов статистики
+            if not stats_data:
+                stats_data = stats_for_range(cur, 'listing', listing_id, period_start.date(), period_end.date())['totals']
+            
             cur.execute("""
                 INSERT INTO t_p39732784_hourly_rentals_platf.stats_reports 
                 (listing_id, sent_by_admin_id, sent_to_email, report_period_start, report_period_end, stats_data)
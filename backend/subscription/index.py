@@ -1,8 +1,11 @@
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.db import get_db_connection
+from _common.subscription_events import schedule_expiry
 
 SUBSCRIPTION_PRICES = {
     'hotel': 2000,  # 2000₽/месяц для отелей
@@ -30,7 +33,7 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
@@ -156,6 +159,7 @@ def handler(event: dict, context) -> dict:
                     SET subscription_expires_at = %s, is_archived = %s
                     WHERE id = %s
                 """, (new_expires_at, days == 0, listing_id))
+                schedule_expiry(cur, [listing_id])
                 
                 conn.commit()
                 
@@ -241,6 +245,7 @@ def handler(event: dict, context) -> dict:
                     SET subscription_expires_at = %s, is_archived = FALSE
                     WHERE id = %s
                 """, (new_expires_at, listing_id))
+                schedule_expiry(cur, [listing_id])
                 
                 cur.execute("""
                     INSERT INTO transactions (owner_id, amount, type, description, balance_after)
@@ -1,12 +1,16 @@
 import json
 import base64
-import uuid
 import os
-import boto3
 from typing import Dict, Any
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from _common.images import get_s3, upload_image
+from _common.uploads import handle_upload_action
+
 
 def handler(event: Dict[str, Any], context) -> Dict[str, Any]:
-    '''Загружает изображение в S3 хранилище и возвращает публичный URL'''
+    '''Загружает изображение в S3 вместе с уменьшенными копиями (WebP/AVIF) и возвращает URL оригинала, копии и LQIP.
+    Для больших файлов — action=presign/complete/abort: файл грузится клиентом напрямую в хранилище.'''
     
     method = event.get('httpMethod', 'POST')
     
@@ -33,6 +37,18 @@ def handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     
     try:
         body = json.loads(event.get('body', '{}'))
+        
+        # Прямая загрузка в хранилище: presign -> PUT/multipart с клиента -> complete
+        handled = handle_upload_action(body)
+        if handled:
+            status, payload = handled
+            return {
+                'statusCode': status,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(payload),
+                'isBase64Encoded': False
+            }
+        
         image_base64 = body.get('image')
         filename = body.get('filename', 'image.jpg')
         
@@ -50,36 +66,18 @@ def handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         image_data = base64.b64decode(image_base64)
         
         file_extension = filename.split('.')[-1] if '.' in filename else 'jpg'
-        unique_filename = f"listings/{uuid.uuid4()}.{file_extension}"
-        
-        content_type_map = {
-            'jpg': 'image/jpeg',
-            'jpeg': 'image/jpeg',
-            'png': 'image/png',
-            'gif': 'image/gif',
-            'webp': 'image/webp'
-        }
-        content_type = content_type_map.get(file_extension.lower(), 'image/jpeg')
-        
-        s3 = boto3.client('s3',
-            endpoint_url='https://bucket.poehali.dev',
-            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
-            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
-        )
-        
-        s3.put_object(
-            Bucket='files',
-            Key=unique_filename,
-            Body=image_data,
-            ContentType=content_type
-        )
         
-        cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{unique_filename}"
+        image = upload_image(get_s3(), image_data, file_extension)
         
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'url': cdn_url}),
+            'body': json.dumps({
+                'url': image['url'],
+                'variants': image['variants'],
+                'lqip': image['lqip'],
+                'duplicate': image['duplicate']
+            }),
             'isBase64Encoded': False
         }
         
@@ -0,0 +1,20 @@
+-- Материализованные снимки публичного каталога (public-listings)
+CREATE TABLE IF NOT EXISTS t_p39732784_hourly_rentals_platf.catalog_snapshots (
+    scope VARCHAR(255) PRIMARY KEY,
+    city VARCHAR(255),
+    etag VARCHAR(64) NOT NULL,
+    body BYTEA NOT NULL,
+    body_gzip BYTEA NOT NULL,
+    listings_count INTEGER NOT NULL DEFAULT 0,
+    version BIGINT NOT NULL DEFAULT 0,
+    is_stale BOOLEAN NOT NULL DEFAULT FALSE,
+    built_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_catalog_snapshots_city
+    ON t_p39732784_hourly_rentals_platf.catalog_snapshots(city);
+
+COMMENT ON TABLE t_p39732784_hourly_rentals_platf.catalog_snapshots IS 'Готовые JSON/gzip снимки каталога по городам и общий (scope = all)';
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.catalog_snapshots.scope IS 'all или city:<LOWER(city)>';
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.catalog_snapshots.version IS 'Увеличивается при каждой инвалидации, защищает от потери инвалидации во время пересборки';
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.catalog_snapshots.is_stale IS 'Снимок нужно пересобрать при следующем чтении';
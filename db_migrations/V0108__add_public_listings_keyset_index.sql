@@ -0,0 +1,8 @@
+-- Индекс для постраничной выдачи public-listings (keyset по city, auction, id)
+CREATE INDEX IF NOT EXISTS idx_listings_public_order
+    ON t_p39732784_hourly_rentals_platf.listings (city, (COALESCE(auction, 999)), id)
+    WHERE is_archived = false AND (moderation_status IS NULL OR moderation_status = 'approved');
+
+CREATE INDEX IF NOT EXISTS idx_listings_public_city_lower
+    ON t_p39732784_hourly_rentals_platf.listings (LOWER(city))
+    WHERE is_archived = false AND (moderation_status IS NULL OR moderation_status = 'approved');
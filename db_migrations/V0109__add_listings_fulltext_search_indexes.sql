@@ -0,0 +1,16 @@
+-- Полнотекстовый поиск по объектам (search-listings) с русской морфологией.
+-- Выражение индекса должно совпадать с SEARCH_DOCUMENT в backend/search-listings
+CREATE INDEX IF NOT EXISTS idx_listings_search_document
+    ON t_p39732784_hourly_rentals_platf.listings USING GIN ((
+        setweight(to_tsvector('russian', COALESCE(title, '')), 'A') ||
+        setweight(to_tsvector('russian', COALESCE(district, '') || ' ' || COALESCE(metro, '')), 'B') ||
+        setweight(to_tsvector('russian', COALESCE(address, '')), 'C') ||
+        setweight(to_tsvector('russian', COALESCE(description, '')), 'D')
+    ));
+
+CREATE INDEX IF NOT EXISTS idx_metro_stations_search
+    ON t_p39732784_hourly_rentals_platf.metro_stations USING GIN (to_tsvector('russian', COALESCE(station_name, '')));
+
+-- Фильтр по удобствам номеров (features @> ARRAY[...])
+CREATE INDEX IF NOT EXISTS idx_rooms_features
+    ON t_p39732784_hourly_rentals_platf.rooms USING GIN (features);
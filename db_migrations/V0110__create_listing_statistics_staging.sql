@@ -0,0 +1,17 @@
+-- Append-only буфер событий просмотров/кликов. statistics пишет сюда без
+-- ON CONFLICT, а flush периодически переносит агрегированные дельты в listing_statistics
+CREATE TABLE IF NOT EXISTS listing_statistics_staging (
+    id BIGSERIAL PRIMARY KEY,
+    listing_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    views INTEGER NOT NULL DEFAULT 0,
+    clicks INTEGER NOT NULL DEFAULT 0,
+    phone_clicks INTEGER NOT NULL DEFAULT 0,
+    telegram_clicks INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_listing_statistics_staging_listing
+    ON listing_statistics_staging(listing_id, date);
+
+COMMENT ON TABLE listing_statistics_staging IS 'Неагрегированные дельты статистики объектов до переноса в listing_statistics';
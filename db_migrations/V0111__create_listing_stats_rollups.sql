@@ -0,0 +1,39 @@
+-- Недельные (с понедельника) и месячные агрегаты статистики объектов.
+-- Поддерживаются инкрементально: statistics при flush staging, route-call при звонке
+CREATE TABLE IF NOT EXISTS listing_stats_rollups (
+    listing_id INTEGER NOT NULL,
+    period VARCHAR(10) NOT NULL CHECK (period IN ('week', 'month')),
+    period_start DATE NOT NULL,
+    views INTEGER NOT NULL DEFAULT 0,
+    clicks INTEGER NOT NULL DEFAULT 0,
+    phone_clicks INTEGER NOT NULL DEFAULT 0,
+    telegram_clicks INTEGER NOT NULL DEFAULT 0,
+    calls INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (listing_id, period, period_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_listing_stats_rollups_period
+    ON listing_stats_rollups(period, period_start);
+
+-- Заполнение из накопленных дневных строк и истории звонков
+INSERT INTO listing_stats_rollups
+    (listing_id, period, period_start, views, clicks, phone_clicks, telegram_clicks, calls)
+SELECT listing_id, period, period_start,
+       SUM(views), SUM(clicks), SUM(phone_clicks), SUM(telegram_clicks), SUM(calls)
+FROM (
+    SELECT s.listing_id, p.period, date_trunc(p.period, s.date)::date AS period_start,
+           s.views, s.clicks, s.phone_clicks, s.telegram_clicks, 0 AS calls
+    FROM listing_statistics s
+    CROSS JOIN (VALUES ('week'), ('month')) AS p(period)
+    UNION ALL
+    SELECT ct.listing_id, p.period, date_trunc(p.period, ct.called_at)::date,
+           0, 0, 0, 0, 1
+    FROM call_tracking ct
+    CROSS JOIN (VALUES ('week'), ('month')) AS p(period)
+    WHERE ct.called_at IS NOT NULL AND ct.listing_id IS NOT NULL
+) t
+GROUP BY listing_id, period, period_start
+ON CONFLICT (listing_id, period, period_start) DO NOTHING;
+
+COMMENT ON TABLE listing_stats_rollups IS 'Недельные и месячные суммы просмотров, кликов и звонков по объектам';
+COMMENT ON COLUMN listing_stats_rollups.calls IS 'Состоявшиеся звонки через виртуальные номера (call_tracking.called_at)';
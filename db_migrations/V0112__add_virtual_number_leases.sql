@@ -0,0 +1,16 @@
+-- Аренда виртуальных номеров: истёкшая аренда считается свободной при захвате,
+-- а номер помнит, кому выдан, чтобы тот же клиент по тому же объекту получил его снова
+ALTER TABLE virtual_numbers ADD COLUMN IF NOT EXISTS assigned_client_phone TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_virtual_numbers_sticky
+    ON virtual_numbers(assigned_listing_id, assigned_client_phone);
+
+CREATE INDEX IF NOT EXISTS idx_virtual_numbers_available
+    ON virtual_numbers(assigned_until NULLS FIRST, id)
+    WHERE is_active IS NOT FALSE;
+
+-- Метрики пула по дням считаются по call_tracking
+CREATE INDEX IF NOT EXISTS idx_call_tracking_shown_at ON call_tracking(shown_at);
+
+COMMENT ON COLUMN virtual_numbers.assigned_client_phone IS 'Клиент последней аренды номера (для повторной выдачи того же номера)';
+COMMENT ON COLUMN virtual_numbers.assigned_until IS 'Окончание аренды; после него номер свободен, даже если is_busy = TRUE';
@@ -0,0 +1,16 @@
+-- Кэш сгенерированных файлов sitemap. version — отпечаток источника
+-- (число объявлений и MAX(updated_at) по городу): при его смене файл пересобирается
+CREATE TABLE IF NOT EXISTS sitemap_files (
+    key VARCHAR(255) PRIMARY KEY,
+    version TEXT NOT NULL,
+    body TEXT NOT NULL,
+    body_gzip BYTEA NOT NULL,
+    built_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Выборка объявлений города для дочернего sitemap
+CREATE INDEX IF NOT EXISTS idx_listings_sitemap_city
+    ON listings(city, id)
+    WHERE is_archived = false;
+
+COMMENT ON TABLE sitemap_files IS 'Готовые XML-файлы sitemap (main, full, listings:<город>:<страница>) с gzip-копией';
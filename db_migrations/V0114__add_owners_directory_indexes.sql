@@ -0,0 +1,8 @@
+-- Каталог владельцев в админке: отели и их число по владельцу одним запросом
+CREATE INDEX IF NOT EXISTS idx_listings_owner_active
+    ON listings(owner_id, title)
+    WHERE is_archived = FALSE;
+
+-- Сортировка каталога по балансу и последнему входу
+CREATE INDEX IF NOT EXISTS idx_owners_balance ON owners(balance);
+CREATE INDEX IF NOT EXISTS idx_owners_last_login ON owners(last_login);
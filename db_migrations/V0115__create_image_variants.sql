@@ -0,0 +1,13 @@
+-- Уменьшенные копии загруженных фотографий (card/gallery/full в AVIF/WebP/JPEG)
+-- и LQIP-превью. Ключ — URL оригинала, как он хранится в rooms.images и listings.image_url
+CREATE TABLE IF NOT EXISTS image_variants (
+    url TEXT PRIMARY KEY,
+    width INTEGER,
+    height INTEGER,
+    lqip TEXT,
+    variants JSONB NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE image_variants IS 'Производные копии фотографий: {вариант: {width, height, avif, webp, jpeg}}';
+COMMENT ON COLUMN image_variants.lqip IS 'Размытое превью 16px как data URI';
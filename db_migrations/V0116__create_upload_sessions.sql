@@ -0,0 +1,19 @@
+-- Сессии прямой загрузки файлов в хранилище по presigned URL
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    id VARCHAR(36) PRIMARY KEY,
+    object_key TEXT NOT NULL,
+    content_type VARCHAR(50) NOT NULL,
+    size BIGINT NOT NULL,
+    multipart_id TEXT,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'completed', 'aborted', 'rejected')),
+    url TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    completed_at TIMESTAMP
+);
+
+-- Поиск брошенных незавершённых загрузок
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_pending
+    ON upload_sessions(created_at)
+    WHERE status = 'pending';
+
+COMMENT ON TABLE upload_sessions IS 'Presigned-загрузки фото: object_key — временный ключ uploads/<id>, url — итоговый адрес оригинала';
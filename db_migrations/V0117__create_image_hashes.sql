@@ -0,0 +1,24 @@
+-- Индекс дублей фотографий: SHA-256 содержимого и перцептивный хэш (dHash).
+-- dHash разбит на четыре 16-битных блока: похожие фото (расстояние Хэмминга <= 3)
+-- совпадают хотя бы в одном блоке, поэтому поиск идёт по индексам блоков
+CREATE TABLE IF NOT EXISTS image_hashes (
+    sha256 CHAR(64) PRIMARY KEY,
+    url TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    phash BIGINT,
+    phash_band1 INTEGER,
+    phash_band2 INTEGER,
+    phash_band3 INTEGER,
+    phash_band4 INTEGER,
+    uses INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_image_hashes_band1 ON image_hashes(phash_band1);
+CREATE INDEX IF NOT EXISTS idx_image_hashes_band2 ON image_hashes(phash_band2);
+CREATE INDEX IF NOT EXISTS idx_image_hashes_band3 ON image_hashes(phash_band3);
+CREATE INDEX IF NOT EXISTS idx_image_hashes_band4 ON image_hashes(phash_band4);
+
+COMMENT ON TABLE image_hashes IS 'Загруженные фото по хэшу содержимого: повторная загрузка возвращает существующий url';
+COMMENT ON COLUMN image_hashes.uses IS 'Сколько раз фото загружали (включая дубли)';
@@ -0,0 +1,42 @@
+-- Витрина личного кабинета сотрудника: агрегаты пересчитываются при записях,
+-- кабинет читается одним запросом (см. backend/_common/manager_dashboard.py)
+CREATE TABLE IF NOT EXISTS manager_dashboard (
+    admin_id INTEGER PRIMARY KEY REFERENCES admins(id),
+    om_id INTEGER,
+    um_id INTEGER,
+    om_name TEXT,
+    um_name TEXT,
+    objects_count INTEGER NOT NULL DEFAULT 0,
+    team_objects_count INTEGER NOT NULL DEFAULT 0,
+    week_tasks_completed INTEGER NOT NULL DEFAULT 0,
+    team_week_tasks_completed INTEGER NOT NULL DEFAULT 0,
+    copywriter_earnings NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    month_commission NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    total_earned NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    total_owner_payments NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP
+);
+
+-- Место в рейтинге = 1 + число строк с большим числом объектов
+CREATE INDEX IF NOT EXISTS idx_manager_dashboard_objects ON manager_dashboard(objects_count);
+CREATE INDEX IF NOT EXISTS idx_manager_dashboard_team_objects ON manager_dashboard(team_objects_count);
+
+-- Задачи за неделю считаются по выполненным задачам сотрудника
+CREATE INDEX IF NOT EXISTS idx_manager_tasks_manager_completed ON manager_tasks(manager_id, completed_at) WHERE completed = true;
+
+-- Начальное заполнение счётчиков рейтинга; остальное пересчитается при первом чтении
+-- (refreshed_at IS NULL означает устаревшую строку)
+INSERT INTO manager_dashboard (admin_id, objects_count, team_objects_count)
+SELECT a.id,
+       (SELECT COUNT(*) FROM manager_listings ml WHERE ml.manager_id = a.id),
+       (SELECT COUNT(*)
+        FROM manager_hierarchy mh
+        JOIN manager_listings ml ON ml.manager_id = mh.manager_id
+        WHERE mh.operational_manager_id = a.id)
+FROM admins a
+WHERE a.role IN ('manager', 'operational_manager', 'chief_manager')
+   OR EXISTS (SELECT 1 FROM manager_listings ml WHERE ml.manager_id = a.id)
+ON CONFLICT (admin_id) DO NOTHING;
+
+COMMENT ON TABLE manager_dashboard IS 'Агрегаты кабинета менеджера/ОМ/УМ, обновляются при взятии объектов, задачах, бонусах и комиссиях';
+COMMENT ON COLUMN manager_dashboard.refreshed_at IS 'Время пересчёта; строки старше 15 минут пересчитываются при чтении';
@@ -0,0 +1,19 @@
+-- Рейтинг менеджеров по витрине manager_dashboard: роль и всего выполненных задач
+ALTER TABLE manager_dashboard ADD COLUMN IF NOT EXISTS role TEXT;
+ALTER TABLE manager_dashboard ADD COLUMN IF NOT EXISTS tasks_completed INTEGER NOT NULL DEFAULT 0;
+
+UPDATE manager_dashboard d
+SET role = a.role,
+    tasks_completed = (SELECT COUNT(*) FROM manager_tasks mt WHERE mt.manager_id = d.admin_id AND mt.completed = true)
+FROM admins a
+WHERE a.id = d.admin_id;
+
+-- По индексу на метрику: топ-N, соседи и место — поиск и подсчёт по индексу
+CREATE INDEX IF NOT EXISTS idx_manager_dashboard_lb_objects
+    ON manager_dashboard(objects_count, admin_id) WHERE role = 'manager';
+CREATE INDEX IF NOT EXISTS idx_manager_dashboard_lb_tasks
+    ON manager_dashboard(tasks_completed, admin_id) WHERE role = 'manager';
+CREATE INDEX IF NOT EXISTS idx_manager_dashboard_lb_revenue
+    ON manager_dashboard(total_owner_payments, admin_id) WHERE role = 'manager';
+
+COMMENT ON COLUMN manager_dashboard.tasks_completed IS 'Всего выполненных задач (метрика рейтинга tasks)';
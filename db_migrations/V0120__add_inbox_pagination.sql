@@ -0,0 +1,61 @@
+-- Постраничная выдача сообщений: курсор (created_at, id) внутри получателя/отправителя/владельца
+CREATE INDEX IF NOT EXISTS idx_employee_messages_recipient_created
+    ON t_p39732784_hourly_rentals_platf.employee_messages(recipient_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_employee_messages_sender_created
+    ON t_p39732784_hourly_rentals_platf.employee_messages(sender_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_messages_owner_created
+    ON owner_manager_messages(owner_id, created_at, id);
+
+-- Диалоги сотрудников: строка на каждую сторону пары, непрочитанные — входящие этой стороны
+CREATE TABLE IF NOT EXISTS t_p39732784_hourly_rentals_platf.employee_conversations (
+    admin_id INTEGER NOT NULL,
+    peer_id INTEGER NOT NULL,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    last_message_id INTEGER NOT NULL,
+    last_message_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (admin_id, peer_id)
+);
+
+-- Диалоги владельца с менеджером: непрочитанные для каждой стороны
+CREATE TABLE IF NOT EXISTS owner_manager_conversations (
+    owner_id INTEGER NOT NULL,
+    manager_id INTEGER NOT NULL,
+    unread_by_owner INTEGER NOT NULL DEFAULT 0,
+    unread_by_manager INTEGER NOT NULL DEFAULT 0,
+    last_message_id INTEGER NOT NULL,
+    last_message_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (owner_id, manager_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_owner_manager_conversations_manager
+    ON owner_manager_conversations(manager_id, last_message_id DESC);
+
+-- Заполнение по существующим сообщениям
+INSERT INTO t_p39732784_hourly_rentals_platf.employee_conversations
+    (admin_id, peer_id, unread_count, last_message_id, last_message_at)
+SELECT admin_id, peer_id, SUM(unread), MAX(id), MAX(created_at)
+FROM (
+    SELECT recipient_id AS admin_id, sender_id AS peer_id, id, created_at,
+           CASE WHEN is_read IS NOT TRUE AND sender_id <> recipient_id THEN 1 ELSE 0 END AS unread
+    FROM t_p39732784_hourly_rentals_platf.employee_messages
+    WHERE sender_id IS NOT NULL AND recipient_id IS NOT NULL
+    UNION ALL
+    SELECT sender_id, recipient_id, id, created_at, 0
+    FROM t_p39732784_hourly_rentals_platf.employee_messages
+    WHERE sender_id IS NOT NULL AND recipient_id IS NOT NULL AND sender_id <> recipient_id
+) m
+GROUP BY admin_id, peer_id
+ON CONFLICT (admin_id, peer_id) DO NOTHING;
+
+INSERT INTO owner_manager_conversations
+    (owner_id, manager_id, unread_by_owner, unread_by_manager, last_message_id, last_message_at)
+SELECT owner_id, manager_id,
+       COUNT(*) FILTER (WHERE sender_type = 'manager' AND NOT is_read),
+       COUNT(*) FILTER (WHERE sender_type = 'owner' AND NOT is_read),
+       MAX(id), MAX(created_at)
+FROM owner_manager_messages
+GROUP BY owner_id, manager_id
+ON CONFLICT (owner_id, manager_id) DO NOTHING;
+
+COMMENT ON TABLE t_p39732784_hourly_rentals_platf.employee_conversations IS 'Диалоги сотрудников со счётчиком непрочитанных, обновляются при отправке и прочтении';
+COMMENT ON TABLE owner_manager_conversations IS 'Диалоги владельцев с менеджерами со счётчиками непрочитанных для каждой стороны';
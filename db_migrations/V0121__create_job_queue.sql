@@ -0,0 +1,56 @@
+-- Очередь фоновых задач: медленные внешние вызовы (SMTP, YandexGPT, геокодер, Exolve)
+-- выполняет воркер job-worker, а не обработчик запроса
+CREATE TABLE IF NOT EXISTS t_p39732784_hourly_rentals_platf.jobs (
+    id BIGSERIAL PRIMARY KEY,
+    kind VARCHAR(64) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    idempotency_key VARCHAR(200),
+    run_after TIMESTAMP NOT NULL DEFAULT NOW(),
+    locked_by VARCHAR(100),
+    locked_until TIMESTAMP,
+    result JSONB,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMP,
+    CONSTRAINT jobs_status_check CHECK (status IN ('queued', 'running', 'done', 'dead'))
+);
+
+-- Готовые к запуску задачи: захват воркером идёт по этому индексу
+CREATE INDEX IF NOT EXISTS idx_jobs_ready
+    ON t_p39732784_hourly_rentals_platf.jobs(run_after, id)
+    WHERE status = 'queued';
+
+-- Задачи с истёкшей арендой (воркер упал или не уложился в таймаут)
+CREATE INDEX IF NOT EXISTS idx_jobs_running_lease
+    ON t_p39732784_hourly_rentals_platf.jobs(locked_until)
+    WHERE status = 'running';
+
+-- Ключ идемпотентности уникален среди незавершённых задач: повторный запрос
+-- возвращает ту же задачу, а после завершения можно поставить новую
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_idempotency_active
+    ON t_p39732784_hourly_rentals_platf.jobs(idempotency_key)
+    WHERE status IN ('queued', 'running');
+
+-- Задачи, исчерпавшие попытки или упавшие с ошибкой данных
+CREATE TABLE IF NOT EXISTS t_p39732784_hourly_rentals_platf.jobs_dead_letter (
+    id BIGSERIAL PRIMARY KEY,
+    job_id BIGINT NOT NULL,
+    kind VARCHAR(64) NOT NULL,
+    payload JSONB NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    failed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_dead_letter_kind
+    ON t_p39732784_hourly_rentals_platf.jobs_dead_letter(kind, failed_at);
+
+COMMENT ON TABLE t_p39732784_hourly_rentals_platf.jobs IS 'Очередь фоновых задач (захват FOR UPDATE SKIP LOCKED, повторы с экспоненциальной задержкой)';
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.jobs.status IS 'queued — ждёт, running — выполняется, done — выполнена, dead — попытки исчерпаны';
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.jobs.locked_until IS 'Конец аренды воркера; после него задача снова считается свободной';
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.jobs.idempotency_key IS 'Повторная постановка с тем же ключом возвращает незавершённую задачу';
+COMMENT ON TABLE t_p39732784_hourly_rentals_platf.jobs_dead_letter IS 'Задачи, которые не удалось выполнить: для разбора и ручного перезапуска';
@@ -0,0 +1,31 @@
+-- Разреженный ключ порядка объектов в городе: перестановка меняет одну строку,
+-- новое значение берётся между соседями (шаг 1024 оставляет место для вставок)
+CREATE SEQUENCE IF NOT EXISTS t_p39732784_hourly_rentals_platf.listings_auction_rank_seq;
+
+ALTER TABLE t_p39732784_hourly_rentals_platf.listings
+    ADD COLUMN IF NOT EXISTS auction_rank BIGINT;
+
+-- Текущий порядок (auction, id) переносится в ранги с шагом 1024
+UPDATE t_p39732784_hourly_rentals_platf.listings l
+SET auction_rank = r.rn * 1024
+FROM (
+    SELECT id, ROW_NUMBER() OVER (PARTITION BY city ORDER BY COALESCE(auction, 999), id) AS rn
+    FROM t_p39732784_hourly_rentals_platf.listings
+) r
+WHERE l.id = r.id AND l.auction_rank IS NULL;
+
+-- Новый объект встаёт в конец города: база выше любых нормализованных рангов
+ALTER TABLE t_p39732784_hourly_rentals_platf.listings
+    ALTER COLUMN auction_rank SET DEFAULT (1000000000000 + nextval('t_p39732784_hourly_rentals_platf.listings_auction_rank_seq') * 1024);
+
+UPDATE t_p39732784_hourly_rentals_platf.listings
+SET auction_rank = DEFAULT
+WHERE auction_rank IS NULL;
+
+ALTER TABLE t_p39732784_hourly_rentals_platf.listings
+    ALTER COLUMN auction_rank SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_listings_city_auction_rank
+    ON t_p39732784_hourly_rentals_platf.listings(city, auction_rank, id);
+
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.listings.auction_rank IS 'Ключ порядка в городе (разреженный); auction — отображаемая позиция, пересчитывается фоновой нормализацией';
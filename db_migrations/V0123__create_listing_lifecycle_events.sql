@@ -0,0 +1,27 @@
+-- Журнал переходов жизненного цикла объекта (архивация и автопродление по
+-- истечении подписки); notified_at — уведомления владельцу/менеджеру отправлены
+CREATE TABLE IF NOT EXISTS t_p39732784_hourly_rentals_platf.listing_lifecycle_events (
+    id BIGSERIAL PRIMARY KEY,
+    listing_id INTEGER NOT NULL REFERENCES t_p39732784_hourly_rentals_platf.listings(id),
+    event VARCHAR(20) NOT NULL,
+    owner_id INTEGER,
+    manager_id INTEGER,
+    expired_at TIMESTAMP,
+    subscription_expires_at TIMESTAMP,
+    notified_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    CONSTRAINT listing_lifecycle_events_event_check CHECK (event IN ('archived', 'renewed'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_listing_lifecycle_events_listing
+    ON t_p39732784_hourly_rentals_platf.listing_lifecycle_events(listing_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_listing_lifecycle_events_created
+    ON t_p39732784_hourly_rentals_platf.listing_lifecycle_events(created_at);
+
+-- Ночная обработка берёт истёкшие подписки пачками в порядке истечения
+CREATE INDEX IF NOT EXISTS idx_listings_subscription_expiring
+    ON t_p39732784_hourly_rentals_platf.listings(subscription_expires_at, id)
+    WHERE is_archived = false AND subscription_expires_at IS NOT NULL;
+
+COMMENT ON TABLE t_p39732784_hourly_rentals_platf.listing_lifecycle_events IS 'Журнал архивации и автопродления объектов по истечении подписки';
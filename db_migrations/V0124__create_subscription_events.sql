@@ -0,0 +1,51 @@
+-- Запланированные события подписки: «осталось 3 дня», «остался 1 день», «истекла».
+-- Функции, меняющие subscription_expires_at, пересоздают неотправленные события
+-- объекта; диспетчер (cron-archive-expired) берёт наступившие по индексу fire_at
+CREATE TABLE IF NOT EXISTS t_p39732784_hourly_rentals_platf.subscription_events (
+    id BIGSERIAL PRIMARY KEY,
+    listing_id INTEGER NOT NULL REFERENCES t_p39732784_hourly_rentals_platf.listings(id),
+    kind VARCHAR(20) NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    fire_at TIMESTAMP NOT NULL,
+    fired_at TIMESTAMP,
+    notified_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    CONSTRAINT subscription_events_kind_check CHECK (kind IN ('expiring_3d', 'expiring_1d', 'expired'))
+);
+
+-- Событие для одного срока подписки срабатывает один раз
+CREATE UNIQUE INDEX IF NOT EXISTS idx_subscription_events_unique
+    ON t_p39732784_hourly_rentals_platf.subscription_events(listing_id, kind, expires_at);
+
+CREATE INDEX IF NOT EXISTS idx_subscription_events_due
+    ON t_p39732784_hourly_rentals_platf.subscription_events(fire_at, id)
+    WHERE fired_at IS NULL;
+
+-- Срочность продления для кабинета менеджера: меняется событиями, а не CASE при чтении
+ALTER TABLE t_p39732784_hourly_rentals_platf.listings
+    ADD COLUMN IF NOT EXISTS subscription_urgency VARCHAR(10) NOT NULL DEFAULT 'ok';
+
+UPDATE t_p39732784_hourly_rentals_platf.listings
+SET subscription_urgency = CASE
+        WHEN subscription_expires_at < NOW() + INTERVAL '1 day' THEN 'critical'
+        WHEN subscription_expires_at < NOW() + INTERVAL '3 days' THEN 'warning'
+        ELSE 'ok'
+    END
+WHERE subscription_expires_at IS NOT NULL;
+
+-- События для текущих подписок; уже истёкшие сработают при первом запуске диспетчера
+INSERT INTO t_p39732784_hourly_rentals_platf.subscription_events (listing_id, kind, expires_at, fire_at)
+SELECT l.id, k.kind, l.subscription_expires_at, l.subscription_expires_at - k.lead
+FROM t_p39732784_hourly_rentals_platf.listings l
+CROSS JOIN (VALUES
+    ('expiring_3d', INTERVAL '3 days'),
+    ('expiring_1d', INTERVAL '1 day'),
+    ('expired', INTERVAL '0')
+) AS k(kind, lead)
+WHERE l.is_archived = false
+  AND l.subscription_expires_at IS NOT NULL
+  AND (k.kind = 'expired' OR l.subscription_expires_at - k.lead > NOW())
+ON CONFLICT (listing_id, kind, expires_at) DO NOTHING;
+
+COMMENT ON TABLE t_p39732784_hourly_rentals_platf.subscription_events IS 'Запланированные события окончания подписки объекта; fired_at — сработало, notified_at — владелец уведомлён';
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.listings.subscription_urgency IS 'ok / warning (меньше 3 дней) / critical (меньше суток или истекла); обновляется событиями subscription_events';
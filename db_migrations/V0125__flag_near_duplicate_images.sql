@@ -0,0 +1,11 @@
+-- Похожие фото (близкий dHash) больше не подменяются существующим URL:
+-- загрузка сохраняется как есть и помечается для модерации
+ALTER TABLE image_hashes
+    ADD COLUMN IF NOT EXISTS near_duplicate_of CHAR(64),
+    ADD COLUMN IF NOT EXISTS near_duplicate_distance SMALLINT;
+
+CREATE INDEX IF NOT EXISTS idx_image_hashes_near_duplicate
+    ON image_hashes(created_at)
+    WHERE near_duplicate_of IS NOT NULL;
+
+COMMENT ON COLUMN image_hashes.near_duplicate_of IS 'sha256 похожего фото (расстояние dHash <= 3) — для проверки модератором';
@@ -0,0 +1,11 @@
+-- Каталог упорядочен по auction_rank (V0122): индекс V0108 по COALESCE(auction, 999)
+-- больше ни одному запросу не нужен
+DROP INDEX IF EXISTS t_p39732784_hourly_rentals_platf.idx_listings_public_order;
+
+-- Индекс порядка нужен только видимой выдаче (keyset public-listings); перестановки
+-- и нормализация в admin-listings читают один город по idx_listings_city
+DROP INDEX IF EXISTS t_p39732784_hourly_rentals_platf.idx_listings_city_auction_rank;
+
+CREATE INDEX IF NOT EXISTS idx_listings_public_auction_rank
+    ON t_p39732784_hourly_rentals_platf.listings (city, auction_rank, id)
+    WHERE is_archived = false AND (moderation_status IS NULL OR moderation_status = 'approved');
@@ -266,7 +266,9 @@ export default function AdminListingForm({ listing, token, onClose }: AdminListi
         }
       }
 
+      // id сохраняется: сервер обновляет только изменённые номера
       const cleanRooms = finalData.rooms.map((room: any) => ({
+        id: room.id,
         type: room.type,
         price: room.price,
         description: room.description || '',
@@ -0,0 +1,19 @@
+import { Button } from '@/components/ui/button';
+import Icon from '@/components/ui/icon';
+
+interface LoadOlderButtonProps {
+  loading: boolean;
+  onClick: () => void;
+  label?: string;
+}
+
+export default function LoadOlderButton({ loading, onClick, label = 'Показать более ранние' }: LoadOlderButtonProps) {
+  return (
+    <div className="flex justify-center">
+      <Button variant="ghost" size="sm" onClick={onClick} disabled={loading}>
+        <Icon name={loading ? 'Loader2' : 'History'} size={14} className={loading ? 'mr-1 animate-spin' : 'mr-1'} />
+        {label}
+      </Button>
+    </div>
+  );
+}
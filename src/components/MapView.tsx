@@ -4,6 +4,8 @@ import Icon from '@/components/ui/icon';
 import InteractiveMap from '@/components/InteractiveMap';
 import { useToast } from '@/hooks/use-toast';
 
+const GEOCODE_URL = 'https://functions.poehali.dev/f7e412a1-066f-4874-9e38-1e5beec62eae';
+
 type Listing = {
   id: number;
   title: string;
@@ -47,14 +49,33 @@ export default function MapView({
   const [totalToProcess, setTotalToProcess] = useState(0);
   const { toast } = useToast();
 
+  // Геокодирование выполняет фоновая задача: запускаем её и ждём результат
+  const runGeocodeJob = async (): Promise<{ updated: number; failed: number; total: number; remaining: number }> => {
+    const response = await fetch(GEOCODE_URL, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' }
+    });
+    const { job_id } = await response.json();
+
+    const deadline = Date.now() + 120000;
+    while (Date.now() < deadline) {
+      await new Promise(resolve => setTimeout(resolve, 3000));
+      const statusResponse = await fetch(`${GEOCODE_URL}?job_id=${job_id}`);
+      const job = await statusResponse.json();
+      if (job.status === 'done') {
+        return job.result;
+      }
+      if (job.status === 'dead' || !statusResponse.ok) {
+        throw new Error(job.error || 'Геокодирование не выполнено');
+      }
+    }
+    throw new Error('Геокодирование заняло слишком много времени');
+  };
+
   const handleGeocode = async () => {
     setIsGeocoding(true);
     try {
-      const response = await fetch('https://functions.poehali.dev/f7e412a1-066f-4874-9e38-1e5beec62eae', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' }
-      });
-      const data = await response.json();
+      const data = await runGeocodeJob();
       toast({
         title: 'Геокодирование завершено',
         description: `Обновлено: ${data.updated}, Не удалось: ${data.failed}`,
@@ -83,17 +104,14 @@ export default function MapView({
 
     while (iteration < maxIterations) {
       try {
-        const response = await fetch('https://functions.poehali.dev/f7e412a1-066f-4874-9e38-1e5beec62eae', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' }
-        });
-        const data = await response.json();
+        const data = await runGeocodeJob();
         
         totalUpdated += data.updated || 0;
         totalFailed += data.failed || 0;
         setProcessedCount(totalUpdated + totalFailed);
+        setTotalToProcess(totalUpdated + totalFailed + (data.remaining || 0));
 
-        if (data.total === 0) {
+        if (data.total === 0 || data.remaining === 0) {
           toast({
             title: 'Геокодирование завершено!',
             description: `Успешно обработано: ${totalUpdated}, Не удалось: ${totalFailed}`,
@@ -102,7 +120,6 @@ export default function MapView({
           break;
         }
 
-        await new Promise(resolve => setTimeout(resolve, 2000));
         iteration++;
       } catch (error) {
         toast({
@@ -4,6 +4,9 @@ import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
+import { useLongPoll, mergeById } from '@/hooks/useLongPoll';
+import { useMessageHistory } from '@/hooks/useMessageHistory';
+import LoadOlderButton from '@/components/LoadOlderButton';
 
 const CHAT_URL = 'https://functions.poehali.dev/7e6abf41-4dc0-4997-afc4-cbc2ee8fec77';
 
@@ -29,45 +32,53 @@ export default function OwnerManagerChat({ ownerId, managerId, managerName, onCl
   const [loading, setLoading] = useState(true);
   const [sending, setSending] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const history = useMessageHistory<Message>(setMessages);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
 
-  const fetchMessages = async () => {
+  const markAsRead = () => fetch(CHAT_URL, {
+    method: 'PUT',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({
+      owner_id: ownerId,
+      mark_as_read_by: 'owner'
+    })
+  });
+
+  const fetchMessages = async (): Promise<number | null> => {
     try {
       const response = await fetch(`${CHAT_URL}?owner_id=${ownerId}`);
       const data = await response.json();
       
       if (data.messages) {
         setMessages(data.messages);
+        history.reset(data);
         
         // Отмечаем сообщения как прочитанные
-        await fetch(CHAT_URL, {
-          method: 'PUT',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({
-            owner_id: ownerId,
-            mark_as_read_by: 'owner'
-          })
-        });
+        await markAsRead();
+        return data.after ?? null;
       }
     } catch (error) {
       console.error('Ошибка загрузки сообщений:', error);
     } finally {
       setLoading(false);
     }
+    return null;
   };
 
-  useEffect(() => {
-    fetchMessages();
-    const interval = setInterval(fetchMessages, 20000); // Обновляем каждые 20 секунд
-    return () => clearInterval(interval);
-  }, [ownerId]);
+  // Новые сообщения ждём длинным опросом: ответ приходит, как только менеджер написал
+  useLongPoll<Message>(`${CHAT_URL}?owner_id=${ownerId}`, fetchMessages, (incoming) => {
+    setMessages((prev) => mergeById(prev, incoming));
+    markAsRead();
+  });
 
+  // Вниз — только при новом сообщении, а не при подгрузке истории сверху
+  const lastMessageId = messages[messages.length - 1]?.id;
   useEffect(() => {
     scrollToBottom();
-  }, [messages]);
+  }, [lastMessageId]);
 
   const handleSendMessage = async () => {
     if (!newMessage.trim()) return;
@@ -142,7 +153,14 @@ export default function OwnerManagerChat({ ownerId, managerId, managerName, onCl
               <p className="text-sm text-gray-400 mt-1">Задайте вопрос или расскажите о проблеме</p>
             </div>
           ) : (
-            messages.map((msg) => (
+            <>
+            {history.hasMore && (
+              <LoadOlderButton
+                loading={history.loadingOlder}
+                onClick={() => history.loadOlder(`${CHAT_URL}?owner_id=${ownerId}`)}
+              />
+            )}
+            {messages.map((msg) => (
               <div
                 key={msg.id}
                 className={`flex ${msg.sender_type === 'owner' ? 'justify-end' : 'justify-start'}`}
@@ -167,7 +185,8 @@ export default function OwnerManagerChat({ ownerId, managerId, managerName, onCl
                   </p>
                 </div>
               </div>
-            ))
+            ))}
+            </>
           )}
           <div ref={messagesEndRef} />
         </div>
@@ -66,8 +66,8 @@ export default function OwnerModerationDialog({
         }
         
         toast({
-          title: 'Email отправлен',
-          description: `Учетные данные отправлены владельцу на ${listing.owner_email || 'email'}`,
+          title: 'Email поставлен в очередь',
+          description: `Учетные данные будут отправлены владельцу на ${listing.owner_email || 'email'}`,
         });
       }
       
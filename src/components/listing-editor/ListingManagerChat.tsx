@@ -5,6 +5,9 @@ import { Input } from '@/components/ui/input';
 import { Badge } from '@/components/ui/badge';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
+import { useLongPoll, mergeById } from '@/hooks/useLongPoll';
+import { useMessageHistory } from '@/hooks/useMessageHistory';
+import LoadOlderButton from '@/components/LoadOlderButton';
 
 const CHAT_URL = 'https://functions.poehali.dev/7e6abf41-4dc0-4997-afc4-cbc2ee8fec77';
 
@@ -31,6 +34,7 @@ export default function ListingManagerChat({ listingId, ownerId, ownerName }: Li
   const [showChat, setShowChat] = useState(false);
   const [unreadCount, setUnreadCount] = useState(0);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const history = useMessageHistory<Message>(setMessages);
 
   const getManagerId = (): number | null => {
     const token = localStorage.getItem('adminToken');
@@ -54,13 +58,24 @@ export default function ListingManagerChat({ listingId, ownerId, ownerName }: Li
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
 
-  const fetchMessages = async () => {
+  const markAsRead = () => fetch(CHAT_URL, {
+    method: 'PUT',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({
+      owner_id: ownerId,
+      manager_id: managerId,
+      mark_as_read_by: 'manager'
+    })
+  });
+
+  const fetchMessages = async (): Promise<number | null> => {
     try {
       const response = await fetch(`${CHAT_URL}?owner_id=${ownerId}`);
       const data = await response.json();
       
       if (data.messages) {
         setMessages(data.messages);
+        history.reset(data);
         
         const unread = data.messages.filter((m: any) => 
           m.sender_type === 'owner' && !m.is_read
@@ -69,35 +84,36 @@ export default function ListingManagerChat({ listingId, ownerId, ownerName }: Li
         
         // Если чат открыт, отмечаем сообщения как прочитанные
         if (showChat && unread > 0) {
-          await fetch(CHAT_URL, {
-            method: 'PUT',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-              owner_id: ownerId,
-              manager_id: managerId,
-              mark_as_read_by: 'manager'
-            })
-          });
+          await markAsRead();
         }
+        return data.after ?? null;
       }
     } catch (error) {
       console.error('Ошибка загрузки сообщений:', error);
     } finally {
       setLoading(false);
     }
+    return null;
   };
 
-  useEffect(() => {
-    fetchMessages();
-    const interval = setInterval(fetchMessages, 20000);
-    return () => clearInterval(interval);
-  }, [ownerId, showChat]);
+  // Новые сообщения ждём длинным опросом; открытие чата перезагружает переписку и отмечает её прочитанной
+  useLongPoll<Message>(`${CHAT_URL}?owner_id=${ownerId}`, fetchMessages, (incoming) => {
+    setMessages((prev) => mergeById(prev, incoming));
+    const unread = incoming.filter((m) => m.sender_type === 'owner' && !m.is_read).length;
+    if (showChat && unread > 0) {
+      markAsRead();
+    } else if (unread > 0) {
+      setUnreadCount((prev) => prev + unread);
+    }
+  }, [showChat]);
 
+  // Вниз — только при новом сообщении, а не при подгрузке истории сверху
+  const lastMessageId = messages[messages.length - 1]?.id;
   useEffect(() => {
     if (showChat) {
       scrollToBottom();
     }
-  }, [messages, showChat]);
+  }, [lastMessageId, showChat]);
 
   const handleSendMessage = async () => {
     if (!newMessage.trim()) return;
@@ -197,7 +213,14 @@ export default function ListingManagerChat({ listingId, ownerId, ownerName }: Li
                   <p className="text-sm text-gray-400 mt-1">Начните диалог с владельцем</p>
                 </div>
               ) : (
-                messages.map((msg) => (
+                <>
+                {history.hasMore && (
+                  <LoadOlderButton
+                    loading={history.loadingOlder}
+                    onClick={() => history.loadOlder(`${CHAT_URL}?owner_id=${ownerId}`)}
+                  />
+                )}
+                {messages.map((msg) => (
                   <div
                     key={msg.id}
                     className={`flex ${msg.sender_type === 'manager' ? 'justify-end' : 'justify-start'}`}
@@ -222,7 +245,8 @@ export default function ListingManagerChat({ listingId, ownerId, ownerName }: Li
                       </p>
                     </div>
                   </div>
-                ))
+                ))}
+                </>
               )}
               <div ref={messagesEndRef} />
             </div>
@@ -201,32 +201,28 @@ export default function AchievementsPanel({ objectsCount, balance, monthCommissi
     const checkAndAwardAchievements = async () => {
       if (!adminId) return;
 
-      for (const achievement of achievements) {
-        if (achievement.unlocked && !celebratedAchievements.has(achievement.id)) {
-          setCelebratedAchievements(prev => new Set(prev).add(achievement.id));
-          
-          try {
-            const response = await fetch('https://functions.poehali.dev/34169f5c-89f3-4cd9-bfbf-700367b2545b', {
-              method: 'POST',
-              headers: { 'Content-Type': 'application/json' },
-              body: JSON.stringify({
-                admin_id: adminId,
-                achievement_id: achievement.id
-              })
-            });
+      const fresh = achievements.filter(a => a.unlocked && !celebratedAchievements.has(a.id));
+      if (fresh.length === 0) return;
+      setCelebratedAchievements(prev => new Set([...prev, ...fresh.map(a => a.id)]));
 
-            const data = await response.json();
-            
-            if (data.success && !data.already_awarded) {
-              setTimeout(() => {
-                fireConfetti();
-                onBalanceUpdate?.();
-              }, 300);
-            }
-          } catch (error) {
-            console.error('Failed to award achievement:', error);
-          }
+      // Сервер сам проверяет все достижения по своим данным и начисляет новые одним запросом
+      try {
+        const response = await fetch('https://functions.poehali.dev/34169f5c-89f3-4cd9-bfbf-700367b2545b', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ admin_id: adminId })
+        });
+
+        const data = await response.json();
+
+        if (data.success && data.awarded?.length > 0) {
+          setTimeout(() => {
+            fireConfetti();
+            onBalanceUpdate?.();
+          }, 300);
         }
+      } catch (error) {
+        console.error('Failed to award achievements:', error);
       }
     };
 
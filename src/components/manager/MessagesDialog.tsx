@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState } from 'react';
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
@@ -6,6 +6,9 @@ import { Textarea } from '@/components/ui/textarea';
 import { ScrollArea } from '@/components/ui/scroll-area';
 import { Badge } from '@/components/ui/badge';
 import { useToast } from '@/hooks/use-toast';
+import { useLongPoll, mergeById } from '@/hooks/useLongPoll';
+import { useMessageHistory } from '@/hooks/useMessageHistory';
+import LoadOlderButton from '@/components/LoadOlderButton';
 import Icon from '@/components/ui/icon';
 
 interface MessagesDialogProps {
@@ -25,14 +28,9 @@ export default function MessagesDialog({ adminId, role }: MessagesDialogProps) {
   const [attachments, setAttachments] = useState<File[]>([]);
   const [uploadedUrls, setUploadedUrls] = useState<string[]>([]);
   const { toast } = useToast();
+  const history = useMessageHistory<any>(setMessages, true);
 
-  useEffect(() => {
-    if (open) {
-      fetchMessages();
-    }
-  }, [open]);
-
-  const fetchMessages = async () => {
+  const fetchMessages = async (): Promise<number | null> => {
     setLoading(true);
     try {
       const response = await fetch(`${FUNC_URL}?admin_id=${adminId}`);
@@ -40,14 +38,22 @@ export default function MessagesDialog({ adminId, role }: MessagesDialogProps) {
       
       if (response.ok) {
         setMessages(data.messages || []);
+        history.reset(data);
+        return data.after ?? null;
       }
     } catch (error) {
       console.error('Ошибка загрузки сообщений:', error);
     } finally {
       setLoading(false);
     }
+    return null;
   };
 
+  // Пока диалог открыт, новые сообщения ждём длинным опросом (сообщения идут новыми первыми)
+  useLongPoll<any>(open ? `${FUNC_URL}?admin_id=${adminId}` : null, fetchMessages, (incoming) => {
+    setMessages((prev) => mergeById(prev, incoming, true));
+  });
+
   const handleFileSelect = (e: React.ChangeEvent<HTMLInputElement>) => {
     const files = Array.from(e.target.files || []);
     const validFiles = files.filter(file => {
@@ -315,6 +321,12 @@ export default function MessagesDialog({ adminId, role }: MessagesDialogProps) {
                   </div>
                   );
                 })}
+                {history.hasMore && (
+                  <LoadOlderButton
+                    loading={history.loadingOlder}
+                    onClick={() => history.loadOlder(`${FUNC_URL}?admin_id=${adminId}`)}
+                  />
+                )}
               </div>
             )}
           </ScrollArea>
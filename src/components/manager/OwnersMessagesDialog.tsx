@@ -5,6 +5,9 @@ import { Input } from '@/components/ui/input';
 import { ScrollArea } from '@/components/ui/scroll-area';
 import { Badge } from '@/components/ui/badge';
 import { useToast } from '@/hooks/use-toast';
+import { useLongPoll, mergeById } from '@/hooks/useLongPoll';
+import { useMessageHistory } from '@/hooks/useMessageHistory';
+import LoadOlderButton from '@/components/LoadOlderButton';
 import Icon from '@/components/ui/icon';
 
 interface OwnersMessagesDialogProps {
@@ -20,6 +23,12 @@ interface Owner {
   unread_count: number;
 }
 
+interface Conversation {
+  owner_id: number;
+  owner_name: string;
+  unread_count: number;
+}
+
 interface Message {
   id: number;
   sender_type: 'owner' | 'manager';
@@ -36,7 +45,11 @@ export default function OwnersMessagesDialog({ adminId }: OwnersMessagesDialogPr
   const [newMessage, setNewMessage] = useState('');
   const [loading, setLoading] = useState(false);
   const [sending, setSending] = useState(false);
+  // Диалоги менеджера приходят страницами по 100 (?manager_id=&before=)
+  const [conversationsBefore, setConversationsBefore] = useState<number | null>(null);
+  const [loadingConversations, setLoadingConversations] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const history = useMessageHistory<Message>(setMessages);
   const { toast } = useToast();
 
   useEffect(() => {
@@ -45,17 +58,11 @@ export default function OwnersMessagesDialog({ adminId }: OwnersMessagesDialogPr
     }
   }, [open]);
 
-  useEffect(() => {
-    if (selectedOwner) {
-      fetchMessages();
-      const interval = setInterval(fetchMessages, 20000);
-      return () => clearInterval(interval);
-    }
-  }, [selectedOwner]);
-
+  // Вниз — только при новом сообщении, а не при подгрузке истории сверху
+  const lastMessageId = messages[messages.length - 1]?.id;
   useEffect(() => {
     scrollToBottom();
-  }, [messages]);
+  }, [lastMessageId]);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -88,24 +95,11 @@ export default function OwnersMessagesDialog({ adminId }: OwnersMessagesDialogPr
         }
       }
       
-      // Получаем количество непрочитанных сообщений для каждого владельца
-      for (const owner of ownersMap.values()) {
-        try {
-          const chatResponse = await fetch(`${CHAT_URL}?owner_id=${owner.id}`);
-          const chatData = await chatResponse.json();
-          
-          if (chatData.messages) {
-            const unread = chatData.messages.filter((m: any) => 
-              m.sender_type === 'owner' && !m.is_read
-            ).length;
-            owner.unread_count = unread;
-          }
-        } catch (error) {
-          console.error(`Ошибка загрузки чата для владельца ${owner.id}:`, error);
-        }
-      }
-      
-      setOwners(Array.from(ownersMap.values()));
+      // Счётчики непрочитанных — из диалогов менеджера (первая страница)
+      const chatResponse = await fetch(`${CHAT_URL}?manager_id=${adminId}`);
+      const chatData = await chatResponse.json();
+      setOwners(mergeConversations(Array.from(ownersMap.values()), chatData.conversations || []));
+      setConversationsBefore(chatData.has_more ? chatData.before ?? null : null);
     } catch (error) {
       console.error('Ошибка загрузки владельцев:', error);
     } finally {
@@ -113,8 +107,51 @@ export default function OwnersMessagesDialog({ adminId }: OwnersMessagesDialogPr
     }
   };
 
-  const fetchMessages = async () => {
-    if (!selectedOwner) return;
+  const mergeConversations = (list: Owner[], conversations: Conversation[]): Owner[] => {
+    const byId = new Map(list.map((owner) => [owner.id, owner]));
+    for (const conv of conversations) {
+      const owner = byId.get(conv.owner_id);
+      byId.set(conv.owner_id, owner
+        ? { ...owner, unread_count: conv.unread_count }
+        : { id: conv.owner_id, full_name: conv.owner_name, unread_count: conv.unread_count });
+    }
+    return Array.from(byId.values());
+  };
+
+  const loadMoreConversations = async () => {
+    if (!conversationsBefore || loadingConversations) return;
+    setLoadingConversations(true);
+    try {
+      const response = await fetch(`${CHAT_URL}?manager_id=${adminId}&before=${conversationsBefore}`);
+      const data = await response.json();
+      setOwners((prev) => mergeConversations(prev, data.conversations || []));
+      setConversationsBefore(data.has_more ? data.before ?? null : null);
+    } catch (error) {
+      console.error('Ошибка загрузки диалогов:', error);
+    } finally {
+      setLoadingConversations(false);
+    }
+  };
+
+  const markAsRead = async (ownerId: number) => {
+    await fetch(CHAT_URL, {
+      method: 'PUT',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        owner_id: ownerId,
+        manager_id: adminId,
+        mark_as_read_by: 'manager'
+      })
+    });
+
+    // Обновляем счетчик непрочитанных
+    setOwners((prev) => prev.map(o =>
+      o.id === ownerId ? { ...o, unread_count: 0 } : o
+    ));
+  };
+
+  const fetchMessages = async (): Promise<number | null> => {
+    if (!selectedOwner) return null;
     
     try {
       const response = await fetch(`${CHAT_URL}?owner_id=${selectedOwner.id}`);
@@ -122,6 +159,7 @@ export default function OwnersMessagesDialog({ adminId }: OwnersMessagesDialogPr
       
       if (data.messages) {
         setMessages(data.messages);
+        history.reset(data);
         
         // Отмечаем сообщения как прочитанные
         const unread = data.messages.filter((m: any) => 
@@ -129,27 +167,28 @@ export default function OwnersMessagesDialog({ adminId }: OwnersMessagesDialogPr
         ).length;
         
         if (unread > 0) {
-          await fetch(CHAT_URL, {
-            method: 'PUT',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-              owner_id: selectedOwner.id,
-              manager_id: adminId,
-              mark_as_read_by: 'manager'
-            })
-          });
-          
-          // Обновляем счетчик непрочитанных
-          setOwners(owners.map(o => 
-            o.id === selectedOwner.id ? { ...o, unread_count: 0 } : o
-          ));
+          await markAsRead(selectedOwner.id);
         }
+        return data.after ?? null;
       }
     } catch (error) {
       console.error('Ошибка загрузки сообщений:', error);
     }
+    return null;
   };
 
+  // Новые сообщения ждём длинным опросом: ответ приходит, как только владелец написал
+  useLongPoll<Message>(
+    selectedOwner ? `${CHAT_URL}?owner_id=${selectedOwner.id}` : null,
+    fetchMessages,
+    (incoming) => {
+      setMessages((prev) => mergeById(prev, incoming));
+      if (selectedOwner && incoming.some((m) => m.sender_type === 'owner' && !m.is_read)) {
+        markAsRead(selectedOwner.id);
+      }
+    }
+  );
+
   const handleSendMessage = async () => {
     if (!newMessage.trim() || !selectedOwner) return;
 
@@ -253,6 +292,13 @@ export default function OwnersMessagesDialog({ adminId }: OwnersMessagesDialogPr
                       </div>
                     </button>
                   ))}
+                  {conversationsBefore && (
+                    <LoadOlderButton
+                      loading={loadingConversations}
+                      onClick={loadMoreConversations}
+                      label="Показать ещё диалоги"
+                    />
+                  )}
                 </div>
               )}
             </ScrollArea>
@@ -278,6 +324,12 @@ export default function OwnersMessagesDialog({ adminId }: OwnersMessagesDialogPr
                     </div>
                   ) : (
                     <div className="space-y-3">
+                      {history.hasMore && (
+                        <LoadOlderButton
+                          loading={history.loadingOlder}
+                          onClick={() => history.loadOlder(`${CHAT_URL}?owner_id=${selectedOwner.id}`)}
+                        />
+                      )}
                       {messages.map((msg) => (
                         <div
                           key={msg.id}
@@ -0,0 +1,75 @@
+import { useEffect, useRef } from 'react';
+
+// Сервер держит запрос до WAIT_SECONDS и отвечает сразу, как только появилось сообщение
+const WAIT_SECONDS = 25;
+// Курсора ещё нет (переписка пустая) — перезагружаем страницу с этим интервалом
+const RELOAD_INTERVAL_MS = 20000;
+const ERROR_RETRY_MS = 5000;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+interface WithId {
+  id: number;
+}
+
+// Добавить новые сообщения к списку без повторов; newestFirst — список идёт новыми первыми
+export function mergeById<T extends WithId>(prev: T[], incoming: T[], newestFirst = false): T[] {
+  const known = new Set(prev.map((item) => item.id));
+  const fresh = incoming.filter((item) => !known.has(item.id));
+  if (fresh.length === 0) return prev;
+  return newestFirst ? [...fresh, ...prev] : [...prev, ...fresh];
+}
+
+/**
+ * Длинный опрос переписки.
+ *
+ * url — адрес страницы переписки с параметрами (`...?owner_id=1`) или null, пока слушать не нужно;
+ * load — загрузить переписку целиком, вернуть курсор after (id последнего сообщения);
+ * onMessages — новые сообщения из ответа `url&after=&wait=`.
+ * Опрос перезапускается при смене url и deps и останавливается при размонтировании.
+ */
+export function useLongPoll<T extends WithId>(
+  url: string | null,
+  load: () => Promise<number | null>,
+  onMessages: (messages: T[]) => void,
+  deps: unknown[] = []
+) {
+  const loadRef = useRef(load);
+  const onMessagesRef = useRef(onMessages);
+  loadRef.current = load;
+  onMessagesRef.current = onMessages;
+
+  useEffect(() => {
+    if (!url) return;
+    let active = true;
+
+    const listen = async () => {
+      let after = await loadRef.current();
+      while (active) {
+        if (!after) {
+          await sleep(RELOAD_INTERVAL_MS);
+          if (active) after = await loadRef.current();
+          continue;
+        }
+        try {
+          const response = await fetch(`${url}&after=${after}&wait=${WAIT_SECONDS}`);
+          const data = await response.json();
+          if (!active) break;
+          if (data.messages?.length) {
+            onMessagesRef.current(data.messages);
+          }
+          after = data.after ?? after;
+        } catch (error) {
+          console.error('Ошибка ожидания сообщений:', error);
+          await sleep(ERROR_RETRY_MS);
+        }
+      }
+    };
+
+    listen();
+    return () => {
+      active = false;
+    };
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [url, ...deps]);
+}
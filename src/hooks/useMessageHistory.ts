@@ -0,0 +1,52 @@
+import { useState, Dispatch, SetStateAction } from 'react';
+
+interface WithId {
+  id: number;
+}
+
+interface PageCursor {
+  has_more?: boolean;
+  before?: number | null;
+}
+
+/**
+ * Более ранние страницы переписки (?before=<id>): API отдаёт не больше 100 сообщений за раз.
+ *
+ * reset(data) вызывается после загрузки первой страницы, loadOlder(url) дописывает
+ * следующую страницу истории; newestFirst — список идёт новыми первыми.
+ */
+export function useMessageHistory<T extends WithId>(
+  setItems: Dispatch<SetStateAction<T[]>>,
+  newestFirst = false
+) {
+  const [hasMore, setHasMore] = useState(false);
+  const [before, setBefore] = useState<number | null>(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
+
+  const reset = (data: PageCursor) => {
+    setHasMore(!!data.has_more);
+    setBefore(data.before ?? null);
+  };
+
+  const loadOlder = async (url: string) => {
+    if (!before || loadingOlder) return;
+    setLoadingOlder(true);
+    try {
+      const response = await fetch(`${url}&before=${before}`);
+      const data = await response.json();
+      const older: T[] = data.messages || [];
+      setItems((prev) => {
+        const known = new Set(prev.map((item) => item.id));
+        const fresh = older.filter((item) => !known.has(item.id));
+        return newestFirst ? [...prev, ...fresh] : [...fresh, ...prev];
+      });
+      reset(data);
+    } catch (error) {
+      console.error('Ошибка загрузки истории сообщений:', error);
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
+  return { hasMore, loadingOlder, reset, loadOlder };
+}
@@ -20,6 +20,7 @@ const API_URLS = {
   detectCity: 'https://functions.poehali.dev/15d3dd6b-83e0-48c3-b215-802340270720',
   getVirtualNumber: 'https://functions.poehali.dev/4a500ec2-2f33-49d9-87d0-3779d8d52ae5',
   generateDescription: 'https://functions.poehali.dev/c5a9830a-6bcf-45ed-a4bc-8992e19a7429',
+  managerAchievements: 'https://functions.poehali.dev/34169f5c-89f3-4cd9-bfbf-700367b2545b',
 };
 
 export const api = {
@@ -296,6 +297,45 @@ export const api = {
     return result;
   },
 
+  // Загрузка фото напрямую в хранилище (без base64): presign -> PUT/multipart -> complete
+  uploadPhotoDirect: async (token: string, file: File) => {
+    const call = async (body: Record<string, unknown>) => {
+      const response = await fetch(API_URLS.adminUpload, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${token}`,
+        },
+        body: JSON.stringify(body),
+      });
+      if (!response.ok) {
+        const errorData = await response.json().catch(() => ({ error: 'Network error' }));
+        throw new Error(errorData.error || `HTTP ${response.status}`);
+      }
+      return response.json();
+    };
+
+    const session = await call({ action: 'presign', content_type: file.type, size: file.size });
+    try {
+      const parts: { part_number: number; etag: string }[] = [];
+      if (session.method === 'PUT') {
+        const response = await fetch(session.url, { method: 'PUT', headers: session.headers, body: file });
+        if (!response.ok) throw new Error(`Upload failed: HTTP ${response.status}`);
+      } else {
+        for (const part of session.parts) {
+          const start = (part.part_number - 1) * session.part_size;
+          const response = await fetch(part.url, { method: 'PUT', body: file.slice(start, start + session.part_size) });
+          if (!response.ok) throw new Error(`Upload failed: HTTP ${response.status}`);
+          parts.push({ part_number: part.part_number, etag: response.headers.get('ETag') || '' });
+        }
+      }
+      return await call({ action: 'complete', upload_id: session.upload_id, parts });
+    } catch (error) {
+      await call({ action: 'abort', upload_id: session.upload_id }).catch(() => undefined);
+      throw error;
+    }
+  },
+
   // Получение деталей номера с фотографиями
   getRoomDetails: async (listingId: number, roomIndex: number) => {
     const response = await fetch(`${API_URLS.publicListings}?listing_id=${listingId}&room_index=${roomIndex}`);
@@ -324,6 +364,21 @@ export const api = {
     return response.json();
   },
 
+  getPublicListingsPage: async (params: { city?: string; cursor?: string | null; limit?: number; fields?: string[]; rooms?: 'summary' | 'full' }) => {
+    const query = new URLSearchParams();
+    if (params.city) query.set('city', params.city);
+    if (params.cursor) query.set('cursor', params.cursor);
+    query.set('limit', String(params.limit ?? 20));
+    if (params.fields?.length) query.set('fields', params.fields.join(','));
+    query.set('rooms', params.rooms ?? 'summary');
+    const response = await fetch(`${API_URLS.publicListings}?${query.toString()}`);
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({ error: 'Network error' }));
+      throw new Error(errorData.error || `HTTP ${response.status}`);
+    }
+    return response.json() as Promise<{ items: any[]; next_cursor: string | null }>;
+  },
+
   // === Owner API ===
   ownerRegister: async (email: string, password: string, full_name: string, phone: string) => {
     const response = await fetch(API_URLS.ownerAuth, {
@@ -382,11 +437,26 @@ export const api = {
     });
   },
 
+  trackEvents: async (events: { listing_id: number; action: 'view' | 'click'; click_type?: 'phone' | 'telegram' | 'general' }[]) => {
+    if (events.length === 0) return;
+    await fetch(API_URLS.statistics, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ action: 'batch', events }),
+    });
+  },
+
   getStatistics: async (listing_id: number, days: number = 30) => {
     const response = await fetch(`${API_URLS.statistics}?listing_id=${listing_id}&days=${days}`);
     return response.json();
   },
 
+  getStatisticsRange: async (scope: 'listing' | 'owner' | 'city', id: number | string, from: string, to: string) => {
+    const params = new URLSearchParams({ scope, id: String(id), from, to });
+    const response = await fetch(`${API_URLS.statistics}?${params}`);
+    return response.json();
+  },
+
   // Платежи
   createPayment: async (owner_id: number, amount: number) => {
     const response = await fetch(API_URLS.payment, {
@@ -421,6 +491,31 @@ export const api = {
     return response.json();
   },
 
+  getOwnersDirectory: async (token: string, params: {
+    q?: string;
+    archived?: 'all' | 'true' | 'false';
+    sort?: 'id' | 'full_name' | 'balance' | 'bonus_balance' | 'last_login' | 'created_at' | 'hotels_count';
+    order?: 'asc' | 'desc';
+    min_balance?: number;
+    max_balance?: number;
+    limit?: number;
+    offset?: number;
+  }) => {
+    const query = new URLSearchParams(
+      Object.entries(params)
+        .filter(([, value]) => value !== undefined && value !== '')
+        .map(([key, value]) => [key, String(value)])
+    );
+    const response = await fetch(`${API_URLS.adminOwners}?${query}`, {
+      headers: { 'X-Authorization': `Bearer ${token}` },
+    });
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({ error: 'Network error' }));
+      throw new Error(errorData.error || `HTTP ${response.status}`);
+    }
+    return response.json();
+  },
+
   createOwner: async (token: string, data: any) => {
     const response = await fetch(API_URLS.adminOwners, {
       method: 'POST',
@@ -925,6 +1020,40 @@ export const api = {
       const errorData = await response.json().catch(() => ({ error: 'Network error' }));
       throw new Error(errorData.error || `HTTP ${response.status}`);
     }
+    // Генерация идёт в фоновой задаче: ждём её результат
+    const { job_id } = await response.json();
+    const deadline = Date.now() + 120000;
+    while (Date.now() < deadline) {
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+      const statusResponse = await fetch(`${API_URLS.generateDescription}?job_id=${job_id}`);
+      const job = await statusResponse.json();
+      if (job.status === 'done') {
+        return job.result;
+      }
+      if (job.status === 'dead' || !statusResponse.ok) {
+        throw new Error(job.error || 'Не удалось сгенерировать описание');
+      }
+    }
+    throw new Error('Генерация описания заняла слишком много времени');
+  },
+
+  // Рейтинг менеджеров: топ-N и место сотрудника с соседями
+  getManagerLeaderboard: async (params: {
+    metric?: 'objects' | 'tasks' | 'revenue';
+    limit?: number;
+    admin_id?: number;
+    around?: number;
+  } = {}) => {
+    const query = new URLSearchParams(
+      Object.entries(params)
+        .filter(([, value]) => value !== undefined)
+        .map(([key, value]) => [key, String(value)])
+    );
+    const response = await fetch(`${API_URLS.managerAchievements}?${query}`);
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({ error: 'Network error' }));
+      throw new Error(errorData.error || `HTTP ${response.status}`);
+    }
     return response.json();
   },
 };
\ No newline at end of file